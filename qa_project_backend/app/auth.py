@@ -1,20 +1,30 @@
 from datetime import datetime, timedelta
+from collections import OrderedDict
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from typing import Optional, Union
+import hashlib
+import threading
+import time
+import uuid
 from . import crud, database, models, config
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .revocation import revocation_list
+from .cache import cache
+from .passwords import pwd_context, password_hasher, PasswordHasherBusy
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/auth/login",
     scheme_name="JWT"
 )
+oauth2_scheme_optional = OAuth2PasswordBearer(
+    tokenUrl="/api/auth/login",
+    scheme_name="JWT",
+    auto_error=False
+)
 
 # Get settings
 settings = config.settings
@@ -39,6 +49,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
+        "jti": uuid.uuid4().hex,
         "type": "access"
     })
     
@@ -49,8 +60,89 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     )
     return encoded_jwt
 
+class TokenCache:
+    """Bounded LRU of verified access-token payloads, keyed by token digest.
+    
+    Entries expire at the token's own ``exp`` so a cached payload is never
+    served past the point where a fresh decode would reject it.
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+    
+    def get(self, token: str) -> Optional[dict]:
+        """Return a copy of the cached payload, or None on miss/expiry"""
+        if self.maxsize <= 0:
+            return None
+        
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(payload)
+    
+    def set(self, token: str, payload: dict) -> None:
+        """Cache a verified payload until its expiration"""
+        if self.maxsize <= 0:
+            return
+        
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload["exp"], dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def discard(self, token: str) -> None:
+        """Drop a single token from the cache"""
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+# Verified access tokens, so repeat requests skip signature checks and parsing
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
 def decode_access_token(token: str) -> Optional[dict]:
     """Decode and validate a JWT access token"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    
     try:
         payload = jwt.decode(
             token, 
@@ -66,7 +158,8 @@ def decode_access_token(token: str) -> Optional[dict]:
         exp = payload.get("exp")
         if exp is None or datetime.utcnow() > datetime.fromtimestamp(exp):
             return None
-            
+        
+        token_cache.set(token, payload)
         return payload
     except JWTError:
         return None
@@ -88,6 +181,59 @@ def authenticate_user(db: Session, username: str, password: str) -> Union[models
     
     return user
 
+def _login_failure_keys(username: str, client_ip: Optional[str]) -> list:
+    keys = [f"login_failures:user:{username.lower()}"]
+    if client_ip:
+        keys.append(f"login_failures:ip:{client_ip}")
+    return keys
+
+def is_login_throttled(username: str, client_ip: Optional[str] = None) -> bool:
+    """Check whether recent failures for this username or IP exceed the limit"""
+    for key in _login_failure_keys(username, client_ip):
+        count = cache.get(key)
+        if count is not None and int(count) >= settings.LOGIN_MAX_FAILURES:
+            return True
+    return False
+
+def _find_login_user(db: Session, username: str) -> Optional[models.User]:
+    """User by username, else by email"""
+    return crud.get_user_by_username(db, username) or crud.get_user_by_email(db, username)
+
+async def authenticate_user_async(
+    db: Session, username: str, password: str, client_ip: Optional[str] = None
+) -> Union[models.User, bool]:
+    """Authenticate a user, running bcrypt in the password process pool.
+    
+    Throttled usernames/IPs are rejected before any hashing work is done.
+    """
+    if is_login_throttled(username, client_ip):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later"
+        )
+    
+    # The lookup is a blocking query; keep it off the event loop like the hashing
+    user = await run_in_threadpool(_find_login_user, db, username)
+    
+    try:
+        verified = bool(user) and await password_hasher.verify(password, user.password_hash)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login temporarily unavailable, try again shortly"
+        )
+    
+    failure_keys = _login_failure_keys(username, client_ip)
+    if not verified:
+        for key in failure_keys:
+            cache.incr(key, ttl=settings.LOGIN_FAILURE_WINDOW)
+        return False
+    
+    # Only the per-user counter is reset: a valid login from one account must not
+    # clear the per-IP counter an attacker builds up guessing other accounts
+    cache.delete(failure_keys[0])
+    return user
+
 def get_current_user(
     token: str = Depends(oauth2_scheme), 
     db: Session = Depends(database.get_db)
@@ -103,6 +249,9 @@ def get_current_user(
         payload = decode_access_token(token)
         if payload is None:
             raise credentials_exception
+        
+        if revocation_list.is_revoked(payload.get("jti")):
+            raise credentials_exception
             
         username: str = payload.get("sub")
         if username is None:
@@ -117,6 +266,24 @@ def get_current_user(
     
     return user
 
+def get_current_user_optional(
+    token: Optional[str] = Depends(oauth2_scheme_optional),
+    db: Session = Depends(database.get_db)
+) -> Optional[models.User]:
+    """Get current user from JWT token, or None if missing or invalid"""
+    if not token:
+        return None
+    
+    payload = decode_access_token(token)
+    if payload is None or revocation_list.is_revoked(payload.get("jti")):
+        return None
+    
+    username = payload.get("sub")
+    if username is None:
+        return None
+    
+    return crud.get_user_by_username(db, username)
+
 def get_current_active_user(
     current_user: models.User = Depends(get_current_user)
 ) -> models.User:
@@ -138,6 +305,7 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
+        "jti": uuid.uuid4().hex,
         "type": "refresh"
     })
     
@@ -165,6 +333,9 @@ def verify_refresh_token(token: str) -> Optional[dict]:
         exp = payload.get("exp")
         if exp is None or datetime.utcnow() > datetime.fromtimestamp(exp):
             return None
+        
+        if revocation_list.is_revoked(payload.get("jti")):
+            return None
             
         return payload
     except JWTError:
@@ -194,14 +365,43 @@ def validate_password_strength(password: str) -> bool:
     
     return sum([has_upper, has_lower, has_digit, has_special]) >= 3
 
-# Token blacklist (for logout functionality)
-# In production, you'd use Redis or a database table
-blacklisted_tokens = set()
+# Token revocation (for logout functionality)
+# Revoked token ids live in the shared cache until the token expires
 
-def blacklist_token(token: str):
-    """Add token to blacklist"""
-    blacklisted_tokens.add(token)
+def revoke_token_payload(payload: dict) -> bool:
+    """Revoke a decoded token by its jti; returns False for tokens without one"""
+    jti = payload.get("jti")
+    exp = payload.get("exp")
+    if not jti or exp is None:
+        return False
+    
+    revocation_list.revoke(jti, float(exp))
+    return True
+
+def blacklist_token(token: str) -> bool:
+    """Revoke a token until it expires"""
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return False
+    
+    token_cache.discard(token)
+    return revoke_token_payload(payload)
 
 def is_token_blacklisted(token: str) -> bool:
-    """Check if token is blacklisted"""
-    return token in blacklisted_tokens
\ No newline at end of file
+    """Check if token has been revoked"""
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"verify_exp": False}
+        )
+    except JWTError:
+        return False
+    
+    return revocation_list.is_revoked(payload.get("jti"))
@@ -0,0 +1,117 @@
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class MemoryCache:
+    """In-process cache with per-key expiry (single worker / development)"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Optional[float], str]] = {}
+        self._sorted_sets: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str) -> bool:
+        entry = self._values.get(key)
+        if entry is None:
+            return False
+        expires_at = entry[0]
+        if expires_at is not None and time.time() >= expires_at:
+            del self._values[key]
+            return False
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._values[key][1] if self._alive(key) else None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        with self._lock:
+            self._values[key] = (time.time() + ttl if ttl else None, str(value))
+
+    def add(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        """Set key only if it does not exist; returns True if it was set"""
+        with self._lock:
+            if self._alive(key):
+                return False
+            self._values[key] = (time.time() + ttl if ttl else None, str(value))
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        """Increment a counter; ttl is applied when the counter is created"""
+        with self._lock:
+            if self._alive(key):
+                expires_at, value = self._values[key]
+                count = int(value) + 1
+            else:
+                expires_at, count = (time.time() + ttl if ttl else None), 1
+            self._values[key] = (expires_at, str(count))
+            return count
+
+    def zadd(self, key: str, member: str, score: float) -> None:
+        with self._lock:
+            self._sorted_sets.setdefault(key, {})[member] = score
+
+    def zrangebyscore(self, key: str, min_score: float, max_score: float) -> List[str]:
+        with self._lock:
+            members = self._sorted_sets.get(key, {})
+            return [m for m, s in sorted(members.items(), key=lambda i: i[1]) if min_score <= s <= max_score]
+
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> None:
+        with self._lock:
+            members = self._sorted_sets.get(key, {})
+            for member in [m for m, s in members.items() if min_score <= s <= max_score]:
+                del members[member]
+
+class RedisCache:
+    """Cache shared by all workers, backed by Redis"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self.client.set(key, value, ex=ttl)
+
+    def add(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        return bool(self.client.set(key, value, ex=ttl, nx=True))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        count = int(self.client.incr(key))
+        if count == 1 and ttl:
+            self.client.expire(key, ttl)
+        return count
+
+    def zadd(self, key: str, member: str, score: float) -> None:
+        self.client.zadd(key, {member: score})
+
+    def zrangebyscore(self, key: str, min_score: float, max_score: float) -> List[str]:
+        return self.client.zrangebyscore(key, min_score, max_score)
+
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> None:
+        self.client.zremrangebyscore(key, min_score, max_score)
+
+def create_cache():
+    """Create the cache backend selected by CACHE_BACKEND"""
+    if settings.CACHE_BACKEND == "redis":
+        try:
+            return RedisCache(settings.REDIS_URL)
+        except ImportError:
+            logger.warning("redis package not installed, falling back to in-process cache")
+    return MemoryCache()
+
+# Global instance
+cache = create_cache()
@@ -9,12 +9,14 @@ class Settings(BaseSettings):
     APP_NAME: str = Field(default="Q&A Platform API", env="APP_NAME")
     APP_VERSION: str = Field(default="1.0.0", env="APP_VERSION")
     DEBUG: bool = Field(default=False, env="DEBUG")
+    PREWARM_SERVICES: bool = Field(default=True, env="PREWARM_SERVICES")  # Build services in the background after startup
     
     # Security
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
     ALGORITHM: str = Field(default="HS256", env="ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=7, env="REFRESH_TOKEN_EXPIRE_DAYS")
+    TOKEN_CACHE_SIZE: int = Field(default=10000, env="TOKEN_CACHE_SIZE")  # 0 disables the decode cache
     
     # Database
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
@@ -33,23 +35,91 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: str = Field(default="", env="GOOGLE_CLIENT_ID")
     GOOGLE_CLIENT_SECRET: str = Field(default="", env="GOOGLE_CLIENT_SECRET")
     GOOGLE_REDIRECT_URI: str = Field(default="http://localhost:8000/api/auth/google/callback", env="GOOGLE_REDIRECT_URI")
+    GOOGLE_DISCOVERY_URL: str = Field(default="https://accounts.google.com/.well-known/openid-configuration", env="GOOGLE_DISCOVERY_URL")
+    OIDC_DEFAULT_CACHE_SECONDS: int = Field(default=3600, env="OIDC_DEFAULT_CACHE_SECONDS")
+    OIDC_WARMUP_TIMEOUT_SECONDS: float = Field(default=5.0, env="OIDC_WARMUP_TIMEOUT_SECONDS")
     
     # Slack Integration
     SLACK_BOT_TOKEN: str = Field(default="", env="SLACK_BOT_TOKEN")
     SLACK_SIGNING_SECRET: str = Field(default="", env="SLACK_SIGNING_SECRET")
     SLACK_WEBHOOK_URL: str = Field(default="", env="SLACK_WEBHOOK_URL")
+    SLACK_API_URL: str = Field(default="https://slack.com/api/", env="SLACK_API_URL")  # Point at a fake server in tests
+    SLACK_TIMEOUT_SECONDS: int = Field(default=10, env="SLACK_TIMEOUT_SECONDS")
+    SLACK_OUTBOX_CAPACITY: int = Field(default=1000, env="SLACK_OUTBOX_CAPACITY")  # Queued messages before new ones are dropped
+    SLACK_MAX_ATTEMPTS: int = Field(default=5, env="SLACK_MAX_ATTEMPTS")
+    SLACK_COALESCE_WINDOW_SECONDS: float = Field(default=10.0, env="SLACK_COALESCE_WINDOW_SECONDS")  # Events arriving within this window share one message
+    SLACK_CHANNEL_MESSAGES_PER_MINUTE: int = Field(default=6, env="SLACK_CHANNEL_MESSAGES_PER_MINUTE")
+    SLACK_CHANNEL_BURST: int = Field(default=3, env="SLACK_CHANNEL_BURST")
+    SLACK_DIGEST_EVENTS_PER_MINUTE: int = Field(default=30, env="SLACK_DIGEST_EVENTS_PER_MINUTE")  # Busier channels get periodic digests
+    SLACK_DIGEST_SECONDS: float = Field(default=300.0, env="SLACK_DIGEST_SECONDS")
     
     # OpenAI for AI Summarization
     OPENAI_API_KEY: str = Field(default="", env="OPENAI_API_KEY")
+    LLM_BACKEND: str = Field(default="openai", env="LLM_BACKEND")  # openai | fake (offline load tests)
+    LLM_FAKE_LATENCY_MS: float = Field(default=300.0, env="LLM_FAKE_LATENCY_MS")  # Mean latency
+    LLM_FAKE_LATENCY_DISTRIBUTION: str = Field(default="lognormal", env="LLM_FAKE_LATENCY_DISTRIBUTION")  # constant | uniform | lognormal
+    LLM_FAKE_ERROR_RATE: float = Field(default=0.0, env="LLM_FAKE_ERROR_RATE")  # Share of calls failing transiently
+    LLM_FAKE_RATE_LIMIT_RATE: float = Field(default=0.0, env="LLM_FAKE_RATE_LIMIT_RATE")  # Share of calls answered 429
+    LLM_FAKE_CHUNK_MS: float = Field(default=20.0, env="LLM_FAKE_CHUNK_MS")  # Delay between streamed chunks
+    LLM_FAKE_SEED: int = Field(default=0, env="LLM_FAKE_SEED")
+    ENRICHMENT_WORKERS: int = Field(default=2, env="ENRICHMENT_WORKERS")  # 0 disables in-app workers
+    ENRICHMENT_MAX_ATTEMPTS: int = Field(default=5, env="ENRICHMENT_MAX_ATTEMPTS")
+    ENRICHMENT_POLL_SECONDS: float = Field(default=2.0, env="ENRICHMENT_POLL_SECONDS")
+    ENRICHMENT_LEASE_SECONDS: int = Field(default=300, env="ENRICHMENT_LEASE_SECONDS")
+    SUMMARY_DEBOUNCE_SECONDS: int = Field(default=30, env="SUMMARY_DEBOUNCE_SECONDS")  # Quiet period before re-summarizing
+    AI_CACHE_MEMORY_ENTRIES: int = Field(default=2000, env="AI_CACHE_MEMORY_ENTRIES")
+    AI_CACHE_MAX_BYTES: int = Field(default=50 * 1024 * 1024, env="AI_CACHE_MAX_BYTES")
+    AI_TOKEN_MEMO_MAX_TOKENS: int = Field(default=2_000_000, env="AI_TOKEN_MEMO_MAX_TOKENS")  # Memoized token ids, ~4 bytes each
+    AI_APPROXIMATE_TOKENS: bool = Field(default=False, env="AI_APPROXIMATE_TOKENS")  # Allow approximate token counts when tiktoken's vocabulary can't be fetched
+    TAG_SUGGESTER_MIN_CONFIDENCE: float = Field(default=0.35, env="TAG_SUGGESTER_MIN_CONFIDENCE")  # Below this, ask the LLM
+    TAG_SUGGESTER_REFRESH_SECONDS: int = Field(default=300, env="TAG_SUGGESTER_REFRESH_SECONDS")
+    DUPLICATE_THRESHOLD: float = Field(default=0.5, env="DUPLICATE_THRESHOLD")  # Estimated Jaccard similarity of word pairs
+    DUPLICATE_REFRESH_SECONDS: int = Field(default=300, env="DUPLICATE_REFRESH_SECONDS")
+    RELATED_INDEX_DIR: str = Field(default="related_index", env="RELATED_INDEX_DIR")  # Memory-mapped vectors shared by all workers
+    RELATED_TOP_K: int = Field(default=10, env="RELATED_TOP_K")
+    RELATED_MAX_PENDING: int = Field(default=2000, env="RELATED_MAX_PENDING")  # Newest unindexed questions scored per update
+    AI_QUALITY_BATCH_TOKENS: int = Field(default=3000, env="AI_QUALITY_BATCH_TOKENS")  # Prompt budget per batch call
+    AI_QUALITY_BATCH_MAX_ANSWERS: int = Field(default=20, env="AI_QUALITY_BATCH_MAX_ANSWERS")
+    AI_REQUESTS_PER_MINUTE: int = Field(default=3500, env="AI_REQUESTS_PER_MINUTE")
+    AI_TOKENS_PER_MINUTE: int = Field(default=90000, env="AI_TOKENS_PER_MINUTE")
+    AI_MIN_CONCURRENCY: int = Field(default=1, env="AI_MIN_CONCURRENCY")
+    AI_MAX_CONCURRENCY: int = Field(default=16, env="AI_MAX_CONCURRENCY")
+    AI_TARGET_LATENCY_SECONDS: float = Field(default=10.0, env="AI_TARGET_LATENCY_SECONDS")
+    AI_MAX_RETRIES: int = Field(default=4, env="AI_MAX_RETRIES")
+    AI_INFLIGHT_LEASE_SECONDS: int = Field(default=60, env="AI_INFLIGHT_LEASE_SECONDS")  # Cross-worker generation lock (shared with CACHE_BACKEND=redis)
+    AI_INFLIGHT_POLL_SECONDS: float = Field(default=0.25, env="AI_INFLIGHT_POLL_SECONDS")
     
     # AWS Configuration
     AWS_ACCESS_KEY_ID: str = Field(default="", env="AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY: str = Field(default="", env="AWS_SECRET_ACCESS_KEY")
     AWS_REGION: str = Field(default="us-east-1", env="AWS_REGION")
     AWS_S3_BUCKET: str = Field(default="", env="AWS_S3_BUCKET")
+    AWS_ENDPOINT_URL: str = Field(default="", env="AWS_ENDPOINT_URL")  # S3-compatible stand-in for tests (MinIO, moto)
+    AWS_MAX_WORKERS: int = Field(default=8, env="AWS_MAX_WORKERS")  # Threads running boto3 calls
+    AWS_MAX_POOL_CONNECTIONS: int = Field(default=10, env="AWS_MAX_POOL_CONNECTIONS")  # Per client; keep >= AWS_MAX_WORKERS
+    AWS_CONNECT_TIMEOUT_SECONDS: float = Field(default=5.0, env="AWS_CONNECT_TIMEOUT_SECONDS")
+    AWS_READ_TIMEOUT_SECONDS: float = Field(default=60.0, env="AWS_READ_TIMEOUT_SECONDS")
+    AWS_MAX_ATTEMPTS: int = Field(default=3, env="AWS_MAX_ATTEMPTS")
+    METRICS_SINK: str = Field(default="cloudwatch", env="METRICS_SINK")  # cloudwatch | memory (tests)
+    METRICS_NAMESPACE: str = Field(default="QAPlatform", env="METRICS_NAMESPACE")
+    METRICS_FLUSH_SECONDS: float = Field(default=60.0, env="METRICS_FLUSH_SECONDS")
+    METRICS_CONFIRM_SECONDS: float = Field(default=5.0, env="METRICS_CONFIRM_SECONDS")  # Max wait for outbox events' metrics to be sent
     
     # Redis for caching
     REDIS_URL: str = Field(default="redis://localhost:6379", env="REDIS_URL")
+    CACHE_BACKEND: str = Field(default="memory", env="CACHE_BACKEND")  # memory | redis
+    
+    # Password hashing
+    PASSWORD_HASH_WORKERS: int = Field(default=2, env="PASSWORD_HASH_WORKERS")
+    PASSWORD_HASH_QUEUE_SIZE: int = Field(default=64, env="PASSWORD_HASH_QUEUE_SIZE")
+    LOGIN_MAX_FAILURES: int = Field(default=5, env="LOGIN_MAX_FAILURES")
+    LOGIN_FAILURE_WINDOW: int = Field(default=900, env="LOGIN_FAILURE_WINDOW")  # seconds
+    TRUSTED_PROXIES: List[str] = Field(default=[], env="TRUSTED_PROXIES")  # Addresses/CIDRs whose X-Forwarded-For is believed
+    
+    # Token revocation
+    REVOCATION_BLOOM_SIZE: int = Field(default=1 << 20, env="REVOCATION_BLOOM_SIZE")  # bits
+    REVOCATION_BLOOM_HASHES: int = Field(default=7, env="REVOCATION_BLOOM_HASHES")
+    REVOCATION_REFRESH_SECONDS: int = Field(default=30, env="REVOCATION_REFRESH_SECONDS")
     
     # Email Configuration
     SMTP_HOST: str = Field(default="smtp.gmail.com", env="SMTP_HOST")
@@ -65,6 +135,18 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = Field(default=20, env="DEFAULT_PAGE_SIZE")
     MAX_PAGE_SIZE: int = Field(default=100, env="MAX_PAGE_SIZE")
     
+    # Home feed
+    FEED_MAX_LENGTH: int = Field(default=500, env="FEED_MAX_LENGTH")
+    FEED_ACTIVE_DAYS: int = Field(default=14, env="FEED_ACTIVE_DAYS")
+    
+    # Transactional outbox (Slack, CloudWatch and enrichment side effects)
+    OUTBOX_DISPATCH_IN_APP: bool = Field(default=True, env="OUTBOX_DISPATCH_IN_APP")  # Set False when running dispatcher.py
+    OUTBOX_BATCH_SIZE: int = Field(default=100, env="OUTBOX_BATCH_SIZE")
+    OUTBOX_MAX_IN_FLIGHT: int = Field(default=1000, env="OUTBOX_MAX_IN_FLIGHT")  # Events waiting on Slack coalescing count here
+    OUTBOX_POLL_SECONDS: float = Field(default=1.0, env="OUTBOX_POLL_SECONDS")
+    OUTBOX_LEASE_SECONDS: int = Field(default=600, env="OUTBOX_LEASE_SECONDS")  # Longer than a Slack digest window
+    OUTBOX_MAX_ATTEMPTS: int = Field(default=10, env="OUTBOX_MAX_ATTEMPTS")
+    
     # Search
     SEARCH_RESULTS_LIMIT: int = Field(default=50, env="SEARCH_RESULTS_LIMIT")
     
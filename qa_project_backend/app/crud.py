@@ -1,14 +1,17 @@
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
 from . import models, schemas
-from passlib.context import CryptContext
+from .config import settings
+from .passwords import pwd_context
+from .services.duplicate_index import duplicate_index
 from typing import List, Optional
-from sqlalchemy import or_, func, desc, asc, and_
+from sqlalchemy import or_, func, desc, asc, and_, true
 from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 # =====================
@@ -27,10 +30,13 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Get user by email"""
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    """Create a new user with all default values"""
+def create_user(db: Session, user: schemas.UserCreate, password_hash: Optional[str] = None) -> models.User:
+    """Create a new user with all default values.
+    
+    Pass a precomputed ``password_hash`` to keep bcrypt off the calling thread.
+    """
     try:
-        hashed_password = pwd_context.hash(user.password)
+        hashed_password = password_hash or pwd_context.hash(user.password)
         db_user = models.User(
             username=user.username,
             first_name=user.first_name,
@@ -99,8 +105,19 @@ def create_question(db: Session, user_id: int, question: schemas.QuestionCreate)
             models.User.questions_count: models.User.questions_count + 1
         })
         
+        db.flush()
+        fan_out_feed_event(db, db_question.id, user_id, "asked")
+        
+        # AI enrichment happens out of band
+        if not db_question.tags:
+            enqueue_enrichment(db, "question", db_question.id, "suggest_tags")
+        enqueue_enrichment(db, "question", db_question.id, "summarize")
+        enqueue_enrichment(db, "question", db_question.id, "related")
+        record_event(db, "question.created", db_question.id, {"question_id": db_question.id, "user_id": user_id})
+        
         db.commit()
         db.refresh(db_question)
+        duplicate_index.observe(db_question.id, db_question.title, db_question.content)
         return db_question
     except SQLAlchemyError as e:
         db.rollback()
@@ -148,6 +165,35 @@ def get_question_with_answers_and_stars(db: Session, question_id: int, current_u
     
     return question
 
+def _normalized(text: Optional[str]) -> str:
+    return " ".join((text or "").split())
+
+def update_question(db: Session, question: models.Question, update: schemas.QuestionUpdate) -> models.Question:
+    """Apply provided fields; bumps the version (and queues a summary refresh) only if the text changed"""
+    try:
+        update_data = update.dict(exclude_unset=True, exclude_none=True)
+        text_changed = any(
+            _normalized(update_data[field]) != _normalized(getattr(question, field))
+            for field in ("title", "content") if field in update_data
+        )
+        tags_changed = "tags" in update_data and _normalized(update_data["tags"]) != _normalized(question.tags)
+        
+        for field, value in update_data.items():
+            setattr(question, field, value)
+        
+        if text_changed:
+            question.version = (question.version or 1) + 1
+            enqueue_enrichment(db, "question", question.id, "summarize", settings.SUMMARY_DEBOUNCE_SECONDS)
+        if text_changed or tags_changed:
+            enqueue_enrichment(db, "question", question.id, "related", settings.SUMMARY_DEBOUNCE_SECONDS)
+        
+        db.commit()
+        db.refresh(question)
+        return question
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise Exception(f"Failed to update question: {str(e)}")
+
 def list_questions(db: Session, skip: int = 0, limit: int = 100) -> List[models.Question]:
     """Get paginated list of questions with user info, ordered by recent activity"""
     return db.query(models.Question).options(
@@ -304,6 +350,18 @@ def create_answer(db: Session, user_id: int, question_id: int, answer: schemas.A
             models.User.answers_count: models.User.answers_count + 1
         })
         
+        db.flush()
+        fan_out_feed_event(db, question_id, user_id, "answered")
+        
+        # AI enrichment happens out of band; bursts of answers share one summary refresh
+        enqueue_enrichment(db, "answer", db_answer.id, "quality_score")
+        enqueue_enrichment(db, "question", question_id, "summarize", settings.SUMMARY_DEBOUNCE_SECONDS)
+        record_event(db, "answer.created", db_answer.id, {
+            "answer_id": db_answer.id,
+            "question_id": question_id,
+            "user_id": user_id
+        })
+        
         db.commit()
         db.refresh(db_answer)
         return db_answer
@@ -311,6 +369,40 @@ def create_answer(db: Session, user_id: int, question_id: int, answer: schemas.A
         db.rollback()
         raise Exception(f"Failed to create answer: {str(e)}")
 
+def update_answer(db: Session, answer: models.Answer, update: schemas.AnswerUpdate) -> models.Answer:
+    """Apply provided fields; a content change bumps the version and queues a summary refresh"""
+    try:
+        update_data = update.dict(exclude_unset=True, exclude_none=True)
+        content_changed = "content" in update_data and _normalized(update_data["content"]) != _normalized(answer.content)
+        
+        for field, value in update_data.items():
+            setattr(answer, field, value)
+        
+        if content_changed:
+            answer.version = (answer.version or 1) + 1
+            enqueue_enrichment(db, "answer", answer.id, "quality_score")
+            enqueue_enrichment(db, "question", answer.question_id, "summarize", settings.SUMMARY_DEBOUNCE_SECONDS)
+        
+        db.commit()
+        db.refresh(answer)
+        return answer
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise Exception(f"Failed to update answer: {str(e)}")
+
+def delete_answer(db: Session, answer: models.Answer) -> None:
+    """Delete an answer, decrement its author's answer count and queue a summary refresh"""
+    try:
+        db.query(models.User).filter(models.User.id == answer.user_id).update({
+            models.User.answers_count: models.User.answers_count - 1
+        })
+        enqueue_enrichment(db, "question", answer.question_id, "summarize", settings.SUMMARY_DEBOUNCE_SECONDS)
+        db.delete(answer)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise Exception(f"Failed to delete answer: {str(e)}")
+
 def get_answers_for_question(db: Session, question_id: int) -> List[models.Answer]:
     """Get all answers for a question with user info, ordered by creation time"""
     return db.query(models.Answer).options(
@@ -371,6 +463,15 @@ def star_answer(db: Session, user_id: int, question_id: int, answer_id: int) ->
             models.User.reputation: models.User.reputation + 1
         })
         
+        db.flush()
+        fan_out_feed_event(db, question_id, user_id, "starred")
+        record_event(db, "answer.starred", new_star.id, {
+            "star_id": new_star.id,
+            "answer_id": answer_id,
+            "question_id": question_id,
+            "user_id": user_id
+        })
+        
         db.commit()
         db.refresh(new_star)
         return new_star
@@ -457,6 +558,139 @@ def personalized_feed(db: Session, interests: str, limit: int = 50) -> List[mode
         desc(models.Question.created_at)
     ).limit(limit).all()
 
+def _feed_active_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(days=settings.FEED_ACTIVE_DAYS)
+
+def _push_feed_entry(db: Session, user_id: int, question_id: int, actor_id: int, reason: str) -> None:
+    """Move a question to the head of a user's feed and trim the feed to its cap"""
+    db.query(models.FeedEntry).filter(
+        models.FeedEntry.user_id == user_id,
+        models.FeedEntry.question_id == question_id
+    ).delete(synchronize_session=False)
+    
+    db.add(models.FeedEntry(
+        user_id=user_id,
+        question_id=question_id,
+        actor_id=actor_id,
+        reason=reason
+    ))
+    db.flush()
+    
+    # Oldest id still inside the cap; everything at or below the next one goes
+    overflow_id = db.query(models.FeedEntry.id).filter(
+        models.FeedEntry.user_id == user_id
+    ).order_by(desc(models.FeedEntry.id)).offset(settings.FEED_MAX_LENGTH).limit(1).scalar()
+    
+    if overflow_id is not None:
+        db.query(models.FeedEntry).filter(
+            models.FeedEntry.user_id == user_id,
+            models.FeedEntry.id <= overflow_id
+        ).delete(synchronize_session=False)
+
+def fan_out_feed_event(db: Session, question_id: int, actor_id: int, reason: str) -> None:
+    """Push question activity into the feeds of its asker, answerers and starrers.
+    
+    Only users with an active (recently read) feed are written to; everyone
+    else is rebuilt from source the next time they open their feed.
+    Runs inside the caller's transaction.
+    """
+    recipients = db.query(models.FeedState.user_id).filter(
+        or_(
+            models.FeedState.user_id.in_(
+                db.query(models.Question.user_id).filter(models.Question.id == question_id)
+            ),
+            models.FeedState.user_id.in_(
+                db.query(models.Answer.user_id).filter(models.Answer.question_id == question_id)
+            ),
+            models.FeedState.user_id.in_(
+                db.query(models.Star.user_id).filter(models.Star.question_id == question_id)
+            )
+        ),
+        models.FeedState.last_read_at >= _feed_active_cutoff()
+    ).all()
+    
+    for (recipient_id,) in recipients:
+        _push_feed_entry(db, recipient_id, question_id, actor_id, reason)
+
+def rebuild_user_feed(db: Session, user_id: int) -> None:
+    """Recompute a user's feed from the questions they asked, answered or starred"""
+    db.query(models.FeedEntry).filter(
+        models.FeedEntry.user_id == user_id
+    ).delete(synchronize_session=False)
+    
+    involvement = {}
+    for reason, query in (
+        ("starred", db.query(models.Star.question_id).filter(models.Star.user_id == user_id)),
+        ("answered", db.query(models.Answer.question_id).filter(models.Answer.user_id == user_id)),
+        ("asked", db.query(models.Question.id).filter(models.Question.user_id == user_id)),
+    ):
+        # Later sources win, so "asked" beats "answered" beats "starred"
+        for (question_id,) in query.distinct():
+            involvement[question_id] = reason
+    
+    if not involvement:
+        return
+    
+    last_answer = db.query(
+        models.Answer.question_id.label("question_id"),
+        func.max(models.Answer.created_at).label("last_answer_at")
+    ).group_by(models.Answer.question_id).subquery()
+    
+    activity_at = func.coalesce(last_answer.c.last_answer_at, models.Question.created_at)
+    recent = db.query(models.Question.id).outerjoin(
+        last_answer, last_answer.c.question_id == models.Question.id
+    ).filter(
+        models.Question.id.in_(list(involvement))
+    ).order_by(desc(activity_at), desc(models.Question.id)).limit(settings.FEED_MAX_LENGTH).all()
+    
+    # Insert oldest first so entry ids increase with recency
+    db.add_all([
+        models.FeedEntry(user_id=user_id, question_id=question_id, reason=involvement[question_id])
+        for (question_id,) in reversed(recent)
+    ])
+
+def get_user_feed(db: Session, user_id: int, cursor: Optional[int] = None, limit: int = 20) -> dict:
+    """Read a page of the user's materialized feed, newest first.
+    
+    ``cursor`` is the last entry id of the previous page.
+    """
+    now = datetime.utcnow()
+    state = db.query(models.FeedState).filter(models.FeedState.user_id == user_id).first()
+    
+    try:
+        if state is None or state.last_read_at.replace(tzinfo=None) < _feed_active_cutoff():
+            # Inactive feeds stopped receiving fan-out; rebuild from source
+            rebuild_user_feed(db, user_id)
+            if state is None:
+                state = models.FeedState(user_id=user_id, rebuilt_at=now, last_read_at=now)
+                db.add(state)
+            state.rebuilt_at = now
+            state.last_read_at = now
+            db.commit()
+        elif now - state.last_read_at.replace(tzinfo=None) > timedelta(hours=1):
+            # Keep the feed marked active without writing on every read
+            state.last_read_at = now
+            db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise Exception(f"Failed to refresh feed: {str(e)}")
+    
+    query = db.query(models.FeedEntry).options(
+        joinedload(models.FeedEntry.question).joinedload(models.Question.user)
+    ).filter(models.FeedEntry.user_id == user_id)
+    
+    if cursor:
+        query = query.filter(models.FeedEntry.id < cursor)
+    
+    entries = query.order_by(desc(models.FeedEntry.id)).limit(limit + 1).all()
+    
+    has_next = len(entries) > limit
+    entries = entries[:limit]
+    return {
+        "items": entries,
+        "next_cursor": entries[-1].id if has_next else None
+    }
+
 def get_trending_questions(db: Session, days: int = 7, limit: int = 20) -> List[models.Question]:
     """Get trending questions based on recent activity"""
     cutoff_date = datetime.utcnow() - timedelta(days=days)
@@ -496,6 +730,89 @@ def get_trending_questions_enhanced(db: Session, days: int = 7, limit: int = 20)
     return questions
 
 
+# =====================
+# AI Summary Freshness
+# =====================
+
+SUMMARY_ANSWERS = 3  # Oldest answers fed to the summarizer
+
+def get_summary_answers(db: Session, question_id: int) -> List[models.Answer]:
+    """The answers a question's summary is built from"""
+    return db.query(models.Answer).filter(
+        models.Answer.question_id == question_id
+    ).order_by(models.Answer.created_at.asc(), models.Answer.id.asc()).limit(SUMMARY_ANSWERS).all()
+
+def summary_fingerprint(question: models.Question, answers: List[models.Answer]) -> str:
+    """Hash of the summary inputs: question version plus the ids and versions of the answers used"""
+    parts = [f"q{question.id}:{question.version or 1}"] + [f"a{a.id}:{a.version or 1}" for a in answers]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def is_summary_fresh(db: Session, question: models.Question) -> bool:
+    """Whether the stored summary still matches the question and its answers"""
+    if not question.ai_summary or not question.ai_summary_fingerprint:
+        return False
+    return question.ai_summary_fingerprint == summary_fingerprint(question, get_summary_answers(db, question.id))
+
+
+# =====================
+# AI Enrichment Queue
+# =====================
+
+def enqueue_enrichment(db: Session, entity_type: str, entity_id: int, operation: str, delay_seconds: float = 0) -> None:
+    """Queue AI enrichment for an entity inside the caller's transaction.
+    
+    Jobs are deduplicated per (entity, operation): re-enqueueing an existing
+    job resets it to pending and bumps its generation, so a job that is
+    already running is picked up again afterwards instead of being lost.
+    """
+    run_after = datetime.utcnow() + timedelta(seconds=delay_seconds)
+    
+    job = db.query(models.EnrichmentJob).filter(
+        models.EnrichmentJob.entity_type == entity_type,
+        models.EnrichmentJob.entity_id == entity_id,
+        models.EnrichmentJob.operation == operation
+    ).first()
+    
+    if job is None:
+        db.add(models.EnrichmentJob(
+            entity_type=entity_type,
+            entity_id=entity_id,
+            operation=operation,
+            status="pending",
+            generation=1,
+            attempts=0,
+            run_after=run_after
+        ))
+    else:
+        job.status = "pending"
+        job.generation = job.generation + 1
+        job.attempts = 0
+        job.last_error = ""
+        job.run_after = run_after
+
+
+# =====================
+# Outbox Events
+# =====================
+
+def record_event(db: Session, event_type: str, aggregate_id: int, payload: dict) -> None:
+    """Record a side effect of this write in the outbox, inside the caller's transaction.
+    
+    The dispatcher delivers it after commit; if the transaction rolls back
+    the event disappears with it. The idempotency key makes recording the
+    same fact twice fail instead of notifying twice.
+    """
+    db.add(models.OutboxEvent(
+        event_type=event_type,
+        aggregate_id=aggregate_id,
+        idempotency_key=f"{event_type}:{aggregate_id}",
+        payload=json.dumps(payload),
+        status="pending",
+        completed_handlers="",
+        attempts=0
+    ))
+
+
 # =====================
 # Enhanced Statistics & Analytics
 # =====================
@@ -566,6 +883,58 @@ def get_platform_stats(db: Session) -> dict:
         "total_views": db.query(func.sum(models.Question.views_count)).scalar() or 0
     }
 
+def get_ai_platform_stats(db: Session) -> dict:
+    """Counts and average quality scores for questions and answers, in one statement"""
+    question_stats = db.query(
+        func.count(models.Question.id).label("total_questions"),
+        func.count(models.Question.id).filter(models.Question.ai_summary != "").label("questions_with_summaries"),
+        func.avg(models.Question.quality_score).filter(models.Question.quality_score > 0).label("average_question_quality")
+    ).subquery()
+    answer_stats = db.query(
+        func.count(models.Answer.id).label("total_answers"),
+        func.avg(models.Answer.quality_score).filter(models.Answer.quality_score > 0).label("average_answer_quality")
+    ).subquery()
+    
+    # Both derived tables are a single row, so the join is one row too
+    row = db.query(question_stats, answer_stats).join(answer_stats, true()).one()
+    return {
+        "total_questions": row.total_questions,
+        "total_answers": row.total_answers,
+        "questions_with_summaries": row.questions_with_summaries,
+        "average_question_quality": float(row.average_question_quality or 0),
+        "average_answer_quality": float(row.average_answer_quality or 0)
+    }
+
+def get_quality_score_distribution(db: Session, entity_type: str, percentiles=(25, 50, 75, 90, 99)) -> dict:
+    """Histogram (10-point bins) and nearest-rank percentiles of quality scores, read from the bucket table"""
+    buckets = db.query(
+        models.QualityScoreBucket.score,
+        func.sum(models.QualityScoreBucket.count)
+    ).filter(
+        models.QualityScoreBucket.entity_type == entity_type
+    ).group_by(models.QualityScoreBucket.score).order_by(models.QualityScoreBucket.score).all()
+    buckets = [(score, int(count)) for score, count in buckets if count > 0]
+    total = sum(count for _, count in buckets)
+    
+    bins = [0] * 10
+    for score, count in buckets:
+        bins[min(max(score, 0) // 10, 9)] += count  # 100 joins the 90-100 bin
+    histogram = [
+        {"min": i * 10, "max": 100 if i == 9 else i * 10 + 9, "count": bins[i]}
+        for i in range(10)
+    ]
+    
+    values = {}
+    cumulative, position = 0, 0
+    for p in percentiles:
+        rank = max(1, -(-p * total // 100))  # ceil(p% of total)
+        while position < len(buckets) and cumulative + buckets[position][1] < rank:
+            cumulative += buckets[position][1]
+            position += 1
+        values[f"p{p}"] = buckets[position][0] if position < len(buckets) else None
+    
+    return {"count": total, "histogram": histogram, "percentiles": values}
+
 
 # =====================
 # Utility Functions (Deprecated - keeping for backward compatibility)
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect, text
+import asyncio
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 import logging
 from .config import settings
 
@@ -8,14 +9,17 @@ logger = logging.getLogger(__name__)
 
 # Configure engine based on database type
 if settings.DATABASE_URL.startswith("sqlite"):
-    # SQLite specific configuration
+    # SQLite specific configuration. Workers and executor threads each need their
+    # own connection: a shared one makes concurrent sessions nest transactions.
+    # Only an in-memory database has to share its single connection.
+    in_memory = settings.DATABASE_URL in ("sqlite://", "sqlite:///:memory:")
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={
             "check_same_thread": False,
-            "timeout": 20  # Prevent database locks
+            "timeout": 20  # Busy timeout: wait for the writer instead of failing
         },
-        poolclass=StaticPool,
+        poolclass=StaticPool if in_memory else NullPool,
         echo=settings.DATABASE_ECHO,
         pool_pre_ping=True  # Validate connections before use
     )
@@ -71,10 +75,38 @@ def get_db():
     finally:
         db.close()
 
+def in_thread(fn, *args):
+    """Run blocking session work on the default executor; await the result from async code"""
+    return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+# Columns added to tables that already existed in deployed databases. create_all
+# never alters an existing table, so upgrade_schema adds them in place.
+ADDED_COLUMNS = [
+    ("questions", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("questions", "ai_summary_fingerprint", "VARCHAR(64) DEFAULT ''"),
+    ("answers", "version", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+def upgrade_schema():
+    """Add any of ADDED_COLUMNS missing from existing tables (safe to run repeatedly)"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = [
+        (table, column, ddl) for table, column, ddl in ADDED_COLUMNS
+        if table in tables and column not in {c["name"] for c in inspector.get_columns(table)}
+    ]
+    if not missing:
+        return
+    with engine.begin() as connection:
+        for table, column, ddl in missing:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            logger.info(f"Added column {table}.{column}")
+
 def create_tables():
-    """Create all database tables"""
+    """Create all database tables and add columns introduced since they were created"""
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_schema()
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating tables: {e}")
@@ -93,15 +125,9 @@ def check_database_connection():
     """Check if database connection is working"""
     try:
         with engine.connect() as connection:
-            connection.execute("SELECT 1")
+            connection.execute(text("SELECT 1"))
         logger.info("Database connection successful")
         return True
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         return False
-
-# Initialize database on import
-if __name__ != "__main__":
-    # Check connection on startup
-    if not check_database_connection():
-        raise Exception("Failed to connect to database")
\ No newline at end of file
@@ -2,11 +2,25 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 import uvicorn
 
 from .config import settings
-from .database import engine, Base
+from .passwords import password_hasher
+from .services.oauth_service import oauth_service
+from .services.enrichment import enrichment_queue
+from .services.outbox import outbox_dispatcher
+from .services.metrics import metrics, LatencyMiddleware
+from .services.tag_suggester import tag_suggester
+from .services.duplicate_index import duplicate_index
+from .services.summary_stream import summary_stream_hub
+from .services.slack_service import slack_service
+from .services.aws_service import aws_service
+from .services.ai_cache import ai_cache
+from .services.llm_backend import llm_configured
+from .database import check_database_connection, create_tables
+from .services import registry
 from .routes import auth as auth_router, questions as q_router, answers as answers_router
 from .routes import ai as ai_router, integrations as integrations_router
 
@@ -17,14 +31,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create tables at startup (safe with SQLAlchemy)
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
-    raise
-
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
@@ -51,6 +57,9 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Request latency and status counts, flushed to CloudWatch in batches
+app.add_middleware(LatencyMiddleware, aggregator=metrics)
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -78,11 +87,11 @@ async def read_root():
         "message": f"Welcome to {settings.APP_NAME}!",
         "version": settings.APP_VERSION,
         "features": {
-            "ai_summarization": bool(settings.OPENAI_API_KEY),
+            "ai_summarization": llm_configured(),
             "slack_integration": bool(settings.SLACK_BOT_TOKEN),
             "aws_integration": bool(settings.AWS_ACCESS_KEY_ID),
             "google_oauth": bool(settings.GOOGLE_CLIENT_ID)
-        }
+        },
         "docs_url": settings.DOCS_URL,
         "redoc_url": settings.REDOC_URL
     }
@@ -90,16 +99,9 @@ async def read_root():
 # Include routers with API prefix
 app.include_router(
     auth_router.router, 
-        "features": [
-            "AI-powered question summarization",
-            "Google OAuth integration",
-            "Slack notifications",
-            "AWS S3 backup & CloudWatch metrics",
-            "Real-time analytics"
-        ]
     prefix=settings.API_PREFIX,
     tags=["authentication"]
-        "message": f"Welcome to {settings.APP_NAME} with AI Summarization & Integrations!",
+)
 app.include_router(
     q_router.router, 
     prefix=settings.API_PREFIX,
@@ -129,16 +131,47 @@ async def startup_event():
     logger.info(f"Debug mode: {settings.DEBUG}")
     logger.info(f"Database: {settings.DATABASE_URL}")
     logger.info(f"CORS origins: {settings.CORS_ORIGINS}")
-    logger.info(f"AI Summarization: {'Enabled' if settings.OPENAI_API_KEY else 'Disabled'}")
+    logger.info(f"AI Summarization: {'Enabled' if llm_configured() else 'Disabled'} ({settings.LLM_BACKEND} backend)")
     logger.info(f"Slack Integration: {'Enabled' if settings.SLACK_BOT_TOKEN else 'Disabled'}")
     logger.info(f"AWS Integration: {'Enabled' if settings.AWS_ACCESS_KEY_ID else 'Disabled'}")
     logger.info(f"Google OAuth: {'Enabled' if settings.GOOGLE_CLIENT_ID else 'Disabled'}")
+    
+    # Database checks run here rather than at import so scripts and tests start fast
+    if not check_database_connection():
+        raise Exception("Failed to connect to database")
+    create_tables()
+    
+    # Build service singletons in the background instead of on the first request
+    if settings.PREWARM_SERVICES:
+        asyncio.get_running_loop().run_in_executor(None, registry.prewarm)
+    
+    oauth_service.start()
+    tag_suggester.start()
+    duplicate_index.start()
+    enrichment_queue.start()
+    metrics.start()
+    if settings.OUTBOX_DISPATCH_IN_APP:
+        outbox_dispatcher.start()
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
     logger.info(f"Shutting down {settings.APP_NAME}")
+    await outbox_dispatcher.stop()
+    await enrichment_queue.stop()
+    await metrics.stop()  # Final flush
+    await tag_suggester.stop()
+    await duplicate_index.stop()
+    await summary_stream_hub.stop()
+    password_hasher.shutdown()
+    await asyncio.get_running_loop().run_in_executor(None, ai_cache.flush)
+    if registry.is_loaded("oauth_service"):
+        await oauth_service.stop()
+    if registry.is_loaded("slack_service"):
+        await slack_service.stop()
+    if registry.is_loaded("aws_service"):
+        aws_service.shutdown()  # After the final metrics flush, which uses it
 
 # Run the application
 if __name__ == "__main__":
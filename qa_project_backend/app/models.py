@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint, Index
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, UniqueConstraint, Index, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import logging
 from .database import Base
 
+logger = logging.getLogger(__name__)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -66,6 +69,8 @@ class Question(Base):
     suggested_tags = Column(String(500), default="")  # AI-suggested tags
     slack_notified = Column(Integer, default=0)  # Whether Slack was notified
     quality_score = Column(Integer, default=50)  # AI quality score 0-100
+    version = Column(Integer, default=1, nullable=False)  # Bumped when title/content change
+    ai_summary_fingerprint = Column(String(64), default="")  # Inputs the current summary was built from
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -97,6 +102,7 @@ class Answer(Base):
     # AI & Quality fields
     quality_score = Column(Integer, default=50)  # AI-generated quality score 0-100
     is_ai_generated = Column(Integer, default=0)  # Whether this is AI-generated
+    version = Column(Integer, default=1, nullable=False)  # Bumped when content changes
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -160,4 +166,211 @@ class QuestionView(Base):
         Index('idx_question_views_tracking', 'question_id', 'user_id', 'ip_address'),
         Index('idx_question_views_created', 'created_at'),
         Index('idx_question_views_question', 'question_id'),
-    )
\ No newline at end of file
+    )
+
+class FeedEntry(Base):
+    """Materialized home-feed row: latest activity on a question a user is involved in"""
+    __tablename__ = "feed_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    reason = Column(String(20), nullable=False)  # asked | answered | starred
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    
+    # Timestamp
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    # Relationships
+    question = relationship("Question")
+    
+    # Indexes for cursor pagination (user_id, id DESC) and per-question replacement
+    __table_args__ = (
+        Index('idx_feed_user_id', 'user_id', 'id'),
+        Index('idx_feed_user_question', 'user_id', 'question_id'),
+    )
+
+class FeedState(Base):
+    """Tracks whose feeds are materialized; inactive users are rebuilt lazily on read"""
+    __tablename__ = "feed_states"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rebuilt_at = Column(DateTime(timezone=True), nullable=False)
+    last_read_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_feed_state_last_read', 'last_read_at'),
+    )
+
+class AIResult(Base):
+    """Persistent cache of AI outputs keyed by (operation, model, prompt version, content hash)"""
+    __tablename__ = "ai_results"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    operation = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    result = Column(Text, nullable=False)  # JSON-encoded
+    size_bytes = Column(Integer, default=0, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_ai_results_last_used', 'last_used_at'),
+        Index('idx_ai_results_operation', 'operation'),
+    )
+
+class EnrichmentJob(Base):
+    """Durable queue of out-of-band AI enrichment work, one row per (entity, operation)"""
+    __tablename__ = "enrichment_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String(20), nullable=False)  # question | answer
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String(30), nullable=False)  # suggest_tags | summarize | related | quality_score
+    status = Column(String(20), default="pending", nullable=False)  # pending | running | done | failed
+    generation = Column(Integer, default=0, nullable=False)  # Bumped on every (re-)enqueue
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, default="")
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease for running jobs
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Constraints and indexes
+    __table_args__ = (
+        UniqueConstraint("entity_type", "entity_id", "operation", name="unique_enrichment_job"),
+        Index('idx_enrichment_status_run_after', 'status', 'run_after', 'id'),
+    )
+
+class OutboxEvent(Base):
+    """Side effects of a write (Slack, CloudWatch, enrichment), recorded in the same transaction"""
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(40), nullable=False)  # question.created | answer.created | answer.starred
+    aggregate_id = Column(Integer, nullable=False)  # Id of the question, answer or star
+    idempotency_key = Column(String(100), nullable=False, unique=True)
+    payload = Column(Text, default="{}", nullable=False)  # JSON
+    status = Column(String(20), default="pending", nullable=False)  # pending | processing | done | failed
+    completed_handlers = Column(String(200), default="", nullable=False)  # Handlers that already ran, comma-separated
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, default="")
+    claim_token = Column(String(32), nullable=True)  # Dispatcher that holds the lease
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_outbox_status_available', 'status', 'available_at', 'id'),
+        Index('idx_outbox_claim_token', 'claim_token'),
+    )
+
+class QuestionRelated(Base):
+    """Precomputed related questions: the top TF-IDF neighbors of each question"""
+    __tablename__ = "question_related"
+    
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    related_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)  # Cosine similarity
+    
+    # Neighbors of a question are read best-first from this index alone
+    __table_args__ = (
+        Index('idx_question_related_score', 'question_id', 'score'),
+    )
+
+class QualityScoreBucket(Base):
+    """Row counts per exact quality score, kept current by triggers on questions and answers"""
+    __tablename__ = "quality_score_buckets"
+    
+    entity_type = Column(String(20), primary_key=True)  # question | answer
+    score = Column(Integer, primary_key=True)
+    shard = Column(Integer, primary_key=True)  # Spreads concurrent updates of one score over several rows
+    count = Column(Integer, default=0, nullable=False)  # A shard may go negative; only the sum is meaningful
+
+QUALITY_SCORE_TABLES = {"question": "questions", "answer": "answers"}
+QUALITY_SCORE_SHARDS = 8  # PostgreSQL only; SQLite serializes writers anyway
+
+def _bucket_upsert(entity_type: str, score: str, shard: str, delta: int) -> str:
+    """Add delta to a bucket, skipping NULL scores (SQLite and PostgreSQL syntax)"""
+    return (
+        f"INSERT INTO quality_score_buckets (entity_type, score, shard, count) "
+        f"SELECT {entity_type}, {score}, {shard}, {delta} WHERE {score} IS NOT NULL "
+        f"ON CONFLICT (entity_type, score, shard) DO UPDATE SET count = quality_score_buckets.count + ({delta});"
+    )
+
+def _quality_score_trigger_ddl(dialect: str) -> list:
+    if dialect == "sqlite":
+        statements = []
+        for entity_type, table in QUALITY_SCORE_TABLES.items():
+            add = _bucket_upsert(f"'{entity_type}'", "NEW.quality_score", "0", 1)
+            remove = _bucket_upsert(f"'{entity_type}'", "OLD.quality_score", "0", -1)
+            statements += [
+                f"CREATE TRIGGER trg_{table}_quality_insert AFTER INSERT ON {table} BEGIN {add} END",
+                f"CREATE TRIGGER trg_{table}_quality_delete AFTER DELETE ON {table} BEGIN {remove} END",
+                f"CREATE TRIGGER trg_{table}_quality_update AFTER UPDATE OF quality_score ON {table} "
+                f"WHEN OLD.quality_score IS NOT NEW.quality_score BEGIN {remove} {add} END",
+            ]
+        return statements
+
+    add = _bucket_upsert("TG_ARGV[0]", "NEW.quality_score", "bucket_shard", 1)
+    remove = _bucket_upsert("TG_ARGV[0]", "OLD.quality_score", "bucket_shard", -1)
+    statements = [f"""
+        CREATE OR REPLACE FUNCTION quality_score_bucket_sync() RETURNS trigger AS $$
+        DECLARE
+            bucket_shard integer := floor(random() * {QUALITY_SCORE_SHARDS});
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                {remove}
+            ELSIF TG_OP = 'INSERT' THEN
+                {add}
+            ELSIF OLD.quality_score IS DISTINCT FROM NEW.quality_score THEN
+                {remove}
+                {add}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql"""]
+    for entity_type, table in QUALITY_SCORE_TABLES.items():
+        statements.append(
+            f"CREATE TRIGGER trg_{table}_quality AFTER INSERT OR DELETE OR UPDATE OF quality_score ON {table} "
+            f"FOR EACH ROW EXECUTE PROCEDURE quality_score_bucket_sync('{entity_type}')"
+        )
+    return statements
+
+@event.listens_for(Base.metadata, "after_create")
+def install_quality_score_triggers(target, connection, **kw):
+    """Create the bucket triggers once, seeding the buckets from existing rows"""
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        logger.warning(f"Quality score buckets are not maintained on {dialect}")
+        return
+    
+    existing = (
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_answers_quality%'"
+        if dialect == "sqlite" else
+        "SELECT 1 FROM pg_trigger WHERE tgname LIKE 'trg_answers_quality%'"
+    )
+    if connection.execute(text(existing)).first():
+        return
+    
+    connection.execute(text("DELETE FROM quality_score_buckets"))
+    for entity_type, table in QUALITY_SCORE_TABLES.items():
+        connection.execute(text(
+            f"INSERT INTO quality_score_buckets (entity_type, score, shard, count) "
+            f"SELECT '{entity_type}', quality_score, 0, COUNT(*) FROM {table} "
+            f"WHERE quality_score IS NOT NULL GROUP BY quality_score"
+        ))
+    for statement in _quality_score_trigger_ddl(dialect):
+        connection.execute(text(statement))
+    logger.info("Quality score bucket triggers installed")
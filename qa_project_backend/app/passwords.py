@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def hash_password_sync(password: str) -> str:
+    """Hash a password using bcrypt (runs inside the worker process)"""
+    return pwd_context.hash(password)
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (runs inside the worker process)"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing admission queue is full"""
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool with bounded admission.
+
+    bcrypt is CPU-bound; running it in FastAPI's default threadpool lets a
+    login burst occupy every worker thread and starve unrelated sync routes.
+    Requests beyond ``workers + queue_size`` in flight are rejected instead
+    of queueing without bound.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so forked app workers each get their own pool
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop and the request threadpool"""
+        return await self._submit(hash_password_sync, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password off the event loop and the request threadpool"""
+        if not hashed_password:
+            return False  # OAuth users have no password
+        return await self._submit(verify_password_sync, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_QUEUE_SIZE
+)
@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+import logging
+from typing import Optional
+from .cache import cache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY_PREFIX = "revoked:"
+REVOKED_INDEX_KEY = "revoked:index"
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on SHA-256)"""
+
+    def __init__(self, size_bits: int, num_hashes: int):
+        self.size = size_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class TokenRevocationList:
+    """Revoked token ids (jti) held in the shared cache until they expire.
+
+    A local Bloom filter answers the common "not revoked" case without I/O;
+    only possible hits go to the store. The filter is rebuilt from the store
+    every REVOCATION_REFRESH_SECONDS so revocations made by other workers
+    become visible.
+    """
+
+    def __init__(self, size_bits: int, num_hashes: int, refresh_seconds: int):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.refresh_seconds = refresh_seconds
+        self._bloom = BloomFilter(size_bits, num_hashes)
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self.store_lookups = 0
+
+    def refresh(self) -> None:
+        """Rebuild the Bloom filter from unexpired entries in the store"""
+        now = time.time()
+        try:
+            cache.zremrangebyscore(REVOKED_INDEX_KEY, 0, now)
+            jtis = cache.zrangebyscore(REVOKED_INDEX_KEY, now, float("inf"))
+        except Exception as e:
+            logger.error(f"Revocation list refresh failed: {e}")
+            return
+
+        bloom = BloomFilter(self.size_bits, self.num_hashes)
+        for jti in jtis:
+            bloom.add(jti)
+
+        with self._lock:
+            self._bloom = bloom
+            self._refreshed_at = now
+
+    def _maybe_refresh(self) -> None:
+        if time.time() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token id until the token's own expiry"""
+        ttl = int(expires_at - time.time()) + 1
+        if ttl <= 0:
+            return  # Already expired, nothing to enforce
+
+        cache.set(f"{REVOKED_KEY_PREFIX}{jti}", "1", ttl=ttl)
+        cache.zadd(REVOKED_INDEX_KEY, jti, expires_at)
+        with self._lock:
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Check a token id; only Bloom filter hits touch the store"""
+        if not jti:
+            return False
+
+        self._maybe_refresh()
+        if jti not in self._bloom:
+            return False
+
+        self.store_lookups += 1
+        try:
+            return cache.get(f"{REVOKED_KEY_PREFIX}{jti}") is not None
+        except Exception as e:
+            logger.error(f"Revocation lookup failed: {e}")
+            return False
+
+# Global instance
+revocation_list = TokenRevocationList(
+    settings.REVOCATION_BLOOM_SIZE,
+    settings.REVOCATION_BLOOM_HASHES,
+    settings.REVOCATION_REFRESH_SECONDS
+)
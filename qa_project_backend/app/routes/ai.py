@@ -1,8 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .. import database, auth, models, crud
+from ..config import settings
 from ..services.ai_service import ai_service
+from ..services.ai_cache import ai_cache
+from ..services.ai_scheduler import ai_scheduler
+from ..services.tag_suggester import tag_suggester
+from ..services.summary_stream import summary_stream_hub
+from ..services.summaries import generate_summary
+from ..services.inflight import inflight
+from ..services.llm_backend import llm_configured
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,39 +21,29 @@ router = APIRouter(prefix="/ai", tags=["ai"])
 @router.post("/summarize/{question_id}")
 async def generate_question_summary(
     question_id: int,
+    force: bool = Query(False, description="Regenerate even if nothing changed"),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Generate AI summary for a specific question"""
     try:
-        # Get question with answers
-        question = crud.get_question_with_answers_and_stars(db, question_id, current_user.id)
+        question = crud.get_question(db, question_id)
         if not question:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Question not found"
             )
         
-        # Prepare answers data
-        answers_data = []
-        if hasattr(question, 'answers') and question.answers:
-            answers_data = [{'content': answer.content} for answer in question.answers[:5]]
-        
-        # Generate summary
-        summary = await ai_service.summarize_question(
-            question.title,
-            question.content,
-            answers_data
-        )
-        
-        # Update question with summary
-        question.ai_summary = summary
-        db.commit()
+        # Skips the LLM call when the summary inputs are unchanged, and shares
+        # one generation among concurrent requests for this question
+        summary, regenerated = await generate_summary(question_id, force=force)
+        db.refresh(question, ["ai_summary", "updated_at"])
         
         return {
             "question_id": question_id,
             "summary": summary,
-            "generated_at": question.updated_at
+            "generated_at": question.updated_at,
+            "regenerated": regenerated
         }
         
     except HTTPException:
@@ -55,14 +55,73 @@ async def generate_question_summary(
             detail="Failed to generate summary"
         )
 
+@router.get("/summarize/streams/stats")
+async def get_summary_stream_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get in-flight streamed summaries and how many viewers joined one"""
+    return summary_stream_hub.stats()
+
+@router.get("/summarize/{question_id}/stream")
+async def stream_question_summary(
+    question_id: int,
+    force: bool = Query(False, description="Regenerate even if nothing changed"),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Stream an AI summary as Server-Sent Events while it is generated.
+    
+    Sends `data: {"delta": ...}` for each piece, then a `done` event with the
+    full summary (or an `error` event). Viewers of the same question share
+    one generation.
+    """
+    question = crud.get_question(db, question_id)
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+    
+    stream = summary_stream_hub.open(question_id, force=force)
+    
+    async def events():
+        try:
+            async for chunk in stream.follow():
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            if stream.error:
+                yield f"event: error\ndata: {json.dumps({'detail': stream.error})}\n\n"
+            else:
+                done = {"question_id": question_id, "summary": stream.text, "regenerated": stream.regenerated}
+                yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        finally:
+            stream.viewers -= 1
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/suggest-tags")
 async def suggest_tags_for_content(
     title: str = Query(..., description="Question title"),
-    content: str = Query(..., description="Question content"),
+    content: str = Query("", description="Question content"),
+    local_only: bool = Query(False, description="Only use the local model (fast enough for autocomplete)"),
+    prefix: Optional[str] = Query(None, description="Only suggest tags starting with this text"),
+    limit: int = Query(5, ge=1, le=20),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get AI-suggested tags for question content"""
     try:
+        if local_only or prefix:
+            tags, confidence = tag_suggester.suggest(title, content, limit=limit, prefix=prefix)
+            return {
+                "suggested_tags": tags,
+                "count": len(tags),
+                "source": "local",
+                "confidence": round(confidence, 4)
+            }
+        
         tags = await ai_service.suggest_tags(title, content)
         return {
             "suggested_tags": tags,
@@ -75,6 +134,20 @@ async def suggest_tags_for_content(
             detail="Failed to suggest tags"
         )
 
+@router.get("/suggest-tags/stats")
+async def get_tag_suggester_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get local tag model build time, memory and hit rate"""
+    return tag_suggester.stats()
+
+@router.get("/quality-score/batch-stats")
+async def get_quality_batch_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get calls and tokens saved by batched quality scoring"""
+    return ai_service.quality_batch_stats()
+
 @router.get("/quality-score/{answer_id}")
 async def get_answer_quality_score(
     answer_id: int,
@@ -99,11 +172,25 @@ async def get_answer_quality_score(
         
         # Generate or return existing quality score
         if answer.quality_score == 50:  # Default score, generate new one
-            quality_score = await ai_service.generate_answer_quality_score(
-                answer.content,
-                f"{question.title}\n{question.content}"
+            # Score the other unscored answers to this question in the same call
+            unscored = db.query(models.Answer).filter(
+                models.Answer.question_id == question.id,
+                models.Answer.quality_score == 50,
+                models.Answer.id != answer.id
+            ).limit(settings.AI_QUALITY_BATCH_MAX_ANSWERS - 1).all()
+            batch = {a.id: a for a in [answer] + unscored}
+            
+            scores = await ai_service.score_answers_batch(
+                f"{question.title}\n{question.content}",
+                {scored_id: a.content for scored_id, a in batch.items()}
             )
-            answer.quality_score = int(quality_score * 100)
+            if answer_id not in scores:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Quality score unavailable, try again shortly"
+                )
+            for scored_id, score in scores.items():
+                batch[scored_id].quality_score = int(score * 100)
             db.commit()
         
         return {
@@ -128,36 +215,21 @@ async def get_ai_analytics(
 ):
     """Get AI-powered platform analytics"""
     try:
-        # Get basic stats
-        total_questions = db.query(models.Question).count()
-        total_answers = db.query(models.Answer).count()
-        
-        # Get questions with AI summaries
-        questions_with_summaries = db.query(models.Question).filter(
-            models.Question.ai_summary != ""
-        ).count()
-        
-        # Get average quality scores
-        avg_question_quality = db.query(models.Question).filter(
-            models.Question.quality_score > 0
-        ).with_entities(models.Question.quality_score).all()
-        
-        avg_answer_quality = db.query(models.Answer).filter(
-            models.Answer.quality_score > 0
-        ).with_entities(models.Answer.quality_score).all()
-        
-        # Calculate averages
-        avg_q_score = sum(q[0] for q in avg_question_quality) / len(avg_question_quality) if avg_question_quality else 0
-        avg_a_score = sum(a[0] for a in avg_answer_quality) / len(avg_answer_quality) if avg_answer_quality else 0
+        stats = crud.get_ai_platform_stats(db)
+        total_questions = stats["total_questions"]
         
         return {
             "total_questions": total_questions,
-            "total_answers": total_answers,
-            "questions_with_ai_summaries": questions_with_summaries,
-            "ai_summary_coverage": (questions_with_summaries / total_questions * 100) if total_questions > 0 else 0,
-            "average_question_quality": round(avg_q_score, 2),
-            "average_answer_quality": round(avg_a_score, 2),
-            "ai_features_enabled": bool(ai_service and ai_service.encoding)
+            "total_answers": stats["total_answers"],
+            "questions_with_ai_summaries": stats["questions_with_summaries"],
+            "ai_summary_coverage": (stats["questions_with_summaries"] / total_questions * 100) if total_questions > 0 else 0,
+            "average_question_quality": round(stats["average_question_quality"], 2),
+            "average_answer_quality": round(stats["average_answer_quality"], 2),
+            "quality_distribution": {
+                "questions": crud.get_quality_score_distribution(db, "question"),
+                "answers": crud.get_quality_score_distribution(db, "answer")
+            },
+            "ai_features_enabled": llm_configured()  # Without building the AI service
         }
         
     except Exception as e:
@@ -165,4 +237,25 @@ async def get_ai_analytics(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get AI analytics"
-        )
\ No newline at end of file
+        )
+
+@router.get("/cache/stats")
+async def get_ai_cache_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get AI result cache hit-rate metrics"""
+    return ai_cache.stats()
+
+@router.get("/scheduler/stats")
+async def get_ai_scheduler_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get AI call concurrency, throttling and queue wait metrics"""
+    return ai_scheduler.stats()
+
+@router.get("/inflight/stats")
+async def get_ai_inflight_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get how many AI generations were shared by concurrent requests"""
+    return inflight.stats()
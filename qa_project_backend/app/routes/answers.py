@@ -2,9 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
 from sqlalchemy.orm import Session
 from typing import List
 from .. import schemas, database, crud, auth, models
-from ..services.ai_service import ai_service
-from ..services.slack_service import slack_service
-from ..services.aws_service import aws_service
+from ..services.enrichment import enrichment_queue
+from ..services.outbox import outbox_dispatcher
 
 router = APIRouter(prefix="/answers", tags=["answers"])
 
@@ -25,39 +24,11 @@ async def create_answer(
                 detail="Question not found"
             )
         
-        # Create the answer (this will also increment user's answer count)
+        # Create the answer (this will also increment user's answer count
+        # and queue AI quality scoring and the Slack/CloudWatch events in the same transaction)
         new_answer = crud.create_answer(db, current_user.id, question_id, answer)
-        
-        # AI Enhancement: Generate quality score
-        if ai_service:
-            quality_score = await ai_service.generate_answer_quality_score(
-                answer.content,
-                f"{question.title}\n{question.content}"
-            )
-            new_answer.quality_score = int(quality_score * 100)  # Convert to 0-100 scale
-            db.commit()
-        
-        # Send Slack notification
-        if slack_service:
-            await slack_service.notify_new_answer(
-                {
-                    'id': question.id,
-                    'title': question.title
-                },
-                {
-                    'id': new_answer.id,
-                    'content': new_answer.content
-                },
-                {
-                    'first_name': current_user.first_name,
-                    'last_name': current_user.last_name,
-                    'username': current_user.username
-                }
-            )
-        
-        # Send metrics to CloudWatch
-        if aws_service:
-            await aws_service.send_metric_to_cloudwatch('AnswersCreated', 1)
+        enrichment_queue.notify()
+        outbox_dispatcher.notify()
         
         return new_answer
         
@@ -157,13 +128,7 @@ def update_answer(
             )
         
         # Update only provided fields
-        update_data = update.dict(exclude_unset=True, exclude_none=True)
-        for field, value in update_data.items():
-            setattr(answer, field, value)
-        
-        db.commit()
-        db.refresh(answer)
-        return answer
+        return crud.update_answer(db, answer, update)
         
     except HTTPException:
         raise
@@ -195,13 +160,8 @@ def delete_answer(
                 detail="You can only delete your own answers"
             )
         
-        # Decrease user's answer count
-        db.query(models.User).filter(models.User.id == current_user.id).update({
-            models.User.answers_count: models.User.answers_count - 1
-        })
-        
-        db.delete(answer)
-        db.commit()
+        # Decrease user's answer count and refresh the question summary
+        crud.delete_answer(db, answer)
         
     except HTTPException:
         raise
@@ -239,7 +199,9 @@ def star_answer(
                 detail="You cannot star your own answer"
             )
         
-        return crud.star_answer(db, current_user.id, answer.question_id, answer_id)
+        star = crud.star_answer(db, current_user.id, answer.question_id, answer_id)
+        outbox_dispatcher.notify()
+        return star
         
     except HTTPException:
         raise
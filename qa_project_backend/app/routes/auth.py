@@ -1,27 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm, HTTPBearer
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
 from starlette.requests import Request
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from typing import Optional, List
+import ipaddress
 from .. import schemas, auth, database, crud, models, config
+from ..auth import get_current_user_optional  # Re-exported; the dependency lives in app.auth
 from ..services.oauth_service import oauth_service
+from ..passwords import password_hasher, PasswordHasherBusy
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-# Add optional OAuth2 scheme for endpoints that don't require authentication
-oauth2_scheme_optional = HTTPBearer(auto_error=False)
-
-
 # =====================
 # Core Authentication
 # =====================
 
+def _trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(proxy, strict=False) for proxy in config.settings.TRUSTED_PROXIES)
+
+def _client_ip(request: Request) -> Optional[str]:
+    """Client IP; X-Forwarded-For is only honoured when the peer is a trusted proxy.
+    
+    Each proxy appends the address it saw, so the right-most hop that is not
+    one of our proxies is the client; anything left of it is client-supplied.
+    """
+    peer = request.client.host if request.client else None
+    if not peer or not _trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     """Register a new user"""
     # Check if username exists
     if crud.get_user_by_username(db, user.username):
@@ -38,7 +59,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
         )
     
     try:
-        return crud.create_user(db, user)
+        password_hash = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Registration temporarily unavailable, try again shortly"
+        )
+    
+    try:
+        return crud.create_user(db, user, password_hash=password_hash)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -46,12 +75,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
         )
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(database.get_db)
 ):
     """Login with username/email and password"""
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user_async(
+        db, form_data.username, form_data.password, _client_ip(request)
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -71,12 +103,15 @@ def login(
     }
 
 @router.post("/login-json", response_model=schemas.Token)
-def login_json(
+async def login_json(
     payload: schemas.LoginRequest,
+    request: Request,
     db: Session = Depends(database.get_db)
 ):
     """Login with JSON payload (alternative to form-data)"""
-    user = auth.authenticate_user(db, payload.username, payload.password)
+    user = await auth.authenticate_user_async(
+        db, payload.username, payload.password, _client_ip(request)
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -95,6 +130,18 @@ def login_json(
         "expires_in": config.settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     }
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    token: str = Depends(auth.oauth2_scheme),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Revoke the presented access token"""
+    if not auth.blacklist_token(token):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked"
+        )
+
 @router.post("/refresh", response_model=schemas.Token)
 def refresh_token(
     current_user: models.User = Depends(auth.get_current_user),
@@ -130,6 +177,50 @@ async def google_login(request: Request):
             detail="Failed to initiate Google login"
         )
 
+def _get_or_create_google_user(db: Session, user_info: dict) -> models.User:
+    """Find the user for a Google identity, linking or creating the account"""
+    # Check if user exists by Google ID
+    user = db.query(models.User).filter(models.User.google_id == user_info['google_id']).first()
+    
+    if not user:
+        # Check if user exists by email
+        user = crud.get_user_by_email(db, user_info['email'])
+        if user:
+            # Link Google account to existing user
+            user.google_id = user_info['google_id']
+            user.is_oauth_user = 1
+            if user_info.get('picture'):
+                user.profile_picture = user_info['picture']
+            db.commit()
+        else:
+            # Create new user
+            username = user_info['email'].split('@')[0]
+            # Ensure username is unique
+            counter = 1
+            original_username = username
+            while crud.get_user_by_username(db, username):
+                username = f"{original_username}{counter}"
+                counter += 1
+            
+            user = models.User(
+                username=username,
+                first_name=user_info['first_name'],
+                last_name=user_info['last_name'],
+                email=user_info['email'],
+                password_hash="",  # No password for OAuth users
+                google_id=user_info['google_id'],
+                profile_picture=user_info.get('picture', ''),
+                is_oauth_user=1,
+                questions_count=0,
+                answers_count=0,
+                reputation=0
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+    
+    return user
+
 @router.get("/google/callback")
 async def google_callback(request: Request, db: Session = Depends(database.get_db)):
     """Handle Google OAuth callback"""
@@ -141,45 +232,7 @@ async def google_callback(request: Request, db: Session = Depends(database.get_d
                 detail="Failed to get user information from Google"
             )
         
-        # Check if user exists by Google ID
-        user = db.query(models.User).filter(models.User.google_id == user_info['google_id']).first()
-        
-        if not user:
-            # Check if user exists by email
-            user = crud.get_user_by_email(db, user_info['email'])
-            if user:
-                # Link Google account to existing user
-                user.google_id = user_info['google_id']
-                user.is_oauth_user = 1
-                if user_info.get('picture'):
-                    user.profile_picture = user_info['picture']
-                db.commit()
-            else:
-                # Create new user
-                username = user_info['email'].split('@')[0]
-                # Ensure username is unique
-                counter = 1
-                original_username = username
-                while crud.get_user_by_username(db, username):
-                    username = f"{original_username}{counter}"
-                    counter += 1
-                
-                user = models.User(
-                    username=username,
-                    first_name=user_info['first_name'],
-                    last_name=user_info['last_name'],
-                    email=user_info['email'],
-                    password_hash="",  # No password for OAuth users
-                    google_id=user_info['google_id'],
-                    profile_picture=user_info.get('picture', ''),
-                    is_oauth_user=1,
-                    questions_count=0,
-                    answers_count=0,
-                    reputation=0
-                )
-                db.add(user)
-                db.commit()
-                db.refresh(user)
+        user = _get_or_create_google_user(db, user_info)
         
         # Generate JWT token
         access_token_expires = timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -200,34 +253,38 @@ async def google_callback(request: Request, db: Session = Depends(database.get_d
             detail="OAuth authentication failed"
         )
 
-# =====================
-# Optional Authentication Helper
-# =====================
-
-def get_current_user_optional(
-    token: str = Depends(oauth2_scheme_optional), 
+@router.post("/google/token", response_model=schemas.Token)
+async def google_token_login(
+    payload: schemas.GoogleTokenRequest,
     db: Session = Depends(database.get_db)
-) -> Optional[models.User]:
-    """Get current user from JWT token (optional) - returns None if no token or invalid"""
-    if not token:
-        return None
-        
+):
+    """Login with a Google Sign-In ID token, verified locally against cached Google keys"""
+    user_info = await oauth_service.verify_google_id_token(payload.credential)
+    if not user_info:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Google credential"
+        )
+    
     try:
-        payload = auth.decode_access_token(token)
-        if payload is None:
-            return None
-            
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-            
-        user = crud.get_user_by_username(db, username)
-        return user
-        
+        user = _get_or_create_google_user(db, user_info)
     except Exception as e:
-        logger.debug(f"Optional auth failed: {e}")
-        return None
-
+        logger.error(f"Google token login failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="OAuth authentication failed"
+        )
+    
+    access_token_expires = timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": config.settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
 
 # =====================
 # User Profile Management
@@ -5,6 +5,10 @@ from datetime import datetime, timedelta
 from .. import database, auth, models, crud
 from ..services.slack_service import slack_service
 from ..services.aws_service import aws_service
+from ..services.outbox import outbox_dispatcher
+from ..services.metrics import metrics
+from ..services.llm_backend import llm_configured
+from ..config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,6 +37,34 @@ async def send_slack_notification(
             detail="Failed to send Slack notification"
         )
 
+@router.get("/slack/stats")
+async def get_slack_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get Slack outbox depth and sent, dropped and rate-limited counts"""
+    return slack_service.stats()
+
+@router.get("/outbox/stats")
+async def get_outbox_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get outbox event counts by status and the age of the oldest undelivered event"""
+    return outbox_dispatcher.stats()
+
+@router.get("/metrics/stats")
+async def get_metrics_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get buffered metric series and flush counts of the CloudWatch aggregator"""
+    return metrics.stats()
+
+@router.get("/aws/stats")
+async def get_aws_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get per-operation latency of boto3 calls and the AWS thread pool settings"""
+    return aws_service.stats()
+
 @router.post("/slack/daily-summary")
 async def send_daily_summary(
     background_tasks: BackgroundTasks,
@@ -185,8 +217,9 @@ async def get_integrations_status(
                 "status": "active" if aws_service.s3_client and aws_service.cloudwatch_client else "partial"
             },
             "ai": {
-                "openai_configured": bool(ai_service and hasattr(ai_service, 'encoding')),
-                "status": "active" if ai_service else "not_configured"
+                "openai_configured": bool(settings.OPENAI_API_KEY),
+                "backend": settings.LLM_BACKEND,
+                "status": "active" if llm_configured() else "not_configured"
             }
         }
     except Exception as e:
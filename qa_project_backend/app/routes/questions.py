@@ -2,9 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import schemas, database, crud, auth, models
-from ..services.ai_service import ai_service
-from ..services.slack_service import slack_service
-from ..services.aws_service import aws_service
+from ..config import settings
+from ..services import summaries
+from ..services.enrichment import enrichment_queue
+from ..services.outbox import outbox_dispatcher
+from ..services.tag_suggester import tag_suggester
+from ..services.duplicate_index import duplicate_index
+from ..services.related_index import related_index
+from ..services.llm_backend import llm_configured
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,36 +28,11 @@ async def create_question(
 ):
     """Create a new question"""
     try:
-        # Create the question
+        # Create the question (AI enrichment and the Slack/CloudWatch events are queued in the same transaction)
         new_question = crud.create_question(db, current_user.id, question)
-        
-        # AI Enhancement: Generate suggested tags if not provided
-        if not question.tags and ai_service:
-            suggested_tags = await ai_service.suggest_tags(question.title, question.content)
-            if suggested_tags:
-                new_question.suggested_tags = ','.join(suggested_tags)
-                db.commit()
-        
-        # Send Slack notification
-        if slack_service:
-            await slack_service.notify_new_question(
-                {
-                    'id': new_question.id,
-                    'title': new_question.title,
-                    'content': new_question.content
-                },
-                {
-                    'first_name': current_user.first_name,
-                    'last_name': current_user.last_name,
-                    'username': current_user.username
-                }
-            )
-            new_question.slack_notified = 1
-            db.commit()
-        
-        # Send metrics to CloudWatch
-        if aws_service:
-            await aws_service.send_metric_to_cloudwatch('QuestionsCreated', 1)
+        enrichment_queue.notify()
+        outbox_dispatcher.notify()
+        tag_suggester.observe(new_question.id, new_question.title, new_question.content, new_question.tags)
         
         return new_question
     except Exception as e:
@@ -89,6 +69,75 @@ def list_questions(
             detail=f"Failed to fetch questions: {str(e)}"
         )
 
+@router.get("/duplicates/check")
+def check_duplicate_questions(
+    title: str = Query(..., description="Title of the question about to be posted"),
+    content: str = Query("", description="Body of the question about to be posted"),
+    limit: int = Query(5, ge=1, le=20),
+    db: Session = Depends(database.get_db)
+):
+    """Find existing questions that look like near-duplicates, before posting"""
+    try:
+        matches = duplicate_index.find(title, content, limit=limit)
+        questions = {}
+        if matches:
+            rows = db.query(models.Question.id, models.Question.title, models.Question.created_at).filter(
+                models.Question.id.in_([question_id for question_id, _ in matches])
+            ).all()
+            questions = {row.id: row for row in rows}
+        
+        # Questions deleted since they were indexed drop out here
+        duplicates = [
+            {
+                "id": question_id,
+                "title": questions[question_id].title,
+                "created_at": questions[question_id].created_at,
+                "similarity": round(similarity, 3)
+            }
+            for question_id, similarity in matches if question_id in questions
+        ]
+        return {"duplicates": duplicates, "count": len(duplicates)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to check duplicates: {str(e)}"
+        )
+
+@router.get("/related/stats")
+def get_related_index_stats(
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get the related-questions snapshot size and age, and incremental update timings"""
+    return related_index.stats()
+
+@router.get("/{question_id}/related")
+def get_related_questions(
+    question_id: int,
+    limit: int = Query(5, ge=1, le=20),
+    db: Session = Depends(database.get_db)
+):
+    """Get precomputed related questions, most similar first"""
+    try:
+        # One read of the (question_id, score) index, joined to the related questions
+        rows = db.query(
+            models.Question.id, models.Question.title, models.Question.tags, models.QuestionRelated.score
+        ).join(
+            models.QuestionRelated, models.QuestionRelated.related_id == models.Question.id
+        ).filter(
+            models.QuestionRelated.question_id == question_id
+        ).order_by(models.QuestionRelated.score.desc()).limit(limit).all()
+        
+        related = [
+            {"id": row.id, "title": row.title, "tags": row.tags, "score": row.score}
+            for row in rows
+        ]
+        return {"question_id": question_id, "related": related, "count": len(related)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch related questions: {str(e)}"
+        )
+
 @router.get("/{question_id}", response_model=schemas.QuestionDetail)
 async def get_question(
     question_id: int,
@@ -112,21 +161,17 @@ async def get_question(
                 detail="Question not found"
             )
         
-        # Generate AI summary if requested and not already generated
-        if generate_summary and ai_service and not question.ai_summary:
-            answers_data = []
-            if hasattr(question, 'answers') and question.answers:
-                answers_data = [{'content': answer.content} for answer in question.answers[:3]]
-            
-            summary = await ai_service.summarize_question(
-                question.title, 
-                question.content, 
-                answers_data
-            )
-            
-            if summary:
-                question.ai_summary = summary
-                db.commit()
+        # Generate AI summary if requested: inline when missing, in the background when stale
+        if generate_summary and llm_configured():
+            if not question.ai_summary:
+                # Concurrent viewers share one generation
+                await summaries.generate_summary(question.id)
+                db.refresh(question, ["ai_summary", "ai_summary_fingerprint"])
+            else:
+                answers = crud.get_summary_answers(db, question.id)
+                if question.ai_summary_fingerprint != crud.summary_fingerprint(question, answers):
+                    crud.enqueue_enrichment(db, "question", question.id, "summarize", settings.SUMMARY_DEBOUNCE_SECONDS)
+                    db.commit()
         
         return question
     except HTTPException:
@@ -159,9 +204,7 @@ def update_question(
                 detail="You can only update your own questions"
             )
         
-        # Update logic would go here (implement in crud.py)
-        # For now, return the existing question
-        return question
+        return crud.update_question(db, question, update)
         
     except HTTPException:
         raise
@@ -381,6 +424,23 @@ def personalized_feed(
         )
 
 
+@router.get("/feed/me", response_model=schemas.FeedPage)
+def my_feed(
+    cursor: Optional[int] = Query(None, ge=1, description="Cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Get the current user's feed of starred, answered and asked questions"""
+    try:
+        return crud.get_user_feed(db, current_user.id, cursor=cursor, limit=limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch feed: {str(e)}"
+        )
+
+
 # =====================
 # User-specific Endpoints
 # =====================
@@ -442,6 +502,7 @@ def star_answer(
     """Star an answer for a question"""
     try:
         star = crud.star_answer(db, current_user.id, question_id, answer_id)
+        outbox_dispatcher.notify()
         return {
             "message": "Answer starred successfully",
             "star_id": star.id,
@@ -60,6 +60,9 @@ class LoginRequest(BaseModel):
     username: str = Field(..., min_length=3)
     password: str = Field(..., min_length=8)
 
+class GoogleTokenRequest(BaseModel):
+    credential: str = Field(..., min_length=1, description="Google Sign-In ID token")
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -96,6 +99,19 @@ class QuestionDetail(QuestionOut):
     """Question with answers included"""
     answers: List["AnswerOut"] = []
 
+class FeedItem(BaseModel):
+    """A question in the user's home feed with the activity that surfaced it"""
+    id: int
+    reason: str
+    created_at: datetime
+    question: QuestionOut
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class FeedPage(BaseModel):
+    items: List[FeedItem]
+    next_cursor: Optional[int] = None
+
 # =====================
 # Answer Schemas
 # =====================
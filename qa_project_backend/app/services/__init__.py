@@ -1 +1,86 @@
-# Services package
\ No newline at end of file
+# Services package
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """Builds service singletons on first use instead of at import time"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.init_seconds: Dict[str, float] = {}
+
+    def lazy(self, name: str, factory: Callable[[], Any]) -> "LazyService":
+        """Register a factory and return a proxy that builds the service when first touched"""
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self.init_seconds[name] = time.perf_counter() - start
+                self._instances[name] = instance
+                logger.info(f"Initialized {name} in {self.init_seconds[name] * 1000:.0f}ms")
+        return instance
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def prewarm(self, names: Optional[Iterable[str]] = None) -> None:
+        """Build services ahead of first use (run off the event loop)"""
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Pre-warming {name} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "init_ms": round(self.init_seconds[name] * 1000, 1) if name in self.init_seconds else None
+            }
+            for name in self._factories
+        }
+
+class LazyService:
+    """Stand-in for a registered service; attribute access goes to the real instance"""
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: ServiceRegistry, name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __bool__(self) -> bool:
+        # Always true, and never builds the service: test is_loaded() or a setting instead
+        return True
+
+    def is_loaded(self) -> bool:
+        """Whether the service has been built, without building it"""
+        return self._registry.is_loaded(self._name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded() else "not loaded"
+        return f"<LazyService {self._name} ({state})>"
+
+# Global instance
+registry = ServiceRegistry()
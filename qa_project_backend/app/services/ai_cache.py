@@ -0,0 +1,226 @@
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Optional
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import SQLAlchemyError
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from ..config import settings
+from .. import database, models
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Row hits are counted in memory and written back in one batch once this many keys are pending
+TOUCH_FLUSH_KEYS = 256
+
+class AIResultCache:
+    """Two-level cache for AI outputs: in-process LRU in front of the ai_results table.
+
+    Keys hash (operation, model, prompt version, content), so byte-identical
+    inputs never pay for a second completion. The table is kept under
+    AI_CACHE_MAX_BYTES by evicting least recently used rows. Table reads and
+    writes run on the default executor; hit counts and last-used times are
+    batched in memory rather than committed on every hit.
+    """
+
+    def __init__(self, memory_entries: int, max_bytes: int):
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        self._touches: Counter = Counter()
+        self._touched_at: dict = {}
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(operation: str, model: str, prompt_version: str, *parts: str) -> str:
+        """Stable key for an AI call over the given content parts"""
+        content_hash = hashlib.sha256(
+            json.dumps(parts, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        return hashlib.sha256(
+            f"{operation}|{model}|{prompt_version}|{content_hash}".encode("utf-8")
+        ).hexdigest()
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _touch(self, key: str) -> None:
+        """Record a hit; the caller holds the lock"""
+        self._touches[key] += 1
+        self._touched_at[key] = datetime.utcnow()
+
+    def _take_touches(self) -> list:
+        with self._lock:
+            rows = [
+                {"key": key, "hits": hits, "used": self._touched_at[key]}
+                for key, hits in self._touches.items()
+            ]
+            self._touches.clear()
+            self._touched_at.clear()
+        return rows
+
+    def _flush_touches(self, db) -> None:
+        """Write pending hit counts and last-used times in one batch"""
+        rows = self._take_touches()
+        if not rows:
+            return
+        db.execute(
+            update(models.AIResult)
+            .where(models.AIResult.cache_key == bindparam("key"))
+            .values(hit_count=models.AIResult.hit_count + bindparam("hits"), last_used_at=bindparam("used")),
+            rows
+        )
+        db.commit()
+
+    async def get(self, key: str) -> Any:
+        """Return the cached value, or None on miss"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            value = self._memory.get(key, _MISSING)
+            if value is not _MISSING:
+                self._memory.move_to_end(key)
+                self._touch(key)
+                self.memory_hits += 1
+                return value
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._load, key)
+
+    def _load(self, key: str) -> Any:
+        db = database.SessionLocal()
+        try:
+            result = db.query(models.AIResult.result).filter(models.AIResult.cache_key == key).scalar()
+            if result is None:
+                self.misses += 1
+                return None
+            value = json.loads(result)
+
+            with self._lock:
+                self._touch(key)
+                pending = len(self._touches)
+            if pending >= TOUCH_FLUSH_KEYS:
+                self._flush_touches(db)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"AI cache lookup failed: {e}")
+            self.misses += 1
+            return None
+        finally:
+            db.close()
+
+        self.db_hits += 1
+        self._remember(key, value)
+        return value
+
+    async def set(self, key: str, operation: str, model: str, prompt_version: str, value: Any) -> None:
+        """Store a successful AI result in both levels"""
+        if not self.enabled:
+            return
+
+        self._remember(key, value)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._store, key, operation, model, prompt_version, value)
+
+    def _store(self, key: str, operation: str, model: str, prompt_version: str, value: Any) -> None:
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+
+        db = database.SessionLocal()
+        try:
+            if db.query(models.AIResult.id).filter(models.AIResult.cache_key == key).first():
+                return
+            db.add(models.AIResult(
+                cache_key=key,
+                operation=operation,
+                model=model,
+                prompt_version=prompt_version,
+                result=encoded,
+                size_bytes=size
+            ))
+            db.commit()
+
+            if self._approx_bytes is None:
+                self._approx_bytes = db.query(func.coalesce(func.sum(models.AIResult.size_bytes), 0)).scalar()
+            else:
+                self._approx_bytes += size
+
+            if self._approx_bytes > self.max_bytes:
+                # Eviction orders by last use, so pending hits must land first
+                self._flush_touches(db)
+                self._evict(db)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"AI cache store failed: {e}")
+        finally:
+            db.close()
+
+    def flush(self) -> None:
+        """Write pending hit counts now (called at shutdown)"""
+        db = database.SessionLocal()
+        try:
+            self._flush_touches(db)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"AI cache hit flush failed: {e}")
+        finally:
+            db.close()
+
+    def _evict(self, db) -> None:
+        """Delete least recently used rows until the table is back under 90% of the limit"""
+        total = db.query(func.coalesce(func.sum(models.AIResult.size_bytes), 0)).scalar()
+        target = int(self.max_bytes * 0.9)
+        if total <= target:
+            self._approx_bytes = total
+            return
+
+        victims = []
+        for row_id, size in db.query(models.AIResult.id, models.AIResult.size_bytes).order_by(
+            models.AIResult.last_used_at.asc()
+        ).yield_per(500):
+            if total <= target:
+                break
+            victims.append(row_id)
+            total -= size
+
+        for i in range(0, len(victims), 500):
+            db.query(models.AIResult).filter(
+                models.AIResult.id.in_(victims[i:i + 500])
+            ).delete(synchronize_session=False)
+        db.commit()
+
+        self.evictions += len(victims)
+        self._approx_bytes = total
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "pending_touches": len(self._touches),
+            "approx_bytes": self._approx_bytes
+        }
+
+# Global instance
+ai_cache = AIResultCache(settings.AI_CACHE_MEMORY_ENTRIES, settings.AI_CACHE_MAX_BYTES)
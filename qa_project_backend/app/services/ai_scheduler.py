@@ -0,0 +1,267 @@
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from ..config import settings
+from .llm_backend import LLMError, LLMRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, most urgent first
+LANES = ("interactive", "enrichment", "backfill")
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to one minute of capacity"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is available now)"""
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        if self.tokens >= amount or self.rate <= 0:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        self.tokens = min(self.tokens, 0.0)
+
+class AIScheduler:
+    """Shared admission control for LLM calls.
+
+    Calls wait in priority lanes and are released while both the request and
+    token buckets allow and fewer than `limit` calls are in flight. The limit
+    grows additively while latency stays under target and halves on 429s or
+    slow responses. Retryable errors back off with full jitter.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, min_concurrency: int,
+                 max_concurrency: int, target_latency: float, max_retries: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(max(self.min_concurrency, self.max_concurrency // 2))
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self._waiting: List[list] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_decrease = 0.0
+        self._lane_stats: Dict[str, Dict] = {
+            lane: {"queued": 0, "started": 0, "wait_total": 0.0, "wait_max": 0.0} for lane in LANES
+        }
+        self.completed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+    # ----- Admission -----
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # New event loop (e.g. a fresh asyncio.run); anything queued on the old one is gone
+            self._loop = loop
+            self._waiting = []
+            self._timer = None
+            self.in_flight = 0
+            for stats in self._lane_stats.values():
+                stats["queued"] = 0
+
+    def _pump(self) -> None:
+        """Start as many queued calls as concurrency and rate limits allow"""
+        self._timer = None
+        while self._waiting and self.in_flight < int(self.limit):
+            _, _, future, tokens, lane, queued_at = self._waiting[0]
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiting)
+                continue
+
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay > 0:
+                self._timer = self._loop.call_later(delay, self._pump)
+                return
+
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+
+            waited = time.monotonic() - queued_at
+            stats = self._lane_stats[lane]
+            stats["queued"] -= 1
+            stats["started"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+            future.set_result(None)
+
+    async def _acquire(self, lane: str, tokens: int) -> None:
+        self._bind_loop()
+        future = self._loop.create_future()
+        heapq.heappush(self._waiting, [LANES.index(lane), next(self._seq), future, tokens, lane, time.monotonic()])
+        self._lane_stats[lane]["queued"] += 1
+        if self._timer is None:
+            self._pump()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(0.0, False)  # Slot was granted just before cancellation
+            else:
+                self._lane_stats[lane]["queued"] -= 1
+            raise
+
+    def _release(self, latency: float, throttled: bool) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+        now = time.monotonic()
+        if throttled or latency > self.target_latency:
+            # Multiplicative decrease, at most once per target-latency window
+            if now - self._last_decrease > self.target_latency:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._last_decrease = now
+        else:
+            # Additive increase: roughly +1 per window of successful calls
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+        if self._timer is None:
+            self._pump()
+
+    # ----- Calls -----
+
+    def _backoff(self, attempt: int, error: LLMError) -> float:
+        headers = error.headers
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        return random.uniform(0, min(60.0, 2 ** attempt))
+
+    async def run(self, call: Callable[[], Awaitable], estimated_tokens: int, priority: str = "interactive"):
+        """Run an AI call under the shared limits, retrying throttling and transient errors"""
+        if priority not in LANES:
+            raise ValueError(f"Unknown AI priority lane: {priority}")
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, estimated_tokens)
+            started = time.monotonic()
+            throttled = False
+            try:
+                result = await call()
+                self.completed += 1
+                return result
+            except LLMError as e:
+                if not e.retryable:
+                    self.failures += 1
+                    raise
+                throttled = isinstance(e, LLMRateLimitError)
+                if throttled:
+                    self.throttled += 1
+                    self.requests.drain()
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"AI call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self._release(time.monotonic() - started, throttled)
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, call: Callable[[], AsyncIterator], estimated_tokens: int,
+                     priority: str = "interactive") -> AsyncIterator:
+        """Like run for streamed completions: the slot is held until the stream ends.
+
+        Opening the stream is retried like any call; once a chunk has been
+        yielded a failure is raised to the caller, since the output can't be
+        replayed. Time to first chunk stands in for latency.
+        """
+        if priority not in LANES:
+            raise ValueError(f"Unknown AI priority lane: {priority}")
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, estimated_tokens)
+            started = time.monotonic()
+            latency = None
+            throttled = False
+            try:
+                async for chunk in call():
+                    if latency is None:
+                        latency = time.monotonic() - started
+                    yield chunk
+                self.completed += 1
+                return
+            except LLMError as e:
+                if not e.retryable:
+                    self.failures += 1
+                    raise
+                throttled = isinstance(e, LLMRateLimitError)
+                if throttled:
+                    self.throttled += 1
+                    self.requests.drain()
+                if latency is not None or attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"AI stream failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self._release(latency if latency is not None else time.monotonic() - started, throttled)
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane, stats in self._lane_stats.items():
+            lanes[lane] = {
+                "queue_depth": stats["queued"],
+                "started": stats["started"],
+                "avg_wait_ms": round(stats["wait_total"] / stats["started"] * 1000, 1) if stats["started"] else 0.0,
+                "max_wait_ms": round(stats["wait_max"] * 1000, 1)
+            }
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "lanes": lanes
+        }
+
+# Global instance
+ai_scheduler = AIScheduler(
+    settings.AI_REQUESTS_PER_MINUTE,
+    settings.AI_TOKENS_PER_MINUTE,
+    settings.AI_MIN_CONCURRENCY,
+    settings.AI_MAX_CONCURRENCY,
+    settings.AI_TARGET_LATENCY_SECONDS,
+    settings.AI_MAX_RETRIES
+)
@@ -1,77 +1,208 @@
-import openai
-import tiktoken
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from ..config import settings
+from . import registry
+from .ai_cache import ai_cache
+from .ai_scheduler import ai_scheduler
+from .llm_backend import ChatResult, create_llm_backend
+from .prompt_builder import PromptBuilder
+from .tag_suggester import tag_suggester
+import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+MODEL = "gpt-3.5-turbo"
+SUMMARY_FAILED_MESSAGE = "Summary generation failed"
+SUMMARY_NOT_CONFIGURED_MESSAGE = "AI summarization not configured"
+SUMMARY_PLACEHOLDERS = (SUMMARY_FAILED_MESSAGE, SUMMARY_NOT_CONFIGURED_MESSAGE)  # Never marked as fresh
+
+# Token budgets for prompt context (framing text gets FRAMING_TOKENS of slack)
+SUMMARY_CONTEXT_TOKENS = 3000
+TAGS_CONTEXT_TOKENS = 2000
+TITLE_TOKENS = 100
+FRAMING_TOKENS = 32
+
+# Bump a version whenever its prompt changes so stale cached results are not reused
+PROMPT_VERSIONS = {
+    "summarize": "2",
+    "suggest_tags": "2",
+    "quality_score": "1",
+    "quality_score_batch": "1",
+}
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes Q&A discussions. Provide a concise, informative summary that captures the key points of the question and any provided answers."
+TAGS_SYSTEM_PROMPT = "You are a helpful assistant that suggests relevant tags for programming and technical questions. Return only a comma-separated list of 3-5 relevant tags, no explanations."
+QUALITY_SYSTEM_PROMPT = "You are an expert at evaluating answer quality. Rate the answer on a scale of 0-1 based on accuracy, completeness, clarity, and helpfulness. Return only a number between 0 and 1."
+QUALITY_BATCH_SYSTEM_PROMPT = "You are an expert at evaluating answer quality. Rate each numbered answer on a scale of 0-1 based on accuracy, completeness, clarity, and helpfulness. Return only a JSON array with one object per answer, like [{\"id\": 1, \"score\": 0.7}], no explanations."
+
 class AIService:
     def __init__(self):
-        if settings.OPENAI_API_KEY:
-            openai.api_key = settings.OPENAI_API_KEY
-        self.encoding = tiktoken.get_encoding("cl100k_base")
+        # The backend (openai) and tiktoken are slow to import, so they load with the service, not the app
+        self.backend = create_llm_backend(MODEL)
+        self.encoding = self.backend.load_encoding()
+        self.prompt_builder = PromptBuilder(self.encoding, settings.AI_TOKEN_MEMO_MAX_TOKENS)
+        self.model = self.backend.model
+        self.batch_stats = {
+            "batch_calls": 0,
+            "batched_answers": 0,
+            "fallback_answers": 0,
+            "batch_tokens": 0,
+            "single_tokens_estimate": 0
+        }
+    
+    @property
+    def configured(self) -> bool:
+        return self.backend.configured
     
     def count_tokens(self, text: str) -> int:
-        """Count tokens in text"""
-        return len(self.encoding.encode(text))
+        """Count tokens in text (memoized by content hash)"""
+        return self.prompt_builder.count(text)
+    
+    def _cache_key(self, operation: str, *parts: str) -> str:
+        return ai_cache.make_key(operation, self.model, PROMPT_VERSIONS[operation], *parts)
+    
+    async def _cache_store(self, key: str, operation: str, value) -> None:
+        await ai_cache.set(key, operation, self.model, PROMPT_VERSIONS[operation], value)
+    
+    async def _complete(self, messages: List[Dict], max_tokens: int, temperature: float, priority: str,
+                        prompt_tokens: Optional[int] = None) -> ChatResult:
+        """Chat completion through the shared AI scheduler"""
+        if prompt_tokens is None:
+            prompt_tokens = sum(self.count_tokens(message["content"]) for message in messages)
+        estimated_tokens = prompt_tokens + max_tokens
+        return await ai_scheduler.run(
+            lambda: self.backend.chat(messages, max_tokens, temperature),
+            estimated_tokens,
+            priority
+        )
     
-    async def summarize_question(self, title: str, content: str, answers: List[Dict] = None) -> str:
+    def _summary_prompt(self, title: str, content: str, answer_texts: List[str]) -> Tuple[List[Dict], int]:
+        """Summary messages within the token budget; returns (messages, prompt_tokens)"""
+        # Allocate the token budget across the question and its top 3 answers
+        builder = self.prompt_builder
+        title_text, title_tokens = builder.truncate(title, TITLE_TOKENS)
+        pieces, piece_tokens = builder.fit(
+            [content] + answer_texts,
+            SUMMARY_CONTEXT_TOKENS - title_tokens - FRAMING_TOKENS
+        )
+        
+        context = f"Question: {title_text}\n\nDetails: {pieces[0]}"
+        if answer_texts:
+            context += "\n\nAnswers:\n"
+            for i, answer_text in enumerate(pieces[1:], 1):
+                context += f"{i}. {answer_text}\n"
+        
+        messages = [
+            {
+                "role": "system",
+                "content": SUMMARY_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": f"Please summarize this Q&A discussion:\n\n{context}"
+            }
+        ]
+        return messages, self.count_tokens(SUMMARY_SYSTEM_PROMPT) + title_tokens + piece_tokens + FRAMING_TOKENS
+    
+    async def summarize_question(self, title: str, content: str, answers: List[Dict] = None,
+                                 priority: str = "interactive") -> str:
         """Generate AI summary of a question and its answers"""
-        if not settings.OPENAI_API_KEY:
-            return "AI summarization not configured"
+        if not self.configured:
+            return SUMMARY_NOT_CONFIGURED_MESSAGE
+        
+        answer_texts = [answer.get('content', '') for answer in (answers or [])[:3]]
+        cache_key = self._cache_key("summarize", title, content, *answer_texts)
+        cached = await ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            # Prepare context
-            context = f"Question: {title}\n\nDetails: {content}"
-            
-            if answers:
-                context += "\n\nAnswers:\n"
-                for i, answer in enumerate(answers[:3], 1):  # Limit to top 3 answers
-                    context += f"{i}. {answer.get('content', '')[:500]}...\n"
-            
-            # Check token count and truncate if necessary
-            if self.count_tokens(context) > 3000:
-                context = context[:3000] + "..."
-            
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that summarizes Q&A discussions. Provide a concise, informative summary that captures the key points of the question and any provided answers."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Please summarize this Q&A discussion:\n\n{context}"
-                    }
-                ],
+            messages, prompt_tokens = self._summary_prompt(title, content, answer_texts)
+            response = await self._complete(
+                messages,
                 max_tokens=200,
-                temperature=0.3
+                temperature=0.3,
+                priority=priority,
+                prompt_tokens=prompt_tokens
             )
             
-            return response.choices[0].message.content.strip()
-            
+            summary = response.content.strip()
+            await self._cache_store(cache_key, "summarize", summary)
+            return summary
+        
         except Exception as e:
             logger.error(f"AI summarization failed: {e}")
-            return "Summary generation failed"
+            return SUMMARY_FAILED_MESSAGE
     
-    async def suggest_tags(self, title: str, content: str) -> List[str]:
-        """Suggest relevant tags for a question using AI"""
-        if not settings.OPENAI_API_KEY:
-            return []
+    async def stream_summary(self, title: str, content: str, answers: List[Dict] = None,
+                             priority: str = "interactive") -> AsyncIterator[str]:
+        """Yield summary text as the model produces it; the finished summary is cached.
+        
+        Cached summaries and the placeholder messages arrive as a single piece.
+        Errors propagate so the caller can tell a partial stream from a summary.
+        """
+        if not self.configured:
+            yield SUMMARY_NOT_CONFIGURED_MESSAGE
+            return
+        
+        answer_texts = [answer.get('content', '') for answer in (answers or [])[:3]]
+        cache_key = self._cache_key("summarize", title, content, *answer_texts)
+        cached = await ai_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        messages, prompt_tokens = self._summary_prompt(title, content, answer_texts)
+        chunks = ai_scheduler.stream(
+            lambda: self.backend.stream(messages, max_tokens=200, temperature=0.3),
+            prompt_tokens + 200,
+            priority
+        )
+        
+        parts = []
+        async for delta in chunks:
+            # Drop leading whitespace so the streamed text matches the stored summary
+            if not parts:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            parts.append(delta)
+            yield delta
+        
+        summary = "".join(parts).strip()
+        if summary:
+            await self._cache_store(cache_key, "summarize", summary)
+    
+    async def suggest_tags(self, title: str, content: str, priority: str = "interactive",
+                           raise_errors: bool = False) -> List[str]:
+        """Suggest relevant tags for a question using AI (LLM failures return [] unless raise_errors)"""
+        # The local model answers in well under a millisecond; only ask the LLM when it is unsure
+        local_tags, confidence = tag_suggester.suggest(title, content)
+        if local_tags and confidence >= tag_suggester.min_confidence:
+            return local_tags
+        
+        if not self.configured:
+            return local_tags
+        
+        cache_key = self._cache_key("suggest_tags", title, content)
+        cached = await ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            text = f"{title}\n{content}"
-            if self.count_tokens(text) > 2000:
-                text = text[:2000] + "..."
+            title_text, title_tokens = self.prompt_builder.truncate(title, TITLE_TOKENS)
+            content_text, content_tokens = self.prompt_builder.truncate(
+                content,
+                TAGS_CONTEXT_TOKENS - title_tokens - FRAMING_TOKENS
+            )
+            text = f"{title_text}\n{content_text}"
             
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=[
+            response = await self._complete(
+                [
                     {
                         "role": "system",
-                        "content": "You are a helpful assistant that suggests relevant tags for programming and technical questions. Return only a comma-separated list of 3-5 relevant tags, no explanations."
+                        "content": TAGS_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -79,49 +210,189 @@ class AIService:
                     }
                 ],
                 max_tokens=50,
-                temperature=0.2
+                temperature=0.2,
+                priority=priority,
+                prompt_tokens=self.count_tokens(TAGS_SYSTEM_PROMPT) + title_tokens + content_tokens + FRAMING_TOKENS
             )
             
-            tags_text = response.choices[0].message.content.strip()
+            tags_text = response.content.strip()
             tags = [tag.strip().lower() for tag in tags_text.split(',')]
-            return tags[:5]  # Limit to 5 tags
-            
+            tags = tags[:5]  # Limit to 5 tags
+            await self._cache_store(cache_key, "suggest_tags", tags)
+            return tags
+        
         except Exception as e:
             logger.error(f"Tag suggestion failed: {e}")
+            if raise_errors:
+                raise
             return []
     
-    async def generate_answer_quality_score(self, answer_content: str, question_context: str) -> float:
-        """Generate a quality score for an answer (0-1)"""
-        if not settings.OPENAI_API_KEY:
+    @staticmethod
+    def _quality_prompt(answer_content: str, question_context: str) -> str:
+        return f"Question context: {question_context[:500]}\n\nAnswer to evaluate: {answer_content[:1000]}\n\nQuality score (0-1):"
+    
+    async def generate_answer_quality_score(self, answer_content: str, question_context: str,
+                                            priority: str = "interactive", raise_errors: bool = False) -> float:
+        """Generate a quality score for an answer (0-1; a neutral 0.5 on failure unless raise_errors)"""
+        if not self.configured:
             return 0.5  # Default neutral score
         
+        cache_key = self._cache_key("quality_score", answer_content, question_context)
+        cached = await ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=[
+            response = await self._complete(
+                [
                     {
                         "role": "system",
-                        "content": "You are an expert at evaluating answer quality. Rate the answer on a scale of 0-1 based on accuracy, completeness, clarity, and helpfulness. Return only a number between 0 and 1."
+                        "content": QUALITY_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
-                        "content": f"Question context: {question_context[:500]}\n\nAnswer to evaluate: {answer_content[:1000]}\n\nQuality score (0-1):"
+                        "content": self._quality_prompt(answer_content, question_context)
                     }
                 ],
                 max_tokens=10,
-                temperature=0.1
+                temperature=0.1,
+                priority=priority
             )
             
-            score_text = response.choices[0].message.content.strip()
+            score_text = response.content.strip()
             try:
-                score = float(score_text)
-                return max(0, min(1, score))  # Ensure 0-1 range
+                score = max(0, min(1, float(score_text)))  # Ensure 0-1 range
             except ValueError:
+                if raise_errors:
+                    raise
                 return 0.5
-                
+            
+            await self._cache_store(cache_key, "quality_score", score)
+            return score
+        
         except Exception as e:
             logger.error(f"Answer quality scoring failed: {e}")
+            if raise_errors:
+                raise
             return 0.5
 
-# Global instance
-ai_service = AIService()
\ No newline at end of file
+    async def score_answers_batch(self, question_context: str, answers: Dict[int, str],
+                                  priority: str = "interactive", raise_errors: bool = False) -> Dict[int, float]:
+        """Score several answers to one question (0-1), packing them into as few calls as the token budget allows"""
+        if not answers:
+            return {}
+        if not self.configured:
+            return {answer_id: 0.5 for answer_id in answers}
+        
+        scores = {}
+        pending = []
+        for answer_id, content in answers.items():
+            cache_key = self._cache_key("quality_score_batch", content, question_context)
+            cached = await ai_cache.get(cache_key)
+            if cached is not None:
+                scores[answer_id] = cached
+            else:
+                pending.append((answer_id, content, cache_key))
+        
+        for chunk in self._pack_answers(question_context, pending):
+            scores.update(await self._score_chunk(question_context, chunk, priority, raise_errors))
+        return scores
+    
+    def _pack_answers(self, question_context: str, pending: List[Tuple[int, str, str]]) -> List[List[Tuple[int, str, str]]]:
+        """Split answers into chunks whose prompts fit AI_QUALITY_BATCH_TOKENS"""
+        header_tokens = self.count_tokens(QUALITY_BATCH_SYSTEM_PROMPT + question_context[:500])
+        chunks, chunk, used = [], [], header_tokens
+        for item in pending:
+            item_tokens = self.count_tokens(item[1][:1000]) + 8  # Numbering and separators
+            if chunk and (used + item_tokens > settings.AI_QUALITY_BATCH_TOKENS
+                          or len(chunk) >= settings.AI_QUALITY_BATCH_MAX_ANSWERS):
+                chunks.append(chunk)
+                chunk, used = [], header_tokens
+            chunk.append(item)
+            used += item_tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    @staticmethod
+    def _parse_batch_scores(text: str, count: int) -> Dict[int, float]:
+        """Parse a JSON score list, keeping only well-formed items with ids 1..count"""
+        match = re.search(r"\[.*\]", text, re.S)
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        
+        scores = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index, score = item.get("id"), item.get("score")
+            if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= count or index in scores:
+                continue
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 1:
+                continue
+            scores[index] = float(score)
+        return scores
+    
+    async def _score_chunk(self, question_context: str, chunk: List[Tuple[int, str, str]],
+                           priority: str, raise_errors: bool = False) -> Dict[int, float]:
+        numbered = "\n\n".join(
+            f"Answer {i}: {content[:1000]}" for i, (_, content, _) in enumerate(chunk, 1)
+        )
+        parsed = {}
+        try:
+            response = await self._complete(
+                [
+                    {
+                        "role": "system",
+                        "content": QUALITY_BATCH_SYSTEM_PROMPT
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Question context: {question_context[:500]}\n\n{numbered}\n\nScores (JSON):"
+                    }
+                ],
+                max_tokens=15 * len(chunk) + 20,
+                temperature=0.1,
+                priority=priority
+            )
+            self.batch_stats["batch_calls"] += 1
+            self.batch_stats["batch_tokens"] += response.total_tokens
+            parsed = self._parse_batch_scores(response.content, len(chunk))
+        except Exception as e:
+            logger.error(f"Batch quality scoring failed, falling back to single calls: {e}")
+        
+        scores = {}
+        for i, (answer_id, content, cache_key) in enumerate(chunk, 1):
+            if i in parsed:
+                scores[answer_id] = parsed[i]
+                await self._cache_store(cache_key, "quality_score_batch", parsed[i])
+                self.batch_stats["batched_answers"] += 1
+                # What scoring this answer on its own would have cost (prompt plus a short completion)
+                self.batch_stats["single_tokens_estimate"] += self.count_tokens(
+                    QUALITY_SYSTEM_PROMPT + self._quality_prompt(content, question_context)
+                ) + 12
+            else:
+                self.batch_stats["fallback_answers"] += 1
+                scores[answer_id] = await self.generate_answer_quality_score(
+                    content, question_context, priority, raise_errors
+                )
+        return scores
+    
+    def quality_batch_stats(self) -> dict:
+        """Calls and tokens saved by batch scoring, per answer scored in a batch"""
+        stats = dict(self.batch_stats)
+        batched = stats["batched_answers"]
+        calls_saved = batched - stats["batch_calls"]
+        tokens_saved = stats["single_tokens_estimate"] - stats["batch_tokens"]
+        stats["calls_saved"] = calls_saved
+        stats["tokens_saved"] = tokens_saved
+        stats["calls_saved_per_answer"] = round(calls_saved / batched, 3) if batched else 0.0
+        stats["tokens_saved_per_answer"] = round(tokens_saved / batched, 1) if batched else 0.0
+        return stats
+
+# Global instance (built on first use)
+ai_service = registry.lazy("ai_service", AIService)
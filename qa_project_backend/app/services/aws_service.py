@@ -1,36 +1,103 @@
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
-from typing import Optional, Dict, Any
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, Any, List, Callable
+import asyncio
 import json
 import logging
+import time
 from datetime import datetime
 from ..config import settings
+from . import registry
 
 logger = logging.getLogger(__name__)
 
+PUT_METRIC_DATA_MAX_DATUMS = 1000  # CloudWatch limit per PutMetricData call
+LATENCY_SAMPLES = 1000  # Recent calls kept per operation for percentiles
+# The metrics transport itself: reporting it through the aggregator would make every
+# flush queue data for the next one, so it only shows up in stats()
+UNREPORTED_OPERATIONS = {"cloudwatch.put_metric_data"}
+
 class AWSService:
+    """Async facade over boto3.
+    
+    boto3 blocks, so every call runs on a dedicated, bounded thread pool
+    and the event loop keeps serving requests while an upload is in
+    flight. Each call's latency (including time queued for a thread) is
+    tracked per operation.
+    """
+    
     def __init__(self):
         self.s3_client = None
         self.cloudwatch_client = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._latency: Dict[str, dict] = {}
         
         if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+            import boto3  # Slow to import; only needed when AWS is configured
+            from botocore.config import Config
+            
+            config = Config(
+                max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+                connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+                retries={"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": "standard"},
+                # S3-compatible stand-ins (MinIO, moto, localstack) serve buckets by path
+                s3={"addressing_style": "path"} if settings.AWS_ENDPOINT_URL else None
+            )
+            client_args = dict(
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION,
+                endpoint_url=settings.AWS_ENDPOINT_URL or None,
+                config=config
+            )
+            
             try:
-                self.s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_REGION
-                )
-                
-                self.cloudwatch_client = boto3.client(
-                    'cloudwatch',
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_REGION
+                self.s3_client = boto3.client('s3', **client_args)
+                self.cloudwatch_client = boto3.client('cloudwatch', **client_args)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.AWS_MAX_WORKERS,
+                    thread_name_prefix="aws"
                 )
             except NoCredentialsError:
                 logger.warning("AWS credentials not properly configured")
     
+    async def _call(self, operation: str, fn: Callable, **kwargs) -> Any:
+        """Run a boto3 call on the AWS thread pool and record its latency"""
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, **kwargs))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(operation, time.perf_counter() - start, failed)
+    
+    def _record(self, operation: str, seconds: float, failed: bool) -> None:
+        stats = self._latency.get(operation)
+        if stats is None:
+            stats = self._latency[operation] = {
+                "calls": 0, "errors": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=LATENCY_SAMPLES)
+            }
+        stats["calls"] += 1
+        stats["errors"] += failed
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["recent"].append(seconds)
+        
+        if operation in UNREPORTED_OPERATIONS:
+            return
+        from .metrics import metrics  # metrics sends through this service
+        metrics.observe("AWSCallLatency", seconds * 1000, Operation=operation)
+    
+    def _object_url(self, key: str) -> str:
+        if settings.AWS_ENDPOINT_URL:
+            return f"{settings.AWS_ENDPOINT_URL.rstrip('/')}/{settings.AWS_S3_BUCKET}/{key}"
+        return f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+    
     async def upload_file_to_s3(self, file_content: bytes, file_key: str, content_type: str = 'application/octet-stream') -> Optional[str]:
         """Upload file to S3 and return URL"""
         if not self.s3_client or not settings.AWS_S3_BUCKET:
@@ -38,7 +105,9 @@ class AWSService:
             return None
         
         try:
-            self.s3_client.put_object(
+            await self._call(
+                "s3.put_object",
+                self.s3_client.put_object,
                 Bucket=settings.AWS_S3_BUCKET,
                 Key=file_key,
                 Body=file_content,
@@ -46,10 +115,9 @@ class AWSService:
             )
             
             # Generate URL
-            url = f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{file_key}"
-            return url
+            return self._object_url(file_key)
             
-        except ClientError as e:
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"S3 upload failed: {e}")
             return None
     
@@ -59,11 +127,16 @@ class AWSService:
             return False
         
         try:
-            # Convert data to JSON
-            json_data = json.dumps(data, default=str, indent=2)
+            # Convert data to JSON (off the event loop too; backups can be large)
+            json_data = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                partial(json.dumps, data, default=str, indent=2)
+            )
             
             # Upload to S3
-            self.s3_client.put_object(
+            await self._call(
+                "s3.put_object",
+                self.s3_client.put_object,
                 Bucket=settings.AWS_S3_BUCKET,
                 Key=f"backups/{backup_key}",
                 Body=json_data.encode('utf-8'),
@@ -73,61 +146,75 @@ class AWSService:
             logger.info(f"Data backup successful: {backup_key}")
             return True
             
-        except ClientError as e:
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"S3 backup failed: {e}")
             return False
     
     async def send_metric_to_cloudwatch(self, metric_name: str, value: float, unit: str = 'Count', namespace: str = 'QAPlatform') -> bool:
-        """Send custom metric to CloudWatch"""
-        if not self.cloudwatch_client:
-            return False
-        
-        try:
-            self.cloudwatch_client.put_metric_data(
-                Namespace=namespace,
-                MetricData=[
-                    {
-                        'MetricName': metric_name,
-                        'Value': value,
-                        'Unit': unit,
-                        'Timestamp': datetime.utcnow()
-                    }
-                ]
-            )
-            return True
-            
-        except ClientError as e:
-            logger.error(f"CloudWatch metric failed: {e}")
-            return False
+        """Send custom metric to CloudWatch (prefer the batching aggregator in services.metrics)"""
+        return await self.put_metric_data([
+            {
+                'MetricName': metric_name,
+                'Value': value,
+                'Unit': unit,
+                'Timestamp': datetime.utcnow()
+            }
+        ], namespace)
     
-    async def send_platform_metrics(self, metrics: Dict[str, float]) -> bool:
-        """Send multiple platform metrics to CloudWatch"""
+    async def put_metric_data(self, metric_data: List[Dict[str, Any]], namespace: str = 'QAPlatform') -> bool:
+        """Send prepared metric datums to CloudWatch in as few calls as the API allows"""
         if not self.cloudwatch_client:
             return False
         
         try:
-            metric_data = []
-            for metric_name, value in metrics.items():
-                metric_data.append({
-                    'MetricName': metric_name,
-                    'Value': value,
-                    'Unit': 'Count',
-                    'Timestamp': datetime.utcnow()
-                })
-            
-            # CloudWatch allows max 20 metrics per call
-            for i in range(0, len(metric_data), 20):
-                batch = metric_data[i:i+20]
-                self.cloudwatch_client.put_metric_data(
-                    Namespace='QAPlatform',
-                    MetricData=batch
+            for i in range(0, len(metric_data), PUT_METRIC_DATA_MAX_DATUMS):
+                await self._call(
+                    "cloudwatch.put_metric_data",
+                    self.cloudwatch_client.put_metric_data,
+                    Namespace=namespace,
+                    MetricData=metric_data[i:i + PUT_METRIC_DATA_MAX_DATUMS]
                 )
-            
             return True
             
-        except ClientError as e:
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"CloudWatch metrics batch failed: {e}")
             return False
+    
+    async def send_platform_metrics(self, metrics: Dict[str, float]) -> bool:
+        """Send multiple platform metrics to CloudWatch"""
+        return await self.put_metric_data([
+            {
+                'MetricName': metric_name,
+                'Value': value,
+                'Unit': 'Count',
+                'Timestamp': datetime.utcnow()
+            }
+            for metric_name, value in metrics.items()
+        ])
+    
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+    
+    def stats(self) -> dict:
+        operations = {}
+        for operation, stats in self._latency.items():
+            recent = sorted(stats["recent"])
+            operations[operation] = {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total"] / stats["calls"] * 1000, 1),
+                "p50_ms": round(recent[len(recent) // 2] * 1000, 1),
+                "p99_ms": round(recent[min(len(recent) - 1, len(recent) * 99 // 100)] * 1000, 1),
+                "max_ms": round(stats["max"] * 1000, 1)
+            }
+        return {
+            "configured": self._executor is not None,
+            "endpoint_url": settings.AWS_ENDPOINT_URL or None,
+            "max_workers": settings.AWS_MAX_WORKERS,
+            "max_pool_connections": settings.AWS_MAX_POOL_CONNECTIONS,
+            "operations": operations
+        }
 
-# Global instance
-aws_service = AWSService()
\ No newline at end of file
+# Global instance (built on first use)
+aws_service = registry.lazy("aws_service", AWSService)
\ No newline at end of file
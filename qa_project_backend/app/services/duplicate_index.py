@@ -0,0 +1,272 @@
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from ..config import settings
+from .. import database, models
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+CONTENT_CHARS = 2000  # Only the start of the body is shingled
+NUM_PERM = 64  # MinHash values per question
+ROWS = 4  # 16-bit values per band, so each band packs into one uint64
+BANDS = NUM_PERM // ROWS
+SIGNATURE_CHUNK_SHINGLES = 16_384  # Shingles hashed at once: NUM_PERM x this many uint64s (8 MB)
+COMPACT_ROWS = 20_000  # Re-sort the band indexes once this many questions are unsorted
+
+class DuplicateIndex:
+    """MinHash-LSH index of question text for near-duplicate lookups.
+
+    Each question keeps the low 16 bits of 64 MinHash values (128 bytes) in
+    one growable uint16 array. Four values form a band, read as a uint64
+    key; per band, an argsort of the keys makes lookups a binary search.
+    Questions added since the last sort are scanned directly until the
+    next compaction.
+    """
+
+    def __init__(self, threshold: float, refresh_seconds: int, seed: int = 1):
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        rng = np.random.RandomState(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, keep the high 32 bits of the wrapped product
+        self._a = (rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+        self._b = rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self._signatures = np.zeros((1024, NUM_PERM), dtype=np.uint16)
+        self._ids = np.zeros(1024, dtype=np.int32)
+        self._size = 0
+        self._sorted = 0  # Rows covered by _orders
+        self._orders = [np.zeros(0, dtype=np.int32) for _ in range(BANDS)]
+        self.last_id = 0
+        self._observed = set()
+
+        self.build_seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    # ----- Signatures -----
+
+    @staticmethod
+    def shingles(title: str, content: str = "") -> List[bytes]:
+        """Word pairs of the title and start of the body (single words for one-word texts)"""
+        words = WORD_RE.findall(f"{title} {(content or '')[:CONTENT_CHARS]}".lower())
+        if len(words) < 2:
+            return [word.encode("utf-8") for word in words]
+        return list({f"{a} {b}".encode("utf-8") for a, b in zip(words, words[1:])})
+
+    def signatures(self, texts: List[Tuple[str, str]]) -> np.ndarray:
+        """MinHash signatures for (title, content) pairs, computed together (all zeros for empty text)"""
+        shingle_lists = [self.shingles(title, content) for title, content in texts]
+        counts = np.array([len(shingles) for shingles in shingle_lists], dtype=np.int64)
+        result = np.zeros((len(texts), NUM_PERM), dtype=np.uint16)
+        if not counts.any():
+            return result
+
+        hashes = np.fromiter(
+            (zlib.crc32(shingle) for shingles in shingle_lists for shingle in shingles),
+            dtype=np.uint64, count=int(counts.sum())
+        )
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        minimums = np.full((len(texts), NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+        # Hash a fixed number of shingles at a time so memory stays bounded for any batch size
+        for low in range(0, len(hashes), SIGNATURE_CHUNK_SHINGLES):
+            high = min(low + SIGNATURE_CHUNK_SHINGLES, len(hashes))
+            # One row per permutation, so each document's shingles are a contiguous run to reduce
+            with np.errstate(over="ignore"):
+                values = self._a[:, None] * hashes[None, low:high]
+                values += self._b[:, None]
+            values >>= np.uint64(32)
+            # Documents with shingles in this chunk; one may have started in the previous chunk
+            docs = np.arange(np.searchsorted(ends, low, side="right"), np.searchsorted(starts, high, side="left"))
+            docs = docs[counts[docs] > 0]
+            runs = np.minimum.reduceat(values, np.maximum(starts[docs], low) - low, axis=1)
+            minimums[docs] = np.minimum(minimums[docs], runs.T)
+        nonempty = counts > 0
+        result[nonempty] = (minimums[nonempty] & np.uint64(0xFFFF)).astype(np.uint16)
+        return result
+
+    def signature(self, title: str, content: str = "") -> np.ndarray:
+        return self.signatures([(title, content)])[0]
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(signatures).view(np.uint64)
+
+    # ----- Building -----
+
+    def _append(self, question_ids: List[int], signatures: np.ndarray) -> None:
+        with self._lock:
+            needed = self._size + len(question_ids)
+            if needed > len(self._ids):
+                capacity = max(needed, len(self._ids) * 2)
+                signatures_grown = np.zeros((capacity, NUM_PERM), dtype=np.uint16)
+                signatures_grown[:self._size] = self._signatures[:self._size]
+                ids_grown = np.zeros(capacity, dtype=np.int32)
+                ids_grown[:self._size] = self._ids[:self._size]
+                self._signatures, self._ids = signatures_grown, ids_grown
+            self._signatures[self._size:needed] = signatures
+            self._ids[self._size:needed] = question_ids
+            self._size = needed
+
+    def _compact(self) -> None:
+        """Sort band keys for every row"""
+        with self._lock:
+            size = self._size
+            keys = self._band_keys(self._signatures[:size])
+        orders = [np.argsort(keys[:, band], kind="stable").astype(np.int32) for band in range(BANDS)]
+        with self._lock:
+            self._orders, self._sorted = orders, size
+
+    def observe(self, question_id: int, title: str, content: str) -> None:
+        """Index a question created in this process"""
+        with self._lock:
+            if question_id <= self.last_id or question_id in self._observed:
+                return
+            self._observed.add(question_id)
+        self._append([question_id], self.signature(title, content)[None, :])
+
+    def refresh(self) -> int:
+        """Index questions added since the last refresh (the first call is a full build)"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            first_build = self.last_id == 0
+            added = 0
+            db = database.SessionLocal()
+            try:
+                rows = db.query(models.Question.id, models.Question.title, models.Question.content).filter(
+                    models.Question.id > self.last_id
+                ).order_by(models.Question.id.asc()).yield_per(1000)
+
+                last_id = self.last_id
+                batch_ids, batch = [], []
+                for question_id, title, content in rows:
+                    last_id = question_id
+                    if question_id in self._observed:
+                        continue
+                    batch_ids.append(question_id)
+                    batch.append((title, content))
+                    if len(batch) >= 1000:
+                        self._append(batch_ids, self.signatures(batch))
+                        added += len(batch)
+                        batch_ids, batch = [], []
+                if batch:
+                    self._append(batch_ids, self.signatures(batch))
+                    added += len(batch)
+            finally:
+                db.close()
+
+            with self._lock:
+                self.last_id = max(self.last_id, last_id)
+                self._observed = {question_id for question_id in self._observed if question_id > self.last_id}
+            if first_build or self._size - self._sorted >= COMPACT_ROWS:
+                self._compact()
+
+            if first_build:
+                self.build_seconds = time.perf_counter() - start
+                logger.info(f"Duplicate index built from {added} questions in {self.build_seconds:.2f}s")
+            return added
+
+    # ----- Lookups -----
+
+    @staticmethod
+    def _bisect(column: np.ndarray, order: np.ndarray, before, low: int = 0) -> int:
+        """First position in sorted order whose key is not `before` the query.
+
+        np.searchsorted(sorter=...) validates the whole sorter on each call,
+        which costs more than the search itself at a million rows.
+        """
+        high = len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if before(int(column[order[middle]])):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, title: str, content: str = "", limit: int = 5,
+             threshold: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Likely duplicates as (question_id, estimated Jaccard similarity), most similar first"""
+        start = time.perf_counter()
+        threshold = self.threshold if threshold is None else threshold
+        if not self.shingles(title, content):
+            return []
+        query = self.signature(title, content)
+        query_keys = self._band_keys(query[None, :])[0]
+
+        with self._lock:
+            signatures, ids = self._signatures, self._ids
+            size, sorted_rows, orders = self._size, self._sorted, self._orders
+        if size == 0:
+            return []
+
+        keys = self._band_keys(signatures[:sorted_rows])
+        candidates = []
+        for band in range(BANDS):
+            column, order, key = keys[:, band], orders[band], int(query_keys[band])
+            left = self._bisect(column, order, lambda value: value < key)
+            right = self._bisect(column, order, lambda value: value <= key, left)
+            if right > left:
+                candidates.append(order[left:right])
+        if size > sorted_rows:
+            pending = self._band_keys(signatures[sorted_rows:size])
+            candidates.append(np.nonzero((pending == query_keys).any(axis=1))[0].astype(np.int32) + sorted_rows)
+
+        results = []
+        if candidates:
+            rows = np.unique(np.concatenate(candidates))
+            similarity = (signatures[rows] == query).mean(axis=1)
+            keep = similarity >= threshold
+            rows, similarity = rows[keep], similarity[keep]
+            best = {}
+            for row, score in zip(ids[rows].tolist(), similarity.tolist()):
+                best[row] = max(score, best.get(row, 0.0))
+            results = sorted(best.items(), key=lambda item: -item[1])[:limit]
+
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - start
+        return results
+
+    # ----- Lifecycle -----
+
+    async def _refresh_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except Exception as e:
+                logger.error(f"Duplicate index refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """Build in the background and keep up with other workers' questions"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "questions": self._size,
+            "unsorted": self._size - self._sorted,
+            "signature_bytes": int(self._signatures[:self._size].nbytes),
+            "index_bytes": int(sum(order.nbytes for order in self._orders)),
+            "build_seconds": round(self.build_seconds, 3),
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+            "threshold": self.threshold
+        }
+
+# Global instance
+duplicate_index = DuplicateIndex(settings.DUPLICATE_THRESHOLD, settings.DUPLICATE_REFRESH_SECONDS)
@@ -0,0 +1,329 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import or_, and_, func
+from sqlalchemy.exc import SQLAlchemyError
+import asyncio
+import logging
+from ..config import settings
+from .. import crud, database, models
+from .ai_service import ai_service, SUMMARY_FAILED_MESSAGE
+from .summaries import generate_summary
+from .llm_backend import llm_configured
+from .related_index import related_index
+
+logger = logging.getLogger(__name__)
+
+class EnrichmentError(Exception):
+    """Raised by a handler when a job should be retried"""
+
+class EnrichmentQueue:
+    """Worker pool draining the enrichment_jobs table.
+
+    Create endpoints only insert job rows, so posting never waits on the
+    LLM. Workers claim jobs oldest-first with a lease, hold no DB session
+    while the model runs, and retry failures with exponential backoff.
+    Session work runs on the default executor, never on the event loop.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, poll_seconds: float, lease_seconds: int):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    # ----- Claiming -----
+
+    @staticmethod
+    def _runnable(now: datetime):
+        return or_(
+            and_(models.EnrichmentJob.status == "pending", models.EnrichmentJob.run_after <= now),
+            and_(models.EnrichmentJob.status == "running", models.EnrichmentJob.locked_until < now)
+        )
+
+    def _try_claim(self, db, job: models.EnrichmentJob, now: datetime) -> bool:
+        """Optimistic claim: only one worker can move the row off its current state"""
+        claimed = db.query(models.EnrichmentJob).filter(
+            models.EnrichmentJob.id == job.id,
+            models.EnrichmentJob.generation == job.generation,
+            models.EnrichmentJob.status == job.status,
+            self._runnable(now)
+        ).update({
+            models.EnrichmentJob.status: "running",
+            models.EnrichmentJob.locked_until: now + timedelta(seconds=self.lease_seconds),
+            models.EnrichmentJob.attempts: models.EnrichmentJob.attempts + 1
+        }, synchronize_session=False)
+        db.commit()
+        return bool(claimed)
+
+    def _claim(self) -> Optional[tuple]:
+        """Claim the oldest runnable job; returns (id, entity_type, entity_id, operation, generation)"""
+        db = database.SessionLocal()
+        try:
+            now = datetime.utcnow()
+            candidates = db.query(models.EnrichmentJob).filter(self._runnable(now)).order_by(
+                models.EnrichmentJob.run_after.asc(),
+                models.EnrichmentJob.id.asc()
+            ).limit(10).all()
+
+            for job in candidates:
+                if self._try_claim(db, job, now):
+                    return job.id, job.entity_type, job.entity_id, job.operation, job.generation
+            return None
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Enrichment claim failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _claim_scoring_siblings(self, answer_id: int) -> List[Tuple[int, int, int]]:
+        """Claim queued quality_score jobs for other answers to the same question.
+
+        Returns (job id, answer id, generation) tuples so they can be scored in
+        the same batch call as answer_id.
+        """
+        limit = settings.AI_QUALITY_BATCH_MAX_ANSWERS - 1
+        if limit <= 0:
+            return []
+
+        db = database.SessionLocal()
+        try:
+            now = datetime.utcnow()
+            question_id = db.query(models.Answer.question_id).filter(models.Answer.id == answer_id).scalar()
+            if question_id is None:
+                return []
+            sibling_ids = db.query(models.Answer.id).filter(
+                models.Answer.question_id == question_id,
+                models.Answer.id != answer_id
+            )
+            candidates = db.query(models.EnrichmentJob).filter(
+                models.EnrichmentJob.entity_type == "answer",
+                models.EnrichmentJob.operation == "quality_score",
+                models.EnrichmentJob.entity_id.in_(sibling_ids),
+                self._runnable(now)
+            ).order_by(models.EnrichmentJob.id.asc()).limit(limit).all()
+
+            return [
+                (job.id, job.entity_id, job.generation)
+                for job in candidates if self._try_claim(db, job, now)
+            ]
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Enrichment sibling claim failed: {e}")
+            return []
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, generation: int, error: Optional[str] = None) -> None:
+        """Mark a job done, or schedule its retry; a re-enqueued job is left pending"""
+        db = database.SessionLocal()
+        try:
+            job = db.query(models.EnrichmentJob).filter(
+                models.EnrichmentJob.id == job_id,
+                models.EnrichmentJob.generation == generation,
+                models.EnrichmentJob.status == "running"
+            ).first()
+            if job is None:
+                return  # Re-enqueued while running; the new generation will run again
+
+            if error is None:
+                job.status = "done"
+                job.last_error = ""
+                self.processed += 1
+            elif job.attempts >= self.max_attempts:
+                job.status = "failed"
+                job.last_error = error[:2000]
+                self.failed += 1
+            else:
+                job.status = "pending"
+                job.last_error = error[:2000]
+                job.run_after = datetime.utcnow() + timedelta(seconds=min(3600, 5 * 2 ** job.attempts))
+            job.locked_until = None
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Enrichment job {job_id} bookkeeping failed: {e}")
+        finally:
+            db.close()
+
+    # ----- Handlers -----
+
+    @staticmethod
+    def _load_question(question_id: int) -> Optional[Tuple[str, str]]:
+        db = database.SessionLocal()
+        try:
+            return db.query(models.Question.title, models.Question.content).filter(
+                models.Question.id == question_id
+            ).first()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _store_tags(question_id: int, tags: List[str]) -> None:
+        db = database.SessionLocal()
+        try:
+            db.query(models.Question).filter(models.Question.id == question_id).update({
+                models.Question.suggested_tags: ','.join(tags)
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _suggest_tags(self, question_id: int) -> None:
+        question = await database.in_thread(self._load_question, question_id)
+        if question is None:
+            return
+        title, content = question
+
+        # LLM failures raise, so the job is retried instead of finishing without tags
+        tags = await ai_service.suggest_tags(title, content, priority="enrichment", raise_errors=True)
+        if not tags:
+            return
+        await database.in_thread(self._store_tags, question_id, tags)
+
+    async def _summarize(self, question_id: int) -> None:
+        if not llm_configured():
+            return  # Don't persist the "not configured" placeholder
+
+        # Shares the generation with any request summarizing this question right now
+        summary, regenerated = await generate_summary(question_id, priority="enrichment")
+        if summary is not None and not regenerated:
+            self.skipped += 1  # Nothing the summary depends on has changed
+        elif summary == SUMMARY_FAILED_MESSAGE:
+            raise EnrichmentError(summary)
+
+    @staticmethod
+    def _load_answers(answer_ids: List[int]) -> list:
+        db = database.SessionLocal()
+        try:
+            return db.query(models.Answer.id, models.Answer.content, models.Question.title, models.Question.content).join(
+                models.Question, models.Answer.question_id == models.Question.id
+            ).filter(models.Answer.id.in_(answer_ids)).all()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _store_scores(scores: dict) -> None:
+        db = database.SessionLocal()
+        try:
+            for answer_id, score in scores.items():
+                db.query(models.Answer).filter(models.Answer.id == answer_id).update({
+                    models.Answer.quality_score: int(score * 100)  # Convert to 0-100 scale
+                }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _quality_scores(self, answer_ids: List[int]) -> None:
+        """Score answers to one question with a single batched call"""
+        if not llm_configured():
+            return  # Don't overwrite scores with the neutral default
+
+        rows = await database.in_thread(self._load_answers, answer_ids)
+        if not rows:
+            return
+
+        _, _, title, question_content = rows[0]
+        question_context = f"{title}\n{question_content}"
+        scores = await ai_service.score_answers_batch(
+            question_context,
+            {answer_id: answer_content for answer_id, answer_content, _, _ in rows},
+            priority="enrichment",
+            raise_errors=True  # Retry on an outage rather than store made-up scores
+        )
+        await database.in_thread(self._store_scores, scores)
+
+    async def _run(self, entity_type: str, entity_ids: List[int], operation: str) -> None:
+        if entity_type == "question" and operation == "suggest_tags":
+            await self._suggest_tags(entity_ids[0])
+        elif entity_type == "question" and operation == "summarize":
+            await self._summarize(entity_ids[0])
+        elif entity_type == "question" and operation == "related":
+            # CPU-bound scoring against the mapped vectors; keep it off the event loop
+            await database.in_thread(related_index.update, entity_ids[0])
+        elif entity_type == "answer" and operation == "quality_score":
+            await self._quality_scores(entity_ids)
+        else:
+            logger.warning(f"Unknown enrichment job: {entity_type}/{operation}")
+
+    # ----- Worker pool -----
+
+    async def run_once(self) -> bool:
+        """Claim and process a single job; returns False when the queue is idle"""
+        claimed = await database.in_thread(self._claim)
+        if claimed is None:
+            return False
+
+        job_id, entity_type, entity_id, operation, generation = claimed
+        jobs = [(job_id, entity_id, generation)]
+        if entity_type == "answer" and operation == "quality_score":
+            jobs += await database.in_thread(self._claim_scoring_siblings, entity_id)
+
+        try:
+            await self._run(entity_type, [job[1] for job in jobs], operation)
+            for job_id, _, generation in jobs:
+                await database.in_thread(self._finish, job_id, generation)
+        except Exception as e:
+            logger.warning(f"Enrichment {operation} for {entity_type} {entity_id} failed: {e}")
+            for job_id, _, generation in jobs:
+                await database.in_thread(self._finish, job_id, generation, str(e) or e.__class__.__name__)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Enrichment worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def notify(self) -> None:
+        """Wake idle workers after new jobs were committed in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the worker pool (call from a running event loop)"""
+        if self._tasks or self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} enrichment workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        db = database.SessionLocal()
+        try:
+            counts = dict(db.query(models.EnrichmentJob.status, func.count(models.EnrichmentJob.id)).group_by(
+                models.EnrichmentJob.status
+            ).all())
+        finally:
+            db.close()
+        return {"workers": len(self._tasks), "processed": self.processed, "failed": self.failed,
+                "skipped_fresh_summaries": self.skipped, "jobs": counts}
+
+# Global instance
+enrichment_queue = EnrichmentQueue(
+    settings.ENRICHMENT_WORKERS,
+    settings.ENRICHMENT_MAX_ATTEMPTS,
+    settings.ENRICHMENT_POLL_SECONDS,
+    settings.ENRICHMENT_LEASE_SECONDS
+)
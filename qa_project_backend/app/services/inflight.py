@@ -0,0 +1,100 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+import uuid
+from ..cache import cache
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class InFlightRegistry:
+    """Coalesces concurrent generations of the same (operation, entity).
+
+    Within a worker, later callers await the first caller's future. Across
+    workers, the first caller also takes a lease in the shared cache
+    (`cache.add` with a TTL); callers on other workers poll `peek` for the
+    result until the lease is released, and generate themselves only if it
+    expires or is released without a result.
+    """
+
+    def __init__(self, lease_seconds: int, poll_seconds: float):
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._owner = uuid.uuid4().hex
+        self._futures: Dict[Tuple[str, Any], asyncio.Future] = {}
+        self.generations = 0
+        self.joined = 0
+        self.remote_results = 0
+        self.lease_timeouts = 0
+
+    async def run(self, operation: str, entity_id: Any, generate: Callable[[], Awaitable],
+                  peek: Optional[Callable[[], Any]] = None):
+        """Return generate()'s result, sharing one call among concurrent callers.
+
+        peek returns another worker's finished result, or None if there is none yet.
+        """
+        key = (operation, entity_id)
+        future = self._futures.get(key)
+        if future is not None:
+            self.joined += 1
+            return await asyncio.shield(future)
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; don't log "exception was never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result = await self._lead(operation, entity_id, generate, peek)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._futures[key]
+
+    async def _lead(self, operation: str, entity_id: Any, generate: Callable[[], Awaitable],
+                    peek: Optional[Callable[[], Any]]):
+        lease_key = f"inflight:{operation}:{entity_id}"
+        deadline = time.monotonic() + self.lease_seconds
+        waited = False
+        while not cache.add(lease_key, self._owner, ttl=self.lease_seconds):
+            # Another worker is generating; wait for its result or for the lease to go
+            if time.monotonic() >= deadline:
+                self.lease_timeouts += 1
+                logger.warning(f"Gave up waiting for {operation} {entity_id} on another worker")
+                break
+            waited = True
+            await asyncio.sleep(self.poll_seconds)
+            result = peek() if peek is not None else None
+            if result is not None:
+                self.remote_results += 1
+                return result
+
+        try:
+            if waited and peek is not None:
+                # The other worker may have finished between our last poll and taking the lease
+                result = peek()
+                if result is not None:
+                    self.remote_results += 1
+                    return result
+            self.generations += 1
+            return await generate()
+        finally:
+            if cache.get(lease_key) == self._owner:
+                cache.delete(lease_key)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._futures),
+            "generations": self.generations,
+            "joined": self.joined,
+            "remote_results": self.remote_results,
+            "lease_timeouts": self.lease_timeouts
+        }
+
+# Global instance
+inflight = InFlightRegistry(settings.AI_INFLIGHT_LEASE_SECONDS, settings.AI_INFLIGHT_POLL_SECONDS)
@@ -0,0 +1,279 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+from ..config import settings
+from .prompt_builder import WordEncoding
+
+logger = logging.getLogger(__name__)
+
+class LLMError(Exception):
+    """A failed LLM call; retryable errors are retried by the AI scheduler"""
+
+    def __init__(self, message: str, retryable: bool = False, headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.headers = headers or {}
+
+class LLMRateLimitError(LLMError):
+    """The provider throttled the call (HTTP 429)"""
+
+    def __init__(self, message: str, headers: Optional[Dict] = None):
+        super().__init__(message, retryable=True, headers=headers)
+
+class ChatResult:
+    """Text and token usage of one chat completion"""
+    __slots__ = ("content", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, content: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+class LLMBackend(ABC):
+    """Chat model interface used by AIService.
+
+    Implementations raise LLMError (or LLMRateLimitError) for provider
+    failures so the scheduler can retry without knowing the provider.
+    """
+    model = ""
+    approximate_tokens = False  # May count tokens with WordEncoding when tiktoken is unavailable
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def chat(self, messages: List[Dict], max_tokens: int, temperature: float) -> ChatResult:
+        """One chat completion"""
+
+    @abstractmethod
+    def stream(self, messages: List[Dict], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        """Yield completion text as it is produced"""
+
+    def load_encoding(self):
+        """Tokenizer for prompt budgets: tiktoken's cl100k_base.
+
+        Only the fake backend, or an install with AI_APPROXIMATE_TOKENS set,
+        falls back to an approximation; a real provider billed by token fails
+        loudly instead of silently mis-sizing its prompts.
+        """
+        import tiktoken  # Slow to import; loads with the AI service, not the app
+
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its vocabulary on first use
+            if not (self.approximate_tokens or settings.AI_APPROXIMATE_TOKENS):
+                raise RuntimeError(
+                    f"tiktoken cl100k_base unavailable ({e}); set AI_APPROXIMATE_TOKENS=true to count tokens approximately"
+                ) from e
+            logger.warning(f"tiktoken unavailable ({e}), counting tokens approximately")
+            return WordEncoding()
+
+    async def batch(self, requests: List[Dict], concurrency: int = 4) -> List[ChatResult]:
+        """Run several chat requests (dicts of chat() arguments), at most `concurrency` at a time"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(request: Dict) -> ChatResult:
+            async with semaphore:
+                return await self.chat(**request)
+
+        return list(await asyncio.gather(*(run(request) for request in requests)))
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "model": self.model}
+
+class OpenAIBackend(LLMBackend):
+    """openai 0.27 ChatCompletion API"""
+
+    def __init__(self, model: str):
+        # openai is slow to import, so it loads with the backend, not the app
+        import openai
+
+        self.openai = openai
+        self.model = model
+        if settings.OPENAI_API_KEY:
+            openai.api_key = settings.OPENAI_API_KEY
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.OPENAI_API_KEY)
+
+    def _translate(self, error: Exception) -> LLMError:
+        errors = self.openai.error
+        headers = dict(getattr(error, "headers", None) or {})
+        if isinstance(error, errors.RateLimitError):
+            return LLMRateLimitError(str(error), headers=headers)
+        transient = (errors.ServiceUnavailableError, errors.APIConnectionError, errors.Timeout, errors.TryAgain)
+        return LLMError(str(error), retryable=isinstance(error, transient), headers=headers)
+
+    async def chat(self, messages: List[Dict], max_tokens: int, temperature: float) -> ChatResult:
+        try:
+            response = await self.openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+        except self.openai.error.OpenAIError as e:
+            raise self._translate(e) from e
+        usage = response.get("usage", {})
+        return ChatResult(
+            response.choices[0].message.content,
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0)
+        )
+
+    async def stream(self, messages: List[Dict], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        try:
+            response = await self.openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            )
+            async for chunk in response:
+                delta = chunk["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        except self.openai.error.OpenAIError as e:
+            raise self._translate(e) from e
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic in-process stand-in for load tests and offline benchmarks.
+
+    Replies depend only on the prompt; latency and injected errors come from
+    a seeded RNG, so a run with the same seed and call order is repeatable.
+    Tokens are counted as roughly four characters each.
+    """
+    model = "fake-llm"
+    approximate_tokens = True
+    DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+
+    def __init__(self, latency_ms: float, distribution: str = "lognormal", error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, chunk_ms: float = 20.0, seed: int = 0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_ms = chunk_ms
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        """Restart the RNG and counters"""
+        self._rng = random.Random(self.seed)
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_total = 0.0
+
+    # ----- Simulation -----
+
+    def _latency(self) -> float:
+        mean = self.latency_ms / 1000
+        if self.distribution == "constant":
+            return mean
+        if self.distribution == "uniform":
+            return self._rng.uniform(0, 2 * mean)
+        # Long-tailed like real providers: median below the mean, occasional slow calls
+        sigma = 0.6
+        return self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma) if mean > 0 else 0.0
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    @staticmethod
+    def reply(messages: List[Dict]) -> str:
+        """The canned completion for a prompt"""
+        system_prompt = messages[0]["content"]
+        user_prompt = messages[-1]["content"]
+        digest = hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()
+        if "JSON array" in system_prompt:
+            count = len(re.findall(r"Answer \d+:", user_prompt))
+            return json.dumps([
+                {"id": i, "score": round(int(digest[i % 32], 16) / 15, 2)} for i in range(1, count + 1)
+            ])
+        if "quality" in system_prompt:
+            return str(round(int(digest[:2], 16) / 255, 2))
+        if "tags" in system_prompt:
+            return "python, fastapi, performance"
+        return f"This discussion (ref {digest[:8]}) asks how to solve the problem described and summarizes the suggested approaches."
+
+    async def _call(self, messages: List[Dict]) -> str:
+        """Simulate provider latency and errors; returns the reply"""
+        self.calls += 1
+        latency = self._latency()
+        roll = self._rng.random()
+        self.latency_total += latency
+        await asyncio.sleep(latency)
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise LLMRateLimitError("Fake rate limit", headers={"retry-after": "0"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            raise LLMError("Fake transient error", retryable=True)
+
+        self.prompt_tokens += sum(self.count_tokens(message["content"]) for message in messages)
+        return self.reply(messages)
+
+    # ----- Interface -----
+
+    async def chat(self, messages: List[Dict], max_tokens: int, temperature: float) -> ChatResult:
+        content = await self._call(messages)
+        completion_tokens = min(max_tokens, self.count_tokens(content))
+        self.completion_tokens += completion_tokens
+        return ChatResult(content, sum(self.count_tokens(m["content"]) for m in messages), completion_tokens)
+
+    async def stream(self, messages: List[Dict], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        content = await self._call(messages)
+        for word in re.findall(r"\S+\s*", content):
+            self.completion_tokens += self.count_tokens(word)
+            yield word
+            await asyncio.sleep(self.chunk_ms / 1000)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_ms": round(self.latency_total / self.calls * 1000, 1) if self.calls else 0.0,
+            "seed": self.seed
+        }
+
+def llm_configured() -> bool:
+    """Whether AI features can run, without building the backend"""
+    return settings.LLM_BACKEND == "fake" or bool(settings.OPENAI_API_KEY)
+
+def create_llm_backend(model: str) -> LLMBackend:
+    """Create the backend selected by LLM_BACKEND"""
+    if settings.LLM_BACKEND == "fake":
+        logger.info("Using the fake LLM backend")
+        return FakeLLMBackend(
+            settings.LLM_FAKE_LATENCY_MS,
+            settings.LLM_FAKE_LATENCY_DISTRIBUTION,
+            settings.LLM_FAKE_ERROR_RATE,
+            settings.LLM_FAKE_RATE_LIMIT_RATE,
+            settings.LLM_FAKE_CHUNK_MS,
+            settings.LLM_FAKE_SEED
+        )
+    return OpenAIBackend(model)
@@ -0,0 +1,240 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+from ..config import settings
+from .aws_service import aws_service, PUT_METRIC_DATA_MAX_DATUMS
+
+logger = logging.getLogger(__name__)
+
+MAX_VALUES_PER_DATUM = 150  # CloudWatch limit on Values/Counts pairs in one datum
+
+MetricKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]  # (name, unit, dimensions)
+
+class CloudWatchSink:
+    """Sends batches with PutMetricData; drops them when AWS is not configured"""
+
+    async def send(self, namespace: str, metric_data: List[dict]) -> bool:
+        if not aws_service.cloudwatch_client:
+            return True
+        return await aws_service.put_metric_data(metric_data, namespace)
+
+class MemorySink:
+    """Keeps flushed batches in memory: a local stand-in for CloudWatch in tests and benchmarks"""
+
+    def __init__(self):
+        self.batches: List[Tuple[str, List[dict]]] = []
+
+    async def send(self, namespace: str, metric_data: List[dict]) -> bool:
+        # Batched like the real thing, so len(batches) is the number of API calls it would take
+        for i in range(0, len(metric_data), PUT_METRIC_DATA_MAX_DATUMS):
+            self.batches.append((namespace, metric_data[i:i + PUT_METRIC_DATA_MAX_DATUMS]))
+        return True
+
+    def datums(self, name: Optional[str] = None) -> List[dict]:
+        return [datum for _, data in self.batches for datum in data if name is None or datum["MetricName"] == name]
+
+class MetricsAggregator:
+    """Accumulates counters and latency distributions and flushes them in a few PutMetricData calls.
+
+    A counter becomes one StatisticValues datum per flush however often it
+    was incremented. Observed values are rounded to three significant
+    digits and sent as Values/Counts pairs, so percentiles still work in
+    CloudWatch. Recording only touches in-process dicts; anything not yet
+    flushed is lost if the process dies.
+    """
+
+    def __init__(self, sink, namespace: str, flush_seconds: float, confirm_seconds: float):
+        self.sink = sink
+        self.namespace = namespace
+        self.flush_seconds = flush_seconds
+        self.confirm_seconds = confirm_seconds
+        self._lock = threading.Lock()  # Sync routes record from the threadpool
+        self._counters: Dict[MetricKey, List[float]] = {}  # [count, sum, min, max]
+        self._distributions: Dict[MetricKey, Counter] = {}
+        self._waiters: List[asyncio.Future] = []  # Resolved by the flush that sends their data
+        self._task: Optional[asyncio.Task] = None
+        self._confirm_task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.flushes = 0
+        self.sent_datums = 0
+        self.failed_datums = 0
+
+    @staticmethod
+    def _key(name: str, unit: str, dimensions: Dict[str, str]) -> MetricKey:
+        return name, unit, tuple(sorted((key, str(value)) for key, value in dimensions.items()))
+
+    def increment(self, name: str, value: float = 1, unit: str = "Count", **dimensions) -> None:
+        """Add to a counter"""
+        key = self._key(name, unit, dimensions)
+        with self._lock:
+            stats = self._counters.get(key)
+            if stats is None:
+                self._counters[key] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                stats[2] = min(stats[2], value)
+                stats[3] = max(stats[3], value)
+            self.recorded += 1
+
+    def increment_confirmed(self, name: str, value: float = 1, unit: str = "Count", **dimensions) -> asyncio.Future:
+        """Add to a counter; the future resolves to whether the flush carrying it was accepted.
+
+        Pending confirmations bring the next flush forward to within
+        confirm_seconds, so callers that acknowledge work only once the
+        metric is sent (the outbox) still share one PutMetricData call.
+        """
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.append(future)
+        self.increment(name, value, unit, **dimensions)
+        if self._confirm_task is None:
+            self._confirm_task = asyncio.create_task(self._flush_after(self.confirm_seconds))
+        return future
+
+    async def _flush_after(self, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._confirm_task = None
+        await self.flush()
+
+    def observe(self, name: str, value: float, unit: str = "Milliseconds", **dimensions) -> None:
+        """Record one sample of a distribution, e.g. a latency"""
+        key = self._key(name, unit, dimensions)
+        rounded = float(f"{value:.3g}")
+        with self._lock:
+            distribution = self._distributions.get(key)
+            if distribution is None:
+                distribution = self._distributions[key] = Counter()
+            distribution[rounded] += 1
+            self.recorded += 1
+
+    def _drain(self) -> Tuple[List[dict], List[asyncio.Future]]:
+        """Take everything recorded so far as CloudWatch datums, with the futures waiting on them"""
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            distributions, self._distributions = self._distributions, {}
+            waiters, self._waiters = self._waiters, []
+
+        timestamp = datetime.utcnow()
+        data = []
+        for (name, unit, dimensions), (count, total, low, high) in counters.items():
+            data.append({
+                "MetricName": name,
+                "Dimensions": [{"Name": key, "Value": value} for key, value in dimensions],
+                "Timestamp": timestamp,
+                "StatisticValues": {"SampleCount": count, "Sum": total, "Minimum": low, "Maximum": high},
+                "Unit": unit
+            })
+        for (name, unit, dimensions), distribution in distributions.items():
+            values = sorted(distribution.items())
+            for i in range(0, len(values), MAX_VALUES_PER_DATUM):
+                chunk = values[i:i + MAX_VALUES_PER_DATUM]
+                data.append({
+                    "MetricName": name,
+                    "Dimensions": [{"Name": key, "Value": value} for key, value in dimensions],
+                    "Timestamp": timestamp,
+                    "Values": [value for value, _ in chunk],
+                    "Counts": [float(count) for _, count in chunk],
+                    "Unit": unit
+                })
+        return data, waiters
+
+    async def flush(self) -> int:
+        """Send everything recorded so far; returns the number of datums sent"""
+        data, waiters = self._drain()
+        if not data:
+            return 0
+        self.flushes += 1
+        try:
+            ok = await self.sink.send(self.namespace, data)
+        except Exception as e:
+            logger.error(f"Metrics flush failed: {e}")
+            ok = False
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(ok)
+        if ok:
+            self.sent_datums += len(data)
+            return len(data)
+        self.failed_datums += len(data)
+        return 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self) -> None:
+        """Flush periodically in the background of the current event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._confirm_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._confirm_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._counters) + len(self._distributions)
+            waiting = len(self._waiters)
+        return {
+            "sink": self.sink.__class__.__name__,
+            "flush_seconds": self.flush_seconds,
+            "recorded": self.recorded,
+            "pending_series": pending,
+            "awaiting_confirmation": waiting,
+            "flushes": self.flushes,
+            "sent_datums": self.sent_datums,
+            "failed_datums": self.failed_datums
+        }
+
+class LatencyMiddleware:
+    """ASGI middleware recording request latency per route and response counts per status class"""
+
+    def __init__(self, app, aggregator: MetricsAggregator):
+        self.app = app
+        self.aggregator = aggregator
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; templates keep the dimension count bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.aggregator.observe("RequestLatency", elapsed_ms, Route=f"{scope['method']} {route}")
+            self.aggregator.increment("Requests", StatusClass=f"{status_code // 100}xx")
+
+def _sink():
+    if settings.METRICS_SINK == "memory":
+        return MemorySink()
+    return CloudWatchSink()
+
+# Global instance
+metrics = MetricsAggregator(
+    _sink(), settings.METRICS_NAMESPACE, settings.METRICS_FLUSH_SECONDS, settings.METRICS_CONFIRM_SECONDS
+)
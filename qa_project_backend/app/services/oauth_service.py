@@ -1,27 +1,216 @@
-from authlib.integrations.starlette_client import OAuth
-from authlib.integrations.starlette_client import OAuthError
+from jose import jwt, JWTError
 from starlette.requests import Request
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
+import asyncio
+import httpx
 import logging
+import re
+import time
 from ..config import settings
+from . import registry
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+def parse_max_age(cache_control: Optional[str], default: int) -> int:
+    """Extract max-age (seconds) from a Cache-Control header"""
+    if cache_control:
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+        match = re.search(r"max-age=(\d+)", cache_control)
+        if match:
+            return int(match.group(1))
+    return default
+
+class OIDCProviderCache:
+    """Caches an OIDC discovery document and its JWKS.
+
+    Expiry follows the provider's Cache-Control max-age. A background task
+    refreshes both shortly before they expire, so verifying ID tokens needs
+    no outbound calls in the steady state.
+    """
+
+    def __init__(self, discovery_url: str, default_ttl: int, http_client: Optional[httpx.AsyncClient] = None):
+        self.discovery_url = discovery_url
+        self.default_ttl = default_ttl
+        self.metadata: Dict = {}
+        self.jwks: Dict = {}
+        self.expires_at = 0.0
+        self.refreshed_at = 0.0
+        self.fetch_count = 0
+        self.on_refresh = None
+        self._http_client = http_client
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _fetch_json(self, client: httpx.AsyncClient, url: str) -> Tuple[Dict, int]:
+        response = await client.get(url, timeout=10)
+        response.raise_for_status()
+        self.fetch_count += 1
+        return response.json(), parse_max_age(response.headers.get("Cache-Control"), self.default_ttl)
+
+    async def refresh(self) -> None:
+        """Fetch the discovery document and JWKS"""
+        async with self._lock:
+            client = self._http_client or httpx.AsyncClient()
+            try:
+                metadata, metadata_ttl = await self._fetch_json(client, self.discovery_url)
+                jwks, jwks_ttl = await self._fetch_json(client, metadata["jwks_uri"])
+            finally:
+                if self._http_client is None:
+                    await client.aclose()
+
+            self.metadata = metadata
+            self.jwks = jwks
+            self.refreshed_at = time.time()
+            self.expires_at = self.refreshed_at + min(metadata_ttl, jwks_ttl)
+
+        if self.on_refresh is not None:
+            self.on_refresh()
+
+    def is_fresh(self) -> bool:
+        return bool(self.jwks) and time.time() < self.expires_at
+
+    async def ensure_fresh(self) -> None:
+        if not self.is_fresh():
+            await self.refresh()
+
+    async def get_signing_key(self, kid: str) -> Optional[Dict]:
+        """Find a signing key by id, refetching once if the key was rotated"""
+        await self.ensure_fresh()
+        for key in self.jwks.get("keys", []):
+            if key.get("kid") == kid:
+                return key
+
+        # Unknown kid: refetch, but not more than once a minute
+        if time.time() - self.refreshed_at < 60:
+            return None
+        await self.refresh()
+        for key in self.jwks.get("keys", []):
+            if key.get("kid") == kid:
+                return key
+        return None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            # Refresh at 90% of the remaining lifetime, at least every minute on failure
+            delay = max(60.0, (self.expires_at - time.time()) * 0.9)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"OIDC metadata refresh failed, keeping cached copy: {e}")
+
+    def start(self) -> None:
+        """Start background refresh (call from a running event loop)"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
 class OAuthService:
     def __init__(self):
-        self.oauth = OAuth()
+        # Authlib is slow to import, so it loads with the service, not the app
+        from authlib.integrations.starlette_client import OAuth
         
+        self.oauth = OAuth()
+        self.google_provider = OIDCProviderCache(
+            settings.GOOGLE_DISCOVERY_URL,
+            settings.OIDC_DEFAULT_CACHE_SECONDS
+        )
+        self._warm_up_task: Optional[asyncio.Task] = None
+
         if settings.GOOGLE_CLIENT_ID and settings.GOOGLE_CLIENT_SECRET:
             self.oauth.register(
                 name='google',
                 client_id=settings.GOOGLE_CLIENT_ID,
                 client_secret=settings.GOOGLE_CLIENT_SECRET,
-                server_metadata_url='https://accounts.google.com/.well-known/openid_configuration',
+                server_metadata_url=settings.GOOGLE_DISCOVERY_URL,
                 client_kwargs={
                     'scope': 'openid email profile'
                 }
             )
-    
+            self.google_provider.on_refresh = self._sync_authlib_metadata
+
+    async def warm_up(self) -> None:
+        """Prefetch Google metadata (bounded by OIDC_WARMUP_TIMEOUT_SECONDS) and start background refresh"""
+        if not settings.GOOGLE_CLIENT_ID:
+            return
+        try:
+            await asyncio.wait_for(self.google_provider.refresh(), settings.OIDC_WARMUP_TIMEOUT_SECONDS)
+        except Exception as e:
+            # Tokens still verify: the first one fetches the metadata itself
+            logger.warning(f"Google OIDC metadata prefetch failed: {e!r}")
+        self.google_provider.start()
+
+    def start(self) -> None:
+        """Warm up in the background so startup never waits on Google"""
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def stop(self) -> None:
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
+        await self.google_provider.stop()
+
+    def _sync_authlib_metadata(self) -> None:
+        """Hand the cached metadata and JWKS to Authlib so it skips its own fetches"""
+        google = self.oauth.create_client('google')
+        if google is None or not self.google_provider.metadata:
+            return
+        google.server_metadata.update(self.google_provider.metadata)
+        google.server_metadata['jwks'] = self.google_provider.jwks
+        google.server_metadata['_loaded_at'] = time.time()
+
+    @staticmethod
+    def _user_info_from_claims(claims: Dict) -> Dict:
+        return {
+            'email': claims.get('email'),
+            'first_name': claims.get('given_name', ''),
+            'last_name': claims.get('family_name', ''),
+            'picture': claims.get('picture'),
+            'google_id': claims.get('sub')
+        }
+
+    async def verify_google_id_token(self, id_token: str) -> Optional[Dict]:
+        """Verify a Google ID token locally against the cached JWKS"""
+        if not settings.GOOGLE_CLIENT_ID:
+            return None
+
+        try:
+            kid = jwt.get_unverified_header(id_token).get('kid')
+            key = await self.google_provider.get_signing_key(kid)
+            if key is None:
+                logger.warning(f"Unknown Google signing key: {kid}")
+                return None
+
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=[key.get('alg', 'RS256')],
+                audience=settings.GOOGLE_CLIENT_ID,
+                issuer=GOOGLE_ISSUERS,
+                options={'verify_at_hash': False}
+            )
+
+            if not claims.get('email_verified', False):
+                return None
+
+            return self._user_info_from_claims(claims)
+
+        except JWTError as e:
+            logger.warning(f"Google ID token rejected: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Google ID token verification failed: {e}")
+            return None
+
     async def get_google_auth_url(self, request: Request, redirect_uri: str) -> str:
         """Generate Google OAuth authorization URL"""
         try:
@@ -30,31 +219,27 @@ class OAuthService:
         except Exception as e:
             logger.error(f"Google auth URL generation failed: {e}")
             raise
-    
+
     async def handle_google_callback(self, request: Request) -> Optional[Dict]:
         """Handle Google OAuth callback and return user info"""
         try:
             google = self.oauth.create_client('google')
             token = await google.authorize_access_token(request)
-            
+
             # Get user info
             user_info = token.get('userinfo')
             if user_info:
-                return {
-                    'email': user_info.get('email'),
-                    'first_name': user_info.get('given_name', ''),
-                    'last_name': user_info.get('family_name', ''),
-                    'picture': user_info.get('picture'),
-                    'google_id': user_info.get('sub')
-                }
-            return None
-            
-        except OAuthError as e:
-            logger.error(f"Google OAuth callback failed: {e}")
+                return self._user_info_from_claims(user_info)
             return None
+
         except Exception as e:
-            logger.error(f"Unexpected OAuth error: {e}")
+            from authlib.integrations.starlette_client import OAuthError
+            
+            if isinstance(e, OAuthError):
+                logger.error(f"Google OAuth callback failed: {e}")
+            else:
+                logger.error(f"Unexpected OAuth error: {e}")
             return None
 
-# Global instance
-oauth_service = OAuthService()
\ No newline at end of file
+# Global instance (built on first use)
+oauth_service = registry.lazy("oauth_service", OAuthService)
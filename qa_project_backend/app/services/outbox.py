@@ -0,0 +1,351 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from uuid import uuid4
+import asyncio
+import json
+import logging
+from ..config import settings
+from .. import database, models
+from . import registry
+from .enrichment import enrichment_queue
+from .metrics import metrics
+from .slack_service import slack_service
+
+logger = logging.getLogger(__name__)
+
+class OutboxDispatcher:
+    """Delivers outbox_events rows to their Slack, CloudWatch and enrichment handlers.
+
+    Events are written in the same transaction as the question, answer or
+    star they describe, so a crash can delay a side effect but not lose it.
+    Dispatchers claim batches with a lease (SKIP LOCKED on PostgreSQL, one
+    UPDATE per batch on SQLite), run each event's handlers concurrently and
+    record every handler that finished, so a retried event only re-runs
+    the handlers that had not. Delivery is at-least-once. Session work runs
+    on the default executor.
+
+    Events waiting on Slack (coalescing windows, channel budgets) stay in
+    flight while newer ones are claimed, up to max_in_flight.
+    """
+
+    def __init__(self, batch_size: int, max_in_flight: int, max_attempts: int, poll_seconds: float, lease_seconds: int):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.handlers: Dict[str, Dict[str, Callable[[dict], Awaitable[None]]]] = {
+            "question.created": {
+                "slack": self._slack_question,
+                "cloudwatch": self._metric("QuestionsCreated"),
+                "enrichment": self._wake_enrichment
+            },
+            "answer.created": {
+                "slack": self._slack_answer,
+                "cloudwatch": self._metric("AnswersCreated"),
+                "enrichment": self._wake_enrichment
+            },
+            "answer.starred": {
+                "cloudwatch": self._metric("AnswersStarred")
+            }
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    # ----- Claiming -----
+
+    @staticmethod
+    def _runnable(now: datetime):
+        return or_(
+            and_(models.OutboxEvent.status == "pending", models.OutboxEvent.available_at <= now),
+            and_(models.OutboxEvent.status == "processing", models.OutboxEvent.locked_until < now)
+        )
+
+    def _claim(self, limit: int) -> List[models.OutboxEvent]:
+        """Lease up to limit runnable events to this dispatcher, oldest first"""
+        db = database.SessionLocal()
+        try:
+            now = datetime.utcnow()
+            token = uuid4().hex
+            oldest = select(models.OutboxEvent.id).where(self._runnable(now)).order_by(
+                models.OutboxEvent.id.asc()
+            ).limit(limit)
+
+            if db.bind.dialect.name == "postgresql":
+                # Concurrent dispatchers skip each other's rows instead of waiting on them
+                ids = db.execute(oldest.with_for_update(skip_locked=True)).scalars().all()
+                claimed = models.OutboxEvent.id.in_(ids)
+            else:
+                # SQLite has a single writer, so one UPDATE claims the whole batch atomically
+                claimed = and_(models.OutboxEvent.id.in_(oldest), self._runnable(now))
+
+            db.query(models.OutboxEvent).filter(claimed).update({
+                models.OutboxEvent.status: "processing",
+                models.OutboxEvent.claim_token: token,
+                models.OutboxEvent.locked_until: now + timedelta(seconds=self.lease_seconds),
+                models.OutboxEvent.attempts: models.OutboxEvent.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+
+            events = db.query(models.OutboxEvent).filter(models.OutboxEvent.claim_token == token).order_by(
+                models.OutboxEvent.id.asc()
+            ).all()
+            db.expunge_all()
+            return events
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Outbox claim failed: {e}")
+            return []
+        finally:
+            db.close()
+
+    def _update(self, event: models.OutboxEvent, values: dict) -> None:
+        """Write back progress, unless the lease was lost to another dispatcher"""
+        db = database.SessionLocal()
+        try:
+            db.query(models.OutboxEvent).filter(
+                models.OutboxEvent.id == event.id,
+                models.OutboxEvent.claim_token == event.claim_token
+            ).update(values, synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Outbox event {event.id} bookkeeping failed: {e}")
+        finally:
+            db.close()
+
+    # ----- Handlers -----
+
+    @staticmethod
+    def _load(payload: dict) -> Optional[tuple]:
+        """The question, its asker or answerer, and the answer (if any) named by an event"""
+        db = database.SessionLocal()
+        try:
+            question = db.query(models.Question).filter(models.Question.id == payload["question_id"]).first()
+            user = db.query(models.User).filter(models.User.id == payload["user_id"]).first()
+            answer = None
+            if "answer_id" in payload:
+                answer = db.query(models.Answer).filter(models.Answer.id == payload["answer_id"]).first()
+            if question is None or user is None or ("answer_id" in payload and answer is None):
+                return None
+            return (
+                {"id": question.id, "title": question.title, "content": question.content,
+                 "slack_notified": question.slack_notified},
+                {"first_name": user.first_name, "last_name": user.last_name, "username": user.username},
+                {"id": answer.id, "content": answer.content} if answer is not None else None
+            )
+        finally:
+            db.close()
+
+    async def _slack_question(self, payload: dict) -> None:
+        if not slack_service.client:
+            return
+        loaded = await database.in_thread(self._load, payload)
+        if loaded is None or loaded[0]["slack_notified"]:
+            return  # Deleted since, or announced by an earlier attempt
+        question, user, _ = loaded
+
+        if not await slack_service.notify_new_question(question, user, wait=True):
+            raise RuntimeError("Slack did not accept the question notification")
+        await database.in_thread(self._mark_slack_notified, question["id"])
+
+    @staticmethod
+    def _mark_slack_notified(question_id: int) -> None:
+        db = database.SessionLocal()
+        try:
+            db.query(models.Question).filter(models.Question.id == question_id).update({
+                models.Question.slack_notified: 1
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _slack_answer(self, payload: dict) -> None:
+        if not slack_service.client:
+            return
+        loaded = await database.in_thread(self._load, payload)
+        if loaded is None:
+            return
+        question, user, answer = loaded
+
+        if not await slack_service.notify_new_answer(question, answer, user, wait=True):
+            raise RuntimeError("Slack did not accept the answer notification")
+
+    @staticmethod
+    def _metric(metric_name: str) -> Callable[[dict], Awaitable[None]]:
+        async def count(payload: dict) -> None:
+            # The event is only acknowledged once CloudWatch accepted the flush carrying the count
+            if not await metrics.increment_confirmed(metric_name):
+                raise RuntimeError(f"CloudWatch did not accept {metric_name}")
+        return count
+
+    @staticmethod
+    async def _wake_enrichment(payload: dict) -> None:
+        # The enrichment jobs were committed with the event; start them without waiting for the next poll
+        enrichment_queue.notify()
+
+    # ----- Dispatching -----
+
+    async def _dispatch(self, event: models.OutboxEvent) -> None:
+        handlers = self.handlers.get(event.event_type)
+        if handlers is None:
+            logger.warning(f"No outbox handlers for {event.event_type} (event {event.id})")
+            await database.in_thread(self._update, event, {
+                models.OutboxEvent.status: "failed",
+                models.OutboxEvent.last_error: "unknown event type"
+            })
+            self.failed += 1
+            return
+
+        payload = json.loads(event.payload or "{}")
+        completed = [name for name in (event.completed_handlers or "").split(",") if name]
+        todo = [(name, handler) for name, handler in handlers.items() if name not in completed]
+        running = len(todo)
+        errors = []
+
+        async def run(name: str, handler: Callable[[dict], Awaitable[None]]) -> None:
+            nonlocal running
+            try:
+                await handler(payload)
+                completed.append(name)
+            except Exception as e:
+                logger.warning(f"Outbox {name} handler failed for {event.idempotency_key}: {e}")
+                errors.append(f"{name}: {e}")
+            running -= 1
+            if running and name in completed:
+                # Others are still waiting (typically on Slack): don't repeat this one after a crash
+                await database.in_thread(self._update, event, {models.OutboxEvent.completed_handlers: ",".join(completed)})
+
+        try:
+            # Handlers run side by side, so CloudWatch does not wait for a Slack digest
+            await asyncio.gather(*(run(name, handler) for name, handler in todo))
+        except asyncio.CancelledError:
+            # Shutting down: hand the event back instead of waiting out the lease. Inline, since
+            # awaiting the executor here could itself be cancelled and lose the hand-back
+            self._update(event, {
+                models.OutboxEvent.status: "pending",
+                models.OutboxEvent.completed_handlers: ",".join(completed),
+                models.OutboxEvent.locked_until: None,
+                models.OutboxEvent.attempts: models.OutboxEvent.attempts - 1
+            })
+            raise
+
+        now = datetime.utcnow()
+        values = {models.OutboxEvent.completed_handlers: ",".join(completed), models.OutboxEvent.locked_until: None}
+        if not errors:
+            values.update({
+                models.OutboxEvent.status: "done",
+                models.OutboxEvent.last_error: "",
+                models.OutboxEvent.processed_at: now
+            })
+            self.delivered += 1
+        elif event.attempts >= self.max_attempts:
+            values.update({
+                models.OutboxEvent.status: "failed",
+                models.OutboxEvent.last_error: "; ".join(errors)[:2000]
+            })
+            self.failed += 1
+        else:
+            values.update({
+                models.OutboxEvent.status: "pending",
+                models.OutboxEvent.last_error: "; ".join(errors)[:2000],
+                models.OutboxEvent.available_at: now + timedelta(seconds=min(3600, 5 * 2 ** event.attempts))
+            })
+            self.retried += 1
+        await database.in_thread(self._update, event, values)
+
+    async def run_once(self) -> int:
+        """Claim one batch and wait for it to be delivered; returns the number of events handled"""
+        events = await database.in_thread(self._claim, self.batch_size)
+        # Concurrently, so Slack can coalesce the batch into a few messages
+        await asyncio.gather(*(self._dispatch(event) for event in events))
+        return len(events)
+
+    async def run(self) -> None:
+        """Claim and dispatch until cancelled"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                room = min(self.batch_size, self.max_in_flight - len(self._in_flight))
+                events = await database.in_thread(self._claim, room) if room > 0 else []
+                for event in events:
+                    task = asyncio.create_task(self._dispatch(event))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+                if events and len(events) == room:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def notify(self) -> None:
+        """Wake the dispatcher after events were committed in this process (safe from any thread)"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self) -> None:
+        """Run the dispatcher in the background of the current event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            logger.info("Started outbox dispatcher")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Stop claiming, give in-flight events a moment to finish and hand the rest back"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not self._in_flight:
+            return
+
+        if registry.is_loaded("slack_service") and slack_service.coalescer:
+            slack_service.coalescer.flush_all()  # Don't hold events back for a window that will never end
+        _, pending = await asyncio.wait(self._in_flight, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        db = database.SessionLocal()
+        try:
+            counts = dict(db.query(models.OutboxEvent.status, func.count(models.OutboxEvent.id)).group_by(
+                models.OutboxEvent.status
+            ).all())
+            oldest = db.query(func.min(models.OutboxEvent.created_at)).filter(
+                models.OutboxEvent.status == "pending"
+            ).scalar()
+        finally:
+            db.close()
+        return {
+            "running": self._task is not None,
+            "in_flight": len(self._in_flight),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "events": counts,
+            "oldest_pending": oldest
+        }
+
+# Global instance
+outbox_dispatcher = OutboxDispatcher(
+    settings.OUTBOX_BATCH_SIZE,
+    settings.OUTBOX_MAX_IN_FLIGHT,
+    settings.OUTBOX_MAX_ATTEMPTS,
+    settings.OUTBOX_POLL_SECONDS,
+    settings.OUTBOX_LEASE_SECONDS
+)
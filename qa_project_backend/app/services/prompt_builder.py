@@ -0,0 +1,125 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import hashlib
+import re
+import threading
+
+class WordEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per word, space run or symbol run.
+
+    The vocabulary stops growing at max_pieces; later unseen pieces are spelled
+    out one token per character (ids below WORD_ID_BASE are code points), which
+    keeps memory bounded and only ever overcounts.
+    """
+    TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]+")
+    WORD_ID_BASE = 0x110000
+
+    def __init__(self, max_pieces: int = 100_000):
+        self.max_pieces = max_pieces
+        self._ids: Dict[str, int] = {}
+        self._pieces: List[str] = []
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        ids = []
+        with self._lock:
+            for piece in self.TOKEN_RE.findall(text):
+                token_id = self._ids.get(piece)
+                if token_id is None:
+                    if len(self._pieces) >= self.max_pieces:
+                        ids.extend(map(ord, piece))
+                        continue
+                    token_id = self._ids[piece] = self.WORD_ID_BASE + len(self._pieces)
+                    self._pieces.append(piece)
+                ids.append(token_id)
+        return ids
+
+    def decode(self, ids: List[int]) -> str:
+        return "".join(
+            self._pieces[token_id - self.WORD_ID_BASE] if token_id >= self.WORD_ID_BASE else chr(token_id)
+            for token_id in ids
+        )
+
+class PromptBuilder:
+    """Token-budgeted prompt assembly.
+
+    Each text is encoded at most once while it stays in the memo (keyed by
+    content hash), and truncation slices the encoded ids so a piece never
+    exceeds its share of the budget.
+    """
+
+    def __init__(self, encoding, memo_max_tokens: int):
+        self.encoding = encoding
+        self.memo_max_tokens = memo_max_tokens
+        self._memo: "OrderedDict[bytes, array]" = OrderedDict()
+        self._memo_tokens = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text: str) -> array:
+        """Token ids for text, memoized by content hash"""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            ids = self._memo.get(key)
+            if ids is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return ids
+
+        ids = array("I", self.encoding.encode(text))
+        with self._lock:
+            self.misses += 1
+            if len(ids) <= self.memo_max_tokens and key not in self._memo:
+                self._memo[key] = ids
+                self._memo_tokens += len(ids)
+                while self._memo_tokens > self.memo_max_tokens:
+                    _, evicted = self._memo.popitem(last=False)
+                    self._memo_tokens -= len(evicted)
+        return ids
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """Cut text to at most max_tokens at a token boundary; returns (text, tokens)"""
+        ids = self.encode(text)
+        if len(ids) <= max_tokens:
+            return text, len(ids)
+        if max_tokens <= 0:
+            return "", 0
+        # "..." is a single token, so the result stays within max_tokens
+        return self.encoding.decode(ids[:max_tokens - 1].tolist()) + "...", max_tokens
+
+    @staticmethod
+    def allocate(sizes: List[int], budget: int) -> List[int]:
+        """Split a token budget: pieces under their fair share keep everything, the rest share equally"""
+        allocation = [0] * len(sizes)
+        remaining = max(0, budget)
+        order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        for position, i in enumerate(order):
+            share = remaining // (len(sizes) - position)
+            allocation[i] = min(sizes[i], share)
+            remaining -= allocation[i]
+        return allocation
+
+    def fit(self, pieces: List[str], budget: int) -> Tuple[List[str], int]:
+        """Truncate pieces so together they fit budget tokens; returns (pieces, total tokens)"""
+        allocation = self.allocate([self.count(piece) for piece in pieces], budget)
+        fitted, total = [], 0
+        for piece, tokens in zip(pieces, allocation):
+            text, used = self.truncate(piece, tokens)
+            fitted.append(text)
+            total += used
+        return fitted, total
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "memo_entries": len(self._memo),
+            "memo_tokens": self._memo_tokens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
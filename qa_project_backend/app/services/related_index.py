@@ -0,0 +1,380 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import zlib
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from ..config import settings
+from .. import database, models
+from .tag_suggester import TagSuggester
+
+try:
+    import scipy.sparse as sparse
+except ImportError:  # Rebuilds fall back to per-question NumPy scoring
+    sparse = None
+
+logger = logging.getLogger(__name__)
+
+DIMS = 1 << 20  # Hashed feature space
+CONTENT_CHARS = 2000  # Only the start of the body is vectorized
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 3
+MAX_DF_SHARE = 0.1  # Terms in more questions than this carry no signal...
+MAX_DF_MIN_DOCS = 1000  # ...once there are enough questions to tell
+MIN_SCORE = 0.05
+BLOCK_ROWS = 1000  # Questions scored and written per transaction during a rebuild
+
+# Concurrent jobs may write the same pair, so rows are upserted rather than inserted (SQLite and PostgreSQL syntax)
+UPSERT_NEIGHBOR = text(
+    "INSERT INTO question_related (question_id, related_id, score) VALUES (:question_id, :related_id, :score) "
+    "ON CONFLICT (question_id, related_id) DO UPDATE SET score = excluded.score"
+)
+TRIM_NEIGHBORS = text(
+    "DELETE FROM question_related WHERE question_id = :question_id AND related_id NOT IN ("
+    "SELECT related_id FROM question_related WHERE question_id = :question_id "
+    "ORDER BY score DESC, related_id ASC LIMIT :top_k)"
+)
+
+class Snapshot:
+    """A built set of vectors, memory-mapped read-only.
+
+    Vectors are stored column-major (one posting list of (row, weight) per
+    hashed term) since scoring a question only walks the terms it contains.
+    Every worker maps the same files, so the page cache holds one copy.
+    """
+
+    def __init__(self, path: Path):
+        meta = json.loads((path / "meta.json").read_text())
+        self.path = path
+        self.docs = meta["docs"]
+        self.last_id = meta["last_id"]
+        self.built_at = meta["built_at"]
+        self.ids = np.load(path / "ids.npy", mmap_mode="r")
+        self.df = np.load(path / "df.npy", mmap_mode="r")
+        self.feature_ptr = np.load(path / "feature_ptr.npy", mmap_mode="r")
+        self.rows = np.load(path / "rows.npy", mmap_mode="r")
+        self.weights = np.load(path / "weights.npy", mmap_mode="r")
+
+    def row_of(self, question_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, question_id))
+        return row if row < len(self.ids) and self.ids[row] == question_id else None
+
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in (self.ids, self.df, self.feature_ptr, self.rows, self.weights)))
+
+class RelatedIndex:
+    """TF-IDF similarity over title, tags and content, feeding question_related.
+
+    A rebuild (build_related.py) vectorizes every question, writes the
+    vectors to a new versioned directory and recomputes all neighbor lists.
+    Between rebuilds, the "related" enrichment job scores a new or edited
+    question against the mapped vectors plus questions posted since the
+    build, stores its neighbors and offers it to theirs.
+    """
+
+    def __init__(self, directory: str, top_k: int, max_pending: int):
+        self.directory = Path(directory)
+        self.top_k = top_k
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self._version = ""
+
+        self.build_seconds = 0.0
+        self.updates = 0
+        self.update_seconds = 0.0
+
+    # ----- Vectors -----
+
+    @staticmethod
+    def _feature(term: str) -> int:
+        return zlib.crc32(term.encode("utf-8")) & (DIMS - 1)
+
+    def term_counts(self, title: str, content: str, tags: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed features and their log-scaled weighted term frequencies"""
+        counts: Dict[int, float] = {}
+        for term in TagSuggester.tokenize(title or ""):
+            feature = self._feature(term)
+            counts[feature] = counts.get(feature, 0) + TITLE_WEIGHT
+        for term in TagSuggester.tokenize((content or "")[:CONTENT_CHARS]):
+            feature = self._feature(term)
+            counts[feature] = counts.get(feature, 0) + 1
+        for tag in TagSuggester.parse_tags(tags):
+            feature = self._feature(f"tag:{tag}")
+            counts[feature] = counts.get(feature, 0) + TAG_WEIGHT
+
+        features = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        order = np.argsort(features)
+        return features[order], tf[order].astype(np.float32)
+
+    @staticmethod
+    def _idf(df: np.ndarray, docs: int) -> np.ndarray:
+        idf = (np.log((docs + 1) / (df + 1)) + 1).astype(np.float32)
+        if docs >= MAX_DF_MIN_DOCS:
+            idf[df > MAX_DF_SHARE * docs] = 0
+        return idf
+
+    def vector(self, title: str, content: str, tags: str, df: Optional[np.ndarray], docs: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Unit-length TF-IDF vector as sorted (features, weights)"""
+        features, tf = self.term_counts(title, content, tags)
+        idf = self._idf(np.asarray(df[features]) if df is not None else np.zeros(len(features)), docs)
+        weights = tf * idf
+        keep = weights > 0
+        features, weights = features[keep], weights[keep]
+        norm = float(np.sqrt(np.dot(weights, weights)))
+        return features, (weights / norm if norm else weights).astype(np.float32)
+
+    # ----- Snapshots -----
+
+    def snapshot(self) -> Optional[Snapshot]:
+        """The current vectors, remapped when a rebuild has published new ones"""
+        try:
+            version = (self.directory / "CURRENT").read_text().strip()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if version != self._version:
+                self._snapshot = Snapshot(self.directory / version)
+                self._version = version
+            return self._snapshot
+
+    def _publish(self, arrays: Dict[str, np.ndarray], meta: dict) -> None:
+        """Write a new version, point CURRENT at it, and drop all but the previous one"""
+        version = f"v{int(time.time() * 1000)}"
+        path = self.directory / version
+        path.mkdir(parents=True)
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+        (path / "meta.json").write_text(json.dumps(meta))
+
+        previous = self._version_on_disk()
+        tmp = self.directory / "CURRENT.tmp"
+        tmp.write_text(version)
+        os.replace(tmp, self.directory / "CURRENT")
+
+        # Workers may still have the previous version mapped; unlinking is safe either way
+        for old in self.directory.glob("v*"):
+            if old.name not in (version, previous):
+                shutil.rmtree(old, ignore_errors=True)
+
+    def _version_on_disk(self) -> str:
+        try:
+            return (self.directory / "CURRENT").read_text().strip()
+        except FileNotFoundError:
+            return ""
+
+    # ----- Scoring -----
+
+    @staticmethod
+    def _score_snapshot(snapshot: Snapshot, features: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine scores) of every snapshot question sharing a term"""
+        starts = np.asarray(snapshot.feature_ptr[features])
+        lengths = np.asarray(snapshot.feature_ptr[features + 1]) - starts
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Positions of all postings of the query's terms, without a Python loop
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        positions = np.arange(lengths.sum()) + offsets
+        rows = np.asarray(snapshot.rows[positions])
+        contributions = np.asarray(snapshot.weights[positions]) * np.repeat(weights, lengths)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        return unique_rows, np.bincount(inverse, weights=contributions).astype(np.float32)
+
+    def _top(self, ids: np.ndarray, scores: np.ndarray, exclude_id: int) -> List[Tuple[int, float]]:
+        keep = (scores >= MIN_SCORE) & (ids != exclude_id)
+        ids, scores = ids[keep], scores[keep]
+        if len(ids) > self.top_k:
+            top = np.argpartition(-scores, self.top_k)[:self.top_k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in order]
+
+    # ----- Neighbor table -----
+
+    @staticmethod
+    def _replace_neighbors(db, neighbors: Dict[int, List[Tuple[int, float]]]) -> None:
+        db.query(models.QuestionRelated).filter(
+            models.QuestionRelated.question_id.in_(list(neighbors))
+        ).delete(synchronize_session=False)
+        rows = [
+            {"question_id": question_id, "related_id": related_id, "score": score}
+            for question_id, related in neighbors.items() for related_id, score in related
+        ]
+        if rows:
+            db.execute(UPSERT_NEIGHBOR, rows)
+
+    def _offer(self, db, question_id: int, neighbors: List[Tuple[int, float]]) -> None:
+        """Add question_id to its neighbors' lists, keeping only each list's top_k.
+
+        Upsert-then-trim needs no read of the current list, so offers racing
+        on the same neighbor can't collide or overwrite each other's entries.
+        """
+        for related_id, score in neighbors:
+            db.execute(UPSERT_NEIGHBOR, {"question_id": related_id, "related_id": question_id, "score": score})
+            db.execute(TRIM_NEIGHBORS, {"question_id": related_id, "top_k": self.top_k})
+
+    # ----- Incremental updates -----
+
+    def update(self, question_id: int) -> int:
+        """Recompute one question's neighbors (the "related" enrichment job); returns how many were stored"""
+        start = time.perf_counter()
+        snapshot = self.snapshot()
+        df = snapshot.df if snapshot is not None else None
+        docs = snapshot.docs if snapshot is not None else 0
+        last_id = snapshot.last_id if snapshot is not None else 0
+
+        db = database.SessionLocal()
+        try:
+            question = db.query(models.Question.title, models.Question.content, models.Question.tags).filter(
+                models.Question.id == question_id
+            ).first()
+            if question is None:
+                return 0
+            features, weights = self.vector(question.title, question.content, question.tags, df, docs)
+
+            candidate_ids, candidate_scores = [], []
+            if snapshot is not None and len(features):
+                rows, scores = self._score_snapshot(snapshot, features, weights)
+                candidate_ids.append(np.asarray(snapshot.ids[rows]))
+                candidate_scores.append(scores)
+
+            # Questions posted since the snapshot was built
+            pending = db.query(
+                models.Question.id, models.Question.title, models.Question.content, models.Question.tags
+            ).filter(
+                models.Question.id > last_id,
+                models.Question.id != question_id
+            ).order_by(models.Question.id.desc()).limit(self.max_pending).all()
+            if pending:
+                query = dict(zip(features.tolist(), weights.tolist()))
+                candidate_ids.append(np.array([row.id for row in pending], dtype=np.int64))
+                candidate_scores.append(np.array([
+                    sum(query.get(f, 0.0) * w for f, w in zip(*self.vector(row.title, row.content, row.tags, df, docs)))
+                    for row in pending
+                ], dtype=np.float32))
+
+            neighbors = []
+            if candidate_ids:
+                neighbors = self._top(np.concatenate(candidate_ids), np.concatenate(candidate_scores), question_id)
+
+            self._replace_neighbors(db, {question_id: neighbors})
+            self._offer(db, question_id, neighbors)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.updates += 1
+        self.update_seconds += time.perf_counter() - start
+        return len(neighbors)
+
+    # ----- Rebuilds -----
+
+    def rebuild(self) -> int:
+        """Vectorize every question, publish the vectors and rewrite all neighbor lists"""
+        start = time.perf_counter()
+        db = database.SessionLocal()
+        try:
+            id_chunks, feature_chunks, tf_chunks, lengths = [], [], [], []
+            rows = db.query(
+                models.Question.id, models.Question.title, models.Question.content, models.Question.tags
+            ).order_by(models.Question.id.asc()).yield_per(1000)
+            for question_id, title, content, tags in rows:
+                features, tf = self.term_counts(title, content, tags)
+                id_chunks.append(question_id)
+                feature_chunks.append(features)
+                tf_chunks.append(tf)
+                lengths.append(len(features))
+            docs = len(id_chunks)
+            if docs == 0:
+                return 0
+
+            ids = np.array(id_chunks, dtype=np.int64)
+            lengths = np.array(lengths, dtype=np.int64)
+            features = np.concatenate(feature_chunks)
+            tf = np.concatenate(tf_chunks)
+            del feature_chunks, tf_chunks
+            row_of_entry = np.repeat(np.arange(docs, dtype=np.int32), lengths)
+
+            df = np.bincount(features, minlength=DIMS).astype(np.float32)
+            weights = tf * self._idf(df, docs)[features]
+            norms = np.sqrt(np.bincount(row_of_entry, weights=weights.astype(np.float64) ** 2, minlength=docs))
+            weights = (weights / np.maximum(norms[row_of_entry], 1e-12)).astype(np.float32)
+            keep = weights > 0
+            features, weights, row_of_entry = features[keep], weights[keep], row_of_entry[keep]
+
+            # Column-major copy for scoring and for the published snapshot
+            order = np.argsort(features, kind="stable")
+            feature_ptr = np.zeros(DIMS + 1, dtype=np.int64)
+            np.cumsum(np.bincount(features, minlength=DIMS), out=feature_ptr[1:])
+            rows_by_feature, weights_by_feature = row_of_entry[order], weights[order]
+
+            vectorized = time.perf_counter() - start
+            self._publish({
+                "ids": ids,
+                "df": df,
+                "feature_ptr": feature_ptr,
+                "rows": rows_by_feature,
+                "weights": weights_by_feature
+            }, {"docs": docs, "last_id": int(ids[-1]), "built_at": time.time()})
+            snapshot = self.snapshot()
+
+            row_ptr = np.zeros(docs + 1, dtype=np.int64)
+            np.cumsum(np.bincount(row_of_entry, minlength=docs), out=row_ptr[1:])
+            if sparse is not None:
+                matrix = sparse.csr_matrix((weights, features, row_ptr), shape=(docs, DIMS))
+                transposed = sparse.csr_matrix((snapshot.weights, snapshot.rows, snapshot.feature_ptr), shape=(DIMS, docs))
+
+            for block_start in range(0, docs, BLOCK_ROWS):
+                block_end = min(docs, block_start + BLOCK_ROWS)
+                neighbors = {}
+                if sparse is not None:
+                    scores = (matrix[block_start:block_end] @ transposed).tocsr()
+                    for i in range(block_end - block_start):
+                        a, b = scores.indptr[i], scores.indptr[i + 1]
+                        neighbors[int(ids[block_start + i])] = self._top(ids[scores.indices[a:b]], scores.data[a:b], int(ids[block_start + i]))
+                else:
+                    for row in range(block_start, block_end):
+                        a, b = row_ptr[row], row_ptr[row + 1]
+                        candidates, scores = self._score_snapshot(snapshot, features[a:b], weights[a:b])
+                        neighbors[int(ids[row])] = self._top(ids[candidates], scores, int(ids[row]))
+                self._replace_neighbors(db, neighbors)
+                db.commit()
+
+            self.build_seconds = time.perf_counter() - start
+            logger.info(
+                f"Related questions rebuilt for {docs} questions in {self.build_seconds:.1f}s "
+                f"({vectorized:.1f}s vectorizing, {'scipy' if sparse is not None else 'numpy'} scoring)"
+            )
+            return docs
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot()
+        return {
+            "snapshot_questions": snapshot.docs if snapshot is not None else 0,
+            "snapshot_last_id": snapshot.last_id if snapshot is not None else 0,
+            "snapshot_bytes": snapshot.nbytes() if snapshot is not None else 0,
+            "snapshot_age_seconds": round(time.time() - snapshot.built_at) if snapshot is not None else None,
+            "updates": self.updates,
+            "avg_update_ms": round(self.update_seconds / self.updates * 1000, 3) if self.updates else 0.0,
+            "top_k": self.top_k,
+            "scipy": sparse is not None
+        }
+
+# Global instance
+related_index = RelatedIndex(settings.RELATED_INDEX_DIR, settings.RELATED_TOP_K, settings.RELATED_MAX_PENDING)
@@ -0,0 +1,157 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class ChannelState:
+    """Pending events, rate budget and recent arrivals of one channel"""
+
+    def __init__(self, budget_per_minute: int, burst: int, now: float):
+        self.rate = budget_per_minute / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = now
+        self.pending: List[Tuple[dict, asyncio.Future]] = []
+        self.arrivals: Deque[float] = deque()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def take(self, now: float) -> bool:
+        """Spend one message of the channel's budget, if there is one"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_seconds(self, now: float) -> float:
+        """Time until the budget allows another message"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 or self.rate <= 0 else (1 - self.tokens) / self.rate
+
+    def events_last_minute(self, now: float) -> int:
+        while self.arrivals and self.arrivals[0] < now - 60:
+            self.arrivals.popleft()
+        return len(self.arrivals)
+
+class SlackCoalescer:
+    """Groups notification events per channel so bursts become a few messages.
+
+    A quiet channel gets each event as its own message straight away. Once
+    events arrive faster than that (or the channel's message budget is
+    spent) they are buffered and sent together at the end of a short
+    window, e.g. "12 new answers on 4 questions". While a channel stays
+    busier than `digest_events_per_minute`, buffered events go out as one
+    digest every `digest_seconds` instead.
+
+    Every event gets a future that resolves once the message carrying it
+    has been delivered (or given up on), so callers that need
+    at-least-once delivery can wait for it.
+    """
+
+    def __init__(self, send: Callable[[str, List[dict], bool], Optional[asyncio.Future]], window_seconds: float,
+                 budget_per_minute: int, burst: int, digest_events_per_minute: int, digest_seconds: float):
+        self.send = send  # (channel, events, digest) -> delivery future, None if not queued
+        self.window_seconds = window_seconds
+        self.budget_per_minute = budget_per_minute
+        self.burst = burst
+        self.digest_events_per_minute = digest_events_per_minute
+        self.digest_seconds = digest_seconds
+        self._channels: Dict[str, ChannelState] = {}
+
+        self.events = 0
+        self.messages = 0
+        self.grouped = 0
+        self.digests = 0
+
+    def _state(self, channel: str, now: float) -> ChannelState:
+        state = self._channels.get(channel)
+        if state is None:
+            state = self._channels[channel] = ChannelState(self.budget_per_minute, self.burst, now)
+        return state
+
+    def _busy(self, state: ChannelState, now: float) -> bool:
+        return state.events_last_minute(now) > self.digest_events_per_minute
+
+    def add(self, channel: str, event: dict) -> asyncio.Future:
+        """Send the event now or buffer it; the future resolves to whether it was delivered"""
+        now = time.monotonic()
+        state = self._state(channel, now)
+        state.arrivals.append(now)
+        self.events += 1
+        future = asyncio.get_running_loop().create_future()
+
+        if not state.pending and state.timer is None and not self._busy(state, now) and state.take(now):
+            self._send(channel, [(event, future)], digest=False)
+            return future
+
+        state.pending.append((event, future))
+        if state.timer is None:
+            delay = self.digest_seconds if self._busy(state, now) else self.window_seconds
+            self._schedule(channel, state, max(delay, state.wait_seconds(now)))
+        return future
+
+    def _schedule(self, channel: str, state: ChannelState, delay: float) -> None:
+        state.timer = asyncio.get_running_loop().call_later(delay, self.flush, channel)
+
+    def flush(self, channel: str, force: bool = False) -> None:
+        """Send the channel's buffered events as one message, when its budget allows (or if forced)"""
+        state = self._channels.get(channel)
+        if state is None:
+            return
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        if not state.pending:
+            return
+
+        now = time.monotonic()
+        if not state.take(now) and not force:
+            self._schedule(channel, state, state.wait_seconds(now))
+            return
+        entries, state.pending = state.pending, []
+        self._send(channel, entries, self._busy(state, now))
+
+    def flush_all(self) -> None:
+        """Send everything buffered regardless of budgets (at shutdown)"""
+        for channel in list(self._channels):
+            self.flush(channel, force=True)
+
+    def _send(self, channel: str, entries: List[Tuple[dict, asyncio.Future]], digest: bool) -> None:
+        self.messages += 1
+        if len(entries) > 1:
+            self.grouped += 1
+            if digest:
+                self.digests += 1
+
+        futures = [future for _, future in entries]
+        def resolve(delivered: bool) -> None:
+            for future in futures:
+                if not future.done():
+                    future.set_result(delivered)
+
+        delivery = self.send(channel, [event for event, _ in entries], digest)
+        if delivery is None:
+            resolve(False)
+        else:
+            delivery.add_done_callback(lambda done: resolve(bool(done.result())))
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "events": self.events,
+            "messages": self.messages,
+            "messages_saved": self.events - self.messages - sum(len(s.pending) for s in self._channels.values()),
+            "grouped_messages": self.grouped,
+            "digests": self.digests,
+            "pending_events": sum(len(state.pending) for state in self._channels.values()),
+            "digest_channels": [channel for channel, state in self._channels.items() if self._busy(state, now)],
+            "window_seconds": self.window_seconds,
+            "budget_per_minute": self.budget_per_minute
+        }
@@ -1,162 +1,371 @@
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
-from typing import Dict, Optional
-import json
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import logging
+import time
 from ..config import settings
+from . import registry
+from .slack_coalescer import SlackCoalescer
 
 logger = logging.getLogger(__name__)
 
+class SlackOutbox:
+    """Bounded in-process queue of Slack messages, delivered by one worker task.
+    
+    Enqueueing never waits on Slack, so request latency does not depend on
+    it; when the queue is full the message is dropped and counted. The
+    worker posts in order, waits out Retry-After when Slack answers
+    `ratelimited`, and retries connection errors with backoff.
+    """
+    
+    def __init__(self, client, capacity: int, max_attempts: int, transient_errors: tuple):
+        self.client = client
+        self.capacity = capacity
+        self.max_attempts = max_attempts
+        self.transient_errors = transient_errors
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.delivery_seconds = 0.0  # Enqueue to accepted by Slack, summed over sent messages
+    
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (e.g. in scripts): queued items of the old loop are gone
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.capacity)
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+    
+    def enqueue(self, channel: str, message: str, blocks: Optional[list] = None) -> asyncio.Future:
+        """Queue a message; the future resolves to whether Slack accepted it (False if dropped)"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((channel, message, blocks, future, time.monotonic()))
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Slack outbox full ({self.capacity}), dropped message to {channel}")
+            future.set_result(False)
+        return future
+    
+    async def _worker(self) -> None:
+        while True:
+            channel, message, blocks, future, queued_at = await self._queue.get()
+            ok = False
+            try:
+                ok = await self._deliver(channel, message, blocks)
+            except asyncio.CancelledError:
+                # Stopped mid-delivery
+                self._queue.task_done()
+                self.dropped += 1
+                if not future.done():
+                    future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"Slack delivery to {channel} failed: {e}")
+            
+            self._queue.task_done()
+            if ok:
+                self.sent += 1
+                self.delivery_seconds += time.monotonic() - queued_at
+            else:
+                self.failed += 1
+            if not future.done():
+                future.set_result(ok)
+    
+    async def _deliver(self, channel: str, message: str, blocks: Optional[list]) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = await self.client.chat_postMessage(channel=channel, text=message, blocks=blocks)
+                return bool(response["ok"])
+            except SlackApiError as e:
+                if e.response.status_code != 429 and e.response.get("error") != "ratelimited":
+                    logger.error(f"Slack notification failed: {e}")
+                    return False
+                self.rate_limited += 1
+                headers = e.response.headers or {}
+                delay = float(headers.get("Retry-After") or headers.get("retry-after") or 1)
+            except self.transient_errors as e:
+                logger.warning(f"Slack request failed (attempt {attempt}/{self.max_attempts}): {e}")
+                delay = min(30.0, 2.0 ** attempt)
+            if attempt < self.max_attempts:
+                self.retries += 1
+                await asyncio.sleep(delay)
+        return False
+    
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Give queued messages a moment to go out, then stop the worker"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} queued Slack messages at shutdown")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        while not self._queue.empty():
+            *_, future, _ = self._queue.get_nowait()
+            self.dropped += 1
+            if not future.done():
+                future.set_result(False)
+    
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "avg_delivery_ms": round(self.delivery_seconds / self.sent * 1000, 1) if self.sent else 0.0
+        }
+
+APP_URL = "http://localhost:5173"
+MAX_GROUPED_LINES = 10
+
+def _section(text: str) -> dict:
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+def _context(text: str) -> dict:
+    return {"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}
+
+def _button(text: str, url: str) -> dict:
+    return {
+        "type": "actions",
+        "elements": [
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": text
+                },
+                "url": url
+            }
+        ]
+    }
+
+def _excerpt(text: str, limit: int = 200) -> str:
+    return f"{text[:limit]}{'...' if len(text) > limit else ''}"
+
+def _plural(count: int, noun: str) -> str:
+    return f"{count} {noun}{'' if count == 1 else 's'}"
+
+def question_blocks(question: Dict, user: Dict) -> List[dict]:
+    return [
+        _section(f"🆕 *New Question Posted*\n\n*{question['title']}*\n\n{_excerpt(question['content'])}"),
+        _context(f"Asked by {user['first_name']} {user['last_name']} (@{user['username']})"),
+        _button("View Question", f"{APP_URL}/question/{question['id']}")
+    ]
+
+def answer_blocks(question: Dict, answer: Dict, user: Dict) -> List[dict]:
+    return [
+        _section(f"💬 *New Answer Posted*\n\nFor question: *{question['title']}*\n\n{_excerpt(answer['content'])}"),
+        _context(f"Answered by {user['first_name']} {user['last_name']} (@{user['username']})"),
+        _button("View Answer", f"{APP_URL}/question/{question['id']}")
+    ]
+
+def grouped_blocks(events: List[dict], digest: bool) -> Tuple[str, List[dict]]:
+    """One message for many question/answer events, e.g. "12 new answers on 4 questions" """
+    new_questions = [event["question"] for event in events if event["type"] == "question"]
+    answers = Counter(event["question"]["id"] for event in events if event["type"] == "answer")
+    titles = {event["question"]["id"]: event["question"]["title"] for event in events}
+    
+    parts = []
+    if answers:
+        parts.append(f"{_plural(sum(answers.values()), 'new answer')} on {_plural(len(answers), 'question')}")
+    if new_questions:
+        parts.append(_plural(len(new_questions), "new question"))
+    summary = " and ".join(parts)
+    
+    lines = [f"🆕 <{APP_URL}/question/{question['id']}|{question['title']}>" for question in new_questions]
+    lines += [
+        f"💬 <{APP_URL}/question/{question_id}|{titles[question_id]}> — {_plural(count, 'answer')}"
+        for question_id, count in answers.most_common()
+    ]
+    if len(lines) > MAX_GROUPED_LINES:
+        lines = lines[:MAX_GROUPED_LINES] + [f"…and {len(lines) - MAX_GROUPED_LINES} more"]
+    
+    people = len({event["user"]["username"] for event in events})
+    who = "1 person" if people == 1 else f"{people} people"
+    span = max(event["at"] for event in events) - min(event["at"] for event in events)
+    heading = "📬 *Activity Digest*" if digest else "🔔 *Recent Activity*"
+    blocks = [
+        _section(f"{heading}\n\n*{summary}*"),
+        _section("\n".join(lines)),
+        _context(f"From {who} over the last {max(1, round(span / 60))} min"),
+        _button("View Questions", f"{APP_URL}/")
+    ]
+    return f"{'Digest: ' if digest else ''}{summary}", blocks
+
+def summary_blocks(stats: Dict) -> List[dict]:
+    return [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": "📊 Daily Q&A Platform Summary"
+            }
+        },
+        {
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*New Questions:*\n{stats.get('new_questions', 0)}"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*New Answers:*\n{stats.get('new_answers', 0)}"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Active Users:*\n{stats.get('active_users', 0)}"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Total Views:*\n{stats.get('total_views', 0)}"
+                }
+            ]
+        }
+    ]
+
 class SlackService:
     def __init__(self):
         self.client = None
+        self.outbox = None
+        self.coalescer = None
         if settings.SLACK_BOT_TOKEN:
-            self.client = WebClient(token=settings.SLACK_BOT_TOKEN)
+            # aiohttp is slow to import, so it loads with the service, not the app
+            import aiohttp
+            from slack_sdk.web.async_client import AsyncWebClient
+            
+            self.client = AsyncWebClient(
+                token=settings.SLACK_BOT_TOKEN,
+                base_url=settings.SLACK_API_URL,
+                timeout=settings.SLACK_TIMEOUT_SECONDS
+            )
+            self.outbox = SlackOutbox(
+                self.client,
+                settings.SLACK_OUTBOX_CAPACITY,
+                settings.SLACK_MAX_ATTEMPTS,
+                (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+            )
+            self.coalescer = SlackCoalescer(
+                self._post_events,
+                window_seconds=settings.SLACK_COALESCE_WINDOW_SECONDS,
+                budget_per_minute=settings.SLACK_CHANNEL_MESSAGES_PER_MINUTE,
+                burst=settings.SLACK_CHANNEL_BURST,
+                digest_events_per_minute=settings.SLACK_DIGEST_EVENTS_PER_MINUTE,
+                digest_seconds=settings.SLACK_DIGEST_SECONDS
+            )
     
-    async def send_notification(self, channel: str, message: str, blocks: Optional[list] = None) -> bool:
-        """Send a notification to Slack channel"""
-        if not self.client:
-            logger.warning("Slack client not configured")
-            return False
+    def enqueue(self, channel: str, message: str, blocks: Optional[list] = None) -> Optional[asyncio.Future]:
+        """Queue a message for background delivery; None if Slack is not configured"""
+        if not self.outbox:
+            return None
+        return self.outbox.enqueue(channel, message, blocks)
+    
+    def _post(self, channel: str, message: str, blocks: Optional[list] = None) -> bool:
+        """Queue without waiting; True if the outbox accepted the message"""
+        future = self.enqueue(channel, message, blocks)
+        return future is not None and not future.done()
+    
+    def _post_events(self, channel: str, events: List[dict], digest: bool) -> Optional[asyncio.Future]:
+        """Render coalesced events as a single notification, or one grouped message"""
+        if len(events) > 1:
+            message, blocks = grouped_blocks(events, digest)
+            return self.enqueue(channel, message, blocks)
         
-        try:
-            response = self.client.chat_postMessage(
+        event = events[0]
+        if event["type"] == "question":
+            return self.enqueue(
                 channel=channel,
-                text=message,
-                blocks=blocks
+                message=f"New question: {event['question']['title']}",
+                blocks=question_blocks(event["question"], event["user"])
             )
-            return response["ok"]
-        except SlackApiError as e:
-            logger.error(f"Slack notification failed: {e}")
+        return self.enqueue(
+            channel=channel,
+            message=f"New answer for: {event['question']['title']}",
+            blocks=answer_blocks(event["question"], event["answer"], event["user"])
+        )
+    
+    async def _notify(self, event: dict, wait: bool) -> bool:
+        future = self.coalescer.add("#qa-platform", event)
+        if wait:
+            return await future
+        return not future.done() or future.result()
+    
+    async def send_notification(self, channel: str, message: str, blocks: Optional[list] = None) -> bool:
+        """Send a notification to Slack channel and wait for delivery"""
+        future = self.enqueue(channel, message, blocks)
+        if future is None:
+            logger.warning("Slack client not configured")
             return False
+        return await future
     
-    async def notify_new_question(self, question: Dict, user: Dict) -> bool:
-        """Notify about new question posted"""
+    async def notify_new_question(self, question: Dict, user: Dict, wait: bool = False) -> bool:
+        """Notify about new question posted (coalesced with other activity).
+        
+        Returns once queued, or with wait=True once Slack accepted the message.
+        """
         if not self.client:
             return False
         
-        blocks = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"🆕 *New Question Posted*\n\n*{question['title']}*\n\n{question['content'][:200]}{'...' if len(question['content']) > 200 else ''}"
-                }
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"Asked by {user['first_name']} {user['last_name']} (@{user['username']})"
-                    }
-                ]
-            },
-            {
-                "type": "actions",
-                "elements": [
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "View Question"
-                        },
-                        "url": f"http://localhost:5173/question/{question['id']}"
-                    }
-                ]
-            }
-        ]
-        
-        return await self.send_notification(
-            channel="#qa-platform",
-            message=f"New question: {question['title']}",
-            blocks=blocks
-        )
+        return await self._notify({
+            "type": "question",
+            "question": question,
+            "user": user,
+            "at": time.time()
+        }, wait)
     
-    async def notify_new_answer(self, question: Dict, answer: Dict, user: Dict) -> bool:
-        """Notify about new answer posted"""
+    async def notify_new_answer(self, question: Dict, answer: Dict, user: Dict, wait: bool = False) -> bool:
+        """Notify about new answer posted (coalesced with other activity; see notify_new_question)"""
         if not self.client:
             return False
         
-        blocks = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"💬 *New Answer Posted*\n\nFor question: *{question['title']}*\n\n{answer['content'][:200]}{'...' if len(answer['content']) > 200 else ''}"
-                }
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"Answered by {user['first_name']} {user['last_name']} (@{user['username']})"
-                    }
-                ]
-            },
-            {
-                "type": "actions",
-                "elements": [
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "View Answer"
-                        },
-                        "url": f"http://localhost:5173/question/{question['id']}"
-                    }
-                ]
-            }
-        ]
-        
-        return await self.send_notification(
-            channel="#qa-platform",
-            message=f"New answer for: {question['title']}",
-            blocks=blocks
-        )
+        return await self._notify({
+            "type": "answer",
+            "question": question,
+            "answer": answer,
+            "user": user,
+            "at": time.time()
+        }, wait)
     
     async def send_daily_summary(self, stats: Dict) -> bool:
         """Send daily platform summary"""
         if not self.client:
             return False
         
-        blocks = [
-            {
-                "type": "header",
-                "text": {
-                    "type": "plain_text",
-                    "text": "📊 Daily Q&A Platform Summary"
-                }
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*New Questions:*\n{stats.get('new_questions', 0)}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*New Answers:*\n{stats.get('new_answers', 0)}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Active Users:*\n{stats.get('active_users', 0)}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Total Views:*\n{stats.get('total_views', 0)}"
-                    }
-                ]
-            }
-        ]
-        
-        return await self.send_notification(
+        return self._post(
             channel="#qa-platform-stats",
             message="Daily platform summary",
-            blocks=blocks
+            blocks=summary_blocks(stats)
         )
+    
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self.coalescer:
+            self.coalescer.flush_all()
+        if self.outbox:
+            await self.outbox.stop(timeout)
+    
+    def stats(self) -> dict:
+        if not self.client:
+            return {"configured": False}
+        return {"configured": True, **self.outbox.stats(), "coalescing": self.coalescer.stats()}
 
-# Global instance
-slack_service = SlackService()
\ No newline at end of file
+# Global instance (built on first use)
+slack_service = registry.lazy("slack_service", SlackService)
@@ -0,0 +1,71 @@
+from typing import Callable, Optional, Tuple
+from .. import crud, database, models
+from .ai_service import ai_service, SUMMARY_PLACEHOLDERS
+from .inflight import inflight
+
+def _current_summary(question_id: int, fingerprint: str) -> Optional[str]:
+    """The stored summary if it was built from these inputs"""
+    db = database.SessionLocal()
+    try:
+        row = db.query(models.Question.ai_summary, models.Question.ai_summary_fingerprint).filter(
+            models.Question.id == question_id
+        ).first()
+        if row and row[0] and row[1] == fingerprint:
+            return row[0]
+        return None
+    finally:
+        db.close()
+
+def _store_summary(question_id: int, summary: str, fingerprint: str) -> None:
+    db = database.SessionLocal()
+    try:
+        db.query(models.Question).filter(models.Question.id == question_id).update({
+            models.Question.ai_summary: summary,
+            models.Question.ai_summary_fingerprint: fingerprint
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+async def generate_summary(question_id: int, force: bool = False, priority: str = "interactive",
+                           on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], bool]:
+    """Summarize a question and store the result; returns (summary, regenerated).
+
+    Concurrent calls for the same question, from any endpoint or worker,
+    share one generation. With on_chunk the summary is streamed and errors
+    propagate; otherwise failures come back as SUMMARY_FAILED_MESSAGE.
+    Returns (None, False) if the question does not exist.
+    """
+    db = database.SessionLocal()
+    try:
+        question = crud.get_question(db, question_id)
+        if question is None:
+            return None, False
+        answers = crud.get_summary_answers(db, question_id)
+        fingerprint = crud.summary_fingerprint(question, answers)
+        if not force and question.ai_summary and question.ai_summary_fingerprint == fingerprint:
+            return question.ai_summary, False
+        title, content = question.title, question.content
+        answers_data = [{'content': answer.content} for answer in answers]
+    finally:
+        db.close()
+
+    async def generate() -> str:
+        if on_chunk is None:
+            summary = await ai_service.summarize_question(title, content, answers_data, priority=priority)
+        else:
+            parts = []
+            async for chunk in ai_service.stream_summary(title, content, answers_data, priority=priority):
+                parts.append(chunk)
+                on_chunk(chunk)
+            summary = "".join(parts).strip()
+        # A failure must not replace the summary already stored; the caller still sees the placeholder
+        if summary not in SUMMARY_PLACEHOLDERS:
+            _store_summary(question_id, summary, fingerprint)
+        return summary
+
+    summary = await inflight.run(
+        "summarize", question_id, generate,
+        peek=lambda: _current_summary(question_id, fingerprint)
+    )
+    return summary, True
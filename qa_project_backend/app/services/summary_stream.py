@@ -0,0 +1,127 @@
+from typing import AsyncIterator, Dict, List, Optional, Set
+import asyncio
+import logging
+from .summaries import generate_summary
+
+logger = logging.getLogger(__name__)
+
+class SummaryStream:
+    """One in-flight summary generation that any number of viewers can follow.
+
+    Pieces are kept as they arrive, so a viewer who joins late replays what
+    was already produced and then waits for the rest.
+    """
+
+    def __init__(self, question_id: int):
+        self.question_id = question_id
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[str] = None
+        self.regenerated = True
+        self.viewers = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks).strip()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Every piece from the start, then live ones until the generation ends"""
+        position = 0
+        while True:
+            changed = self._changed
+            if position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+                continue
+            if self.done:
+                return
+            await changed.wait()
+
+class SummaryStreamHub:
+    """Runs at most one streamed summary per question in this process.
+
+    The generation runs as its own task, so it completes (and the summary is
+    persisted and cached) even if every viewer disconnects early. It goes
+    through generate_summary, so blocking requests for the same question
+    wait for this stream rather than starting their own.
+    """
+
+    def __init__(self):
+        self._streams: Dict[int, SummaryStream] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.started = 0
+        self.joined = 0
+        self.fresh = 0
+        self.failed = 0
+
+    def open(self, question_id: int, force: bool = False) -> SummaryStream:
+        """Attach to the question's in-flight summary, starting one if there is none"""
+        stream = self._streams.get(question_id)
+        if stream is not None and not stream.done:
+            self.joined += 1
+        else:
+            stream = self._streams[question_id] = SummaryStream(question_id)
+            self.started += 1
+            task = asyncio.create_task(self._generate(stream, force))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        stream.viewers += 1
+        return stream
+
+    async def _generate(self, stream: SummaryStream, force: bool) -> None:
+        question_id = stream.question_id
+        try:
+            summary, regenerated = await generate_summary(question_id, force=force, on_chunk=stream.push)
+            if summary is None:
+                stream.finish(error="Question not found")
+                return
+            if not stream.chunks:
+                # Stored summary was fresh, or another request was already generating it
+                stream.push(summary)
+            if not regenerated:
+                self.fresh += 1
+            stream.regenerated = regenerated
+            stream.finish()
+        except asyncio.CancelledError:
+            stream.finish(error="Summary generation was cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Streamed summary for question {question_id} failed: {e}")
+            self.failed += 1
+            stream.finish(error="Failed to generate summary")
+        finally:
+            if self._streams.get(question_id) is stream:
+                del self._streams[question_id]
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._streams),
+            "viewers": sum(stream.viewers for stream in self._streams.values()),
+            "started": self.started,
+            "joined": self.joined,
+            "fresh": self.fresh,
+            "failed": self.failed
+        }
+
+# Global instance
+summary_stream_hub = SummaryStreamHub()
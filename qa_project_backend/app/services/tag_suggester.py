@@ -0,0 +1,306 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+import numpy as np
+from ..config import settings
+from .. import database, models
+
+logger = logging.getLogger(__name__)
+
+TERM_RE = re.compile(r"[a-z][a-z0-9+#.\-]*[a-z0-9+#]")
+STOP_WORDS = {
+    "the", "and", "for", "with", "this", "that", "from", "have", "has", "are", "was", "were", "but",
+    "not", "you", "your", "can", "how", "what", "why", "when", "which", "who", "does", "did", "use",
+    "using", "get", "any", "all", "there", "their", "into", "out", "about", "would", "should", "could",
+    "is", "in", "it", "of", "to", "on", "or", "an", "as", "be", "by", "if", "at", "do", "so", "my", "me",
+}
+CONTENT_CHARS = 1000  # Only the start of the body feeds the model
+COMPACT_PAIRS = 200_000  # Fold pending counts into the arrays past this many (term, tag) pairs
+
+class TagSuggester:
+    """In-process tag model trained on existing question tags.
+
+    Keeps, for every term, how many tagged questions contain it (df) and how
+    often it appears alongside each tag, as CSR arrays (indptr/indices/data)
+    plus a small dict of counts added since the last compaction. A query
+    scores tags by the IDF-weighted average of P(tag | term) over its terms;
+    the top score doubles as the confidence.
+    """
+
+    def __init__(self, min_confidence: float, refresh_seconds: int):
+        self.min_confidence = min_confidence
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self._terms: Dict[str, int] = {}
+        self._tags: Dict[str, int] = {}
+        self._tag_names: List[str] = []
+        self._sorted_tags: List[Tuple[str, int]] = []  # For prefix lookups
+        self._docs = 0
+        self.last_id = 0
+        self._observed: Set[int] = set()
+
+        # Compacted counts
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        self._df = np.zeros(0, dtype=np.float32)
+        self._tag_counts = np.zeros(0, dtype=np.float32)
+
+        # Counts added since the last compaction
+        self._delta_rows: Dict[int, Dict[int, int]] = {}
+        self._delta_df: Dict[int, int] = {}
+        self._delta_tag_counts: Dict[int, int] = {}
+        self._delta_pairs = 0
+
+        self.build_seconds = 0.0
+        self.last_refresh_seconds = 0.0
+        self.queries = 0
+        self.confident = 0
+        self.query_seconds = 0.0
+
+    # ----- Training -----
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [term for term in TERM_RE.findall(text.lower()) if term not in STOP_WORDS]
+
+    @staticmethod
+    def parse_tags(tags: str) -> List[str]:
+        return list(dict.fromkeys(tag.strip().lower() for tag in (tags or "").split(",") if tag.strip()))
+
+    def _add(self, title: str, content: str, tags: str) -> None:
+        tag_names = self.parse_tags(tags)
+        if not tag_names:
+            return
+        terms = set(self.tokenize(title)) | set(self.tokenize((content or "")[:CONTENT_CHARS]))
+
+        with self._lock:
+            tag_ids = []
+            for name in tag_names:
+                tag_id = self._tags.get(name)
+                if tag_id is None:
+                    tag_id = self._tags[name] = len(self._tag_names)
+                    self._tag_names.append(name)
+                    insort(self._sorted_tags, (name, tag_id))
+                tag_ids.append(tag_id)
+                self._delta_tag_counts[tag_id] = self._delta_tag_counts.get(tag_id, 0) + 1
+
+            for term in terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = self._terms[term] = len(self._terms)
+                self._delta_df[term_id] = self._delta_df.get(term_id, 0) + 1
+                row = self._delta_rows.setdefault(term_id, {})
+                for tag_id in tag_ids:
+                    if tag_id not in row:
+                        self._delta_pairs += 1
+                    row[tag_id] = row.get(tag_id, 0) + 1
+            self._docs += 1
+
+    def _compact(self) -> None:
+        """Fold pending counts into the CSR arrays"""
+        with self._lock:
+            if not self._delta_rows and not self._delta_tag_counts:
+                return
+            n_terms, n_tags = len(self._terms), len(self._tag_names)
+
+            old_rows = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+            delta = [(term_id, tag_id, count) for term_id, row in self._delta_rows.items() for tag_id, count in row.items()]
+            delta_arr = np.array(delta, dtype=np.int64).reshape(-1, 3)
+
+            keys = np.concatenate([old_rows * n_tags + self._indices, delta_arr[:, 0] * n_tags + delta_arr[:, 1]])
+            counts = np.concatenate([self._data, delta_arr[:, 2].astype(np.float32)])
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            data = np.bincount(inverse, weights=counts).astype(np.float32)
+
+            rows = unique_keys // n_tags
+            indptr = np.zeros(n_terms + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=n_terms), out=indptr[1:])
+
+            df = np.zeros(n_terms, dtype=np.float32)
+            df[:len(self._df)] = self._df
+            for term_id, count in self._delta_df.items():
+                df[term_id] += count
+            tag_counts = np.zeros(n_tags, dtype=np.float32)
+            tag_counts[:len(self._tag_counts)] = self._tag_counts
+            for tag_id, count in self._delta_tag_counts.items():
+                tag_counts[tag_id] += count
+
+            self._indptr, self._indices, self._data = indptr, (unique_keys % n_tags).astype(np.int32), data
+            self._df, self._tag_counts = df, tag_counts
+            self._delta_rows, self._delta_df, self._delta_tag_counts = {}, {}, {}
+            self._delta_pairs = 0
+
+    def observe(self, question_id: int, title: str, content: str, tags: str) -> None:
+        """Learn from a question created in this process"""
+        if not self.parse_tags(tags):
+            return
+        with self._lock:
+            if question_id <= self.last_id or question_id in self._observed:
+                return
+            self._observed.add(question_id)
+        self._add(title, content, tags)
+        if self._delta_pairs > COMPACT_PAIRS:
+            self._compact()
+
+    def refresh(self) -> int:
+        """Learn from tagged questions added since the last refresh (the first call is a full build)"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            first_build = self.last_id == 0
+            added = 0
+            db = database.SessionLocal()
+            try:
+                rows = db.query(
+                    models.Question.id, models.Question.title, models.Question.content, models.Question.tags
+                ).filter(
+                    models.Question.id > self.last_id,
+                    models.Question.tags != ""
+                ).order_by(models.Question.id.asc()).yield_per(1000)
+
+                last_id = self.last_id
+                for question_id, title, content, tags in rows:
+                    last_id = question_id
+                    if question_id in self._observed:
+                        continue
+                    self._add(title, content, tags)
+                    added += 1
+                    if self._delta_pairs > COMPACT_PAIRS:
+                        self._compact()
+            finally:
+                db.close()
+
+            self._compact()
+            with self._lock:
+                self.last_id = max(self.last_id, last_id)
+                self._observed = {question_id for question_id in self._observed if question_id > self.last_id}
+
+            self.last_refresh_seconds = time.perf_counter() - start
+            if first_build:
+                self.build_seconds = self.last_refresh_seconds
+                logger.info(f"Tag suggester built from {added} questions in {self.build_seconds:.2f}s")
+            return added
+
+    # ----- Suggestions -----
+
+    def _prefix_tag_ids(self, prefix: str) -> List[int]:
+        start = bisect_left(self._sorted_tags, (prefix, -1))
+        ids = []
+        for name, tag_id in self._sorted_tags[start:]:
+            if not name.startswith(prefix):
+                break
+            ids.append(tag_id)
+        return ids
+
+    def suggest(self, title: str, content: str = "", limit: int = 5, prefix: Optional[str] = None) -> Tuple[List[str], float]:
+        """Return (tags, confidence); confidence is the top tag's score in [0, 1]"""
+        start = time.perf_counter()
+        title_terms = set(self.tokenize(title or ""))
+        query_terms = title_terms | set(self.tokenize((content or "")[:CONTENT_CHARS]))
+
+        with self._lock:
+            n_tags = len(self._tag_names)
+            if n_tags == 0:
+                return [], 0.0
+            scores = np.zeros(n_tags, dtype=np.float32)
+            n_compacted = len(self._indptr) - 1
+            total_weight = 0.0
+
+            for term in query_terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                df = (self._df[term_id] if term_id < len(self._df) else 0.0) + self._delta_df.get(term_id, 0)
+                if df <= 0:
+                    continue
+                weight = math.log((self._docs + 1) / (df + 1)) + 1.0
+                if term in title_terms:
+                    weight *= 2.0
+                total_weight += weight
+
+                if term_id < n_compacted:
+                    a, b = self._indptr[term_id], self._indptr[term_id + 1]
+                    scores[self._indices[a:b]] += self._data[a:b] * (weight / df)
+                for tag_id, count in self._delta_rows.get(term_id, {}).items():
+                    scores[tag_id] += count * weight / df
+
+            if total_weight > 0:
+                scores /= total_weight
+                confidence_scores = scores
+            else:
+                # No known terms (e.g. only a prefix typed): rank by popularity, with no confidence
+                popularity = np.zeros(n_tags, dtype=np.float32)
+                popularity[:len(self._tag_counts)] = self._tag_counts
+                for tag_id, count in self._delta_tag_counts.items():
+                    popularity[tag_id] += count
+                scores = popularity
+                confidence_scores = None
+
+            candidates = np.array(self._prefix_tag_ids(prefix.strip().lower()), dtype=np.int64) if prefix else None
+            if candidates is not None:
+                ranked = candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+            else:
+                top = np.argpartition(-scores, min(limit, n_tags - 1))[:limit] if n_tags > limit else np.arange(n_tags)
+                ranked = top[np.argsort(-scores[top], kind="stable")]
+
+            confidence = min(1.0, float(confidence_scores[ranked[0]])) if confidence_scores is not None and len(ranked) else 0.0
+            floor = confidence * 0.3
+            tags = [
+                self._tag_names[tag_id] for tag_id in ranked
+                if candidates is not None or confidence_scores is None or scores[tag_id] >= max(floor, 1e-6)
+            ]
+
+        self.queries += 1
+        if confidence >= self.min_confidence:
+            self.confident += 1
+        self.query_seconds += time.perf_counter() - start
+        return tags, confidence
+
+    # ----- Lifecycle -----
+
+    async def _refresh_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except Exception as e:
+                logger.error(f"Tag suggester refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """Build in the background and keep learning from other workers' questions"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        array_bytes = sum(a.nbytes for a in (self._indptr, self._indices, self._data, self._df, self._tag_counts))
+        return {
+            "questions": self._docs,
+            "terms": len(self._terms),
+            "tags": len(self._tag_names),
+            "pending_pairs": self._delta_pairs,
+            "array_bytes": int(array_bytes),
+            "build_seconds": round(self.build_seconds, 3),
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3),
+            "queries": self.queries,
+            "confident": self.confident,
+            "hit_rate": round(self.confident / self.queries, 4) if self.queries else 0.0,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+            "min_confidence": self.min_confidence
+        }
+
+# Global instance
+tag_suggester = TagSuggester(settings.TAG_SUGGESTER_MIN_CONFIDENCE, settings.TAG_SUGGESTER_REFRESH_SECONDS)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Bulk AI backfill script.
+Run this script to fill in missing AI summaries and default answer quality scores.
+Progress is checkpointed, so an interrupted run picks up where it stopped.
+Questions whose generation fails are left unchanged; rerun with --restart to retry them.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import or_
+from app import crud, database, models
+from app.services.ai_service import ai_service, SUMMARY_PLACEHOLDERS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("summaries", "quality")
+DEFAULT_SCORE = 50
+
+class Checkpoint:
+    """Highest question id per operation below which everything is done, saved as JSON"""
+
+    def __init__(self, path: Path, restart: bool):
+        self.path = path
+        self.state = {}
+        if path.exists() and not restart:
+            self.state = json.loads(path.read_text())
+
+    def last_id(self, operation: str) -> int:
+        return self.state.get(operation, {}).get("last_id", 0)
+
+    def save(self, operation: str, last_id: int, **counters) -> None:
+        entry = self.state.setdefault(operation, {})
+        entry["last_id"] = last_id
+        for name, value in counters.items():
+            entry[name] = entry.get(name, 0) + value
+        # Write-then-rename so an interruption never leaves a truncated file
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp, self.path)
+
+class Backfill:
+    """Streams candidate questions into a bounded worker pool and writes results in batches"""
+
+    def __init__(self, operation: str, checkpoint: Checkpoint, concurrency: int, batch_size: int,
+                 limit: int = None, report_seconds: float = 10.0):
+        self.operation = operation
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.limit = limit
+        self.report_seconds = report_seconds
+
+        self.read_db = database.SessionLocal()
+        self.write_db = database.SessionLocal()
+        self.dispatched = deque()  # Question ids in candidate order, not yet checkpointed
+        self.finished = set()  # Question ids whose results are written (or that failed)
+        self.buffer = []
+        self.buffer_ids = []
+        self.done = 0
+        self.updated = 0
+        self.failed = 0
+        self.total = 0
+        self.started_at = 0.0
+        self.reported_at = 0.0
+
+    # ----- Candidates -----
+
+    def candidates(self, after_id: int):
+        if self.operation == "summaries":
+            query = self.read_db.query(models.Question.id).filter(
+                or_(models.Question.ai_summary == "", models.Question.ai_summary.is_(None))
+            )
+        else:
+            query = self.read_db.query(models.Answer.question_id).filter(
+                models.Answer.quality_score == DEFAULT_SCORE
+            ).distinct()
+        column = models.Question.id if self.operation == "summaries" else models.Answer.question_id
+        return query.filter(column > after_id).order_by(column)
+
+    # ----- Work -----
+
+    async def summarize(self, question_id: int) -> bool:
+        question = crud.get_question(self.read_db, question_id)
+        if question is None:
+            return False
+        answers = crud.get_summary_answers(self.read_db, question_id)
+        fingerprint = crud.summary_fingerprint(question, answers)
+        summary = await ai_service.summarize_question(
+            question.title,
+            question.content,
+            [{'content': answer.content} for answer in answers],
+            priority="backfill"
+        )
+        if summary in SUMMARY_PLACEHOLDERS:
+            return False
+        self.buffer.append({"id": question_id, "ai_summary": summary, "ai_summary_fingerprint": fingerprint})
+        return True
+
+    async def score(self, question_id: int) -> bool:
+        question = crud.get_question(self.read_db, question_id)
+        if question is None:
+            return False
+        answers = self.read_db.query(models.Answer.id, models.Answer.content).filter(
+            models.Answer.question_id == question_id,
+            models.Answer.quality_score == DEFAULT_SCORE
+        ).all()
+        scores = await ai_service.score_answers_batch(
+            f"{question.title}\n{question.content}",
+            {answer_id: content for answer_id, content in answers},
+            priority="backfill"
+        )
+        self.buffer.extend({"id": answer_id, "quality_score": int(score * 100)} for answer_id, score in scores.items())
+        return bool(scores)
+
+    async def worker(self, queue: asyncio.Queue) -> None:
+        handler = self.summarize if self.operation == "summaries" else self.score
+        while True:
+            question_id = await queue.get()
+            if question_id is None:
+                return
+            try:
+                if await handler(question_id):
+                    self.updated += 1
+                else:
+                    self.failed += 1
+            except Exception as e:
+                logger.error(f"Backfill of question {question_id} failed: {e}")
+                self.failed += 1
+            self.buffer_ids.append(question_id)
+            self.done += 1
+            if len(self.buffer_ids) >= self.batch_size:
+                self.flush()
+            self.report()
+
+    # ----- Results -----
+
+    def flush(self) -> None:
+        """Write buffered results in one transaction, then advance the checkpoint"""
+        if self.buffer:
+            model = models.Question if self.operation == "summaries" else models.Answer
+            self.write_db.bulk_update_mappings(model, self.buffer)
+            self.write_db.commit()
+        self.finished.update(self.buffer_ids)
+        self.buffer, self.buffer_ids = [], []
+
+        # Only ids with nothing unfinished before them are safe to skip on resume
+        last_id = None
+        while self.dispatched and self.dispatched[0] in self.finished:
+            last_id = self.dispatched.popleft()
+            self.finished.discard(last_id)
+        if last_id is not None:
+            self.checkpoint.save(self.operation, last_id)
+
+    def report(self, final: bool = False) -> None:
+        now = time.monotonic()
+        if not final and now - self.reported_at < self.report_seconds:
+            return
+        self.reported_at = now
+        elapsed = max(now - self.started_at, 1e-9)
+        rate = self.done / elapsed
+        remaining = max(0, self.total - self.done)
+        eta = f"{remaining / rate / 60:.1f} min" if rate > 0 else "unknown"
+        logger.info(
+            f"{self.operation}: {self.done}/{self.total} questions ({self.updated} updated, {self.failed} skipped), "
+            f"{rate:.1f} questions/s, ETA {eta}"
+        )
+
+    # ----- Run -----
+
+    async def run(self) -> None:
+        after_id = self.checkpoint.last_id(self.operation)
+        self.total = self.candidates(after_id).count()
+        if self.limit is not None:
+            self.total = min(self.total, self.limit)
+        logger.info(f"Backfilling {self.operation} for {self.total} questions (resuming after id {after_id})...")
+
+        self.started_at = self.reported_at = time.monotonic()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self.worker(queue)) for _ in range(self.concurrency)]
+        try:
+            for i, (question_id,) in enumerate(self.candidates(after_id).yield_per(500)):
+                if self.limit is not None and i >= self.limit:
+                    break
+                self.dispatched.append(question_id)
+                await queue.put(question_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            # Keep whatever finished before an interruption
+            self.flush()
+            self.report(final=True)
+            self.read_db.close()
+            self.write_db.close()
+
+async def backfill(operations, checkpoint: Checkpoint, concurrency: int, batch_size: int, limit: int = None):
+    """Run each backfill operation in turn"""
+    for operation in operations:
+        await Backfill(operation, checkpoint, concurrency, batch_size, limit).run()
+
+    stats = ai_service.quality_batch_stats()
+    logger.info(f"✅ Backfill finished; checkpoint saved to {checkpoint.path}")
+    if "quality" in operations:
+        logger.info(f"Batch calls: {stats['batch_calls']}, answers scored in batches: {stats['batched_answers']}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Backfill missing AI summaries and answer quality scores")
+    parser.add_argument("operation", choices=OPERATIONS + ("all",), help="What to backfill")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions processed at once")
+    parser.add_argument("--batch-size", type=int, default=100, help="Questions per database write")
+    parser.add_argument("--checkpoint", type=Path, default=Path("backfill_ai.checkpoint.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many questions")
+    args = parser.parse_args()
+
+    operations = OPERATIONS if args.operation == "all" else (args.operation,)
+    checkpoint = Checkpoint(args.checkpoint, args.restart)
+    try:
+        asyncio.run(backfill(operations, checkpoint, args.concurrency, args.batch_size, args.limit))
+    except KeyboardInterrupt:
+        logger.info(f"Interrupted; rerun to resume from {checkpoint.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1238 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark script.
+Run `python benchmark.py <benchmark>` against the configured database.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent))
+
+from app import auth, crud, database, schemas
+from app.database import engine, Base
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+BENCH_USERNAME = "bench_user"
+
+def get_bench_user(db):
+    """Get or create the user the benchmarks authenticate as"""
+    user = crud.get_user_by_username(db, BENCH_USERNAME)
+    if not user:
+        user = crud.create_user(db, schemas.UserCreate(
+            username=BENCH_USERNAME,
+            first_name="Bench",
+            email="bench@example.com",
+            password="Bench-password-1"
+        ))
+    return user
+
+def bench_current_user(iterations: int):
+    """Measure get_current_user throughput with and without the decode cache"""
+    Base.metadata.create_all(bind=engine)
+    db = database.SessionLocal()
+    try:
+        user = get_bench_user(db)
+        token = auth.create_access_token(data={"sub": user.username})
+        maxsize = auth.token_cache.maxsize
+
+        results = {}
+        for label, size in (("uncached", 0), ("cached", maxsize or 10000)):
+            auth.token_cache.clear()
+            auth.token_cache.maxsize = size
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                auth.get_current_user(token=token, db=db)
+            elapsed = time.perf_counter() - start
+
+            results[label] = iterations / elapsed
+            logger.info(f"{label:>9}: {results[label]:,.0f} req/s ({elapsed * 1e6 / iterations:.1f} µs/req)")
+
+        auth.token_cache.maxsize = maxsize
+        logger.info(f"Speedup: {results['cached'] / results['uncached']:.2f}x")
+    finally:
+        db.close()
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+async def _read_loop(client, latencies, stop_at):
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        await client.get("/api/questions", params={"limit": 20})
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def _login_loop(client, stop_at, counters):
+    while time.perf_counter() < stop_at:
+        response = await client.post("/api/auth/login-json", json={
+            "username": BENCH_USERNAME,
+            "password": "Bench-password-1"
+        })
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+async def _run_mix(app, readers: int, logins: int, duration: float):
+    import httpx
+
+    latencies, counters = [], {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        stop_at = time.perf_counter() + duration
+        tasks = [_read_loop(client, latencies, stop_at) for _ in range(readers)]
+        tasks += [_login_loop(client, stop_at, counters) for _ in range(logins)]
+        await asyncio.gather(*tasks)
+    return latencies, counters
+
+def bench_login_mix(readers: int, logins: int, duration: float):
+    """Measure read latency alone and while a login burst runs concurrently"""
+    from app.main import app
+
+    Base.metadata.create_all(bind=engine)
+    db = database.SessionLocal()
+    try:
+        get_bench_user(db)
+    finally:
+        db.close()
+
+    for label, login_workers in (("reads only", 0), ("reads + logins", logins)):
+        latencies, counters = asyncio.run(_run_mix(app, readers, login_workers, duration))
+        logger.info(
+            f"{label:>15}: {len(latencies)} reads, "
+            f"p50={statistics.median(latencies):.1f}ms p99={percentile(latencies, 99):.1f}ms, "
+            f"login responses={counters}"
+        )
+
+class FakeOIDCHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for Google's OIDC discovery document and JWKS"""
+    latency = 0.0
+    max_age = 3600
+    keys = []
+    fetches = {"discovery": 0, "jwks": 0}
+
+    def do_GET(self):
+        cls = type(self)
+        time.sleep(cls.latency)
+        if self.path == "/.well-known/openid-configuration":
+            cls.fetches["discovery"] += 1
+            host = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+            payload = {"issuer": "https://accounts.google.com", "jwks_uri": f"{host}/oauth2/v3/certs"}
+        else:
+            cls.fetches["jwks"] += 1
+            payload = {"keys": list(cls.keys)}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", f"public, max-age={cls.max_age}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_oidc() -> ThreadingHTTPServer:
+    """Serve fake Google OIDC metadata locally and point the OAuth service at it"""
+    from app.config import settings
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOIDCHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.GOOGLE_CLIENT_ID = "bench-client.apps.googleusercontent.com"
+    settings.GOOGLE_CLIENT_SECRET = "fake"
+    settings.GOOGLE_DISCOVERY_URL = f"http://127.0.0.1:{server.server_address[1]}/.well-known/openid-configuration"
+    return server
+
+def make_signing_key(kid: str):
+    """An RSA key pair as (private PEM, public JWK)"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public = jwk.construct(pem, "RS256").public_key().to_dict()
+    public.update({"kid": kid, "use": "sig"})
+    return pem, public
+
+def bench_oidc(tokens: int) -> bool:
+    """Google ID token verification against a fake JWKS: warm-up timeout, steady state, max-age expiry and key rotation"""
+    from jose import jwt
+    from app.config import settings
+    from app.services.oauth_service import oauth_service
+
+    start_fake_oidc()
+    old_pem, old_key = make_signing_key("key-1")
+    new_pem, new_key = make_signing_key("key-2")
+    FakeOIDCHandler.keys = [old_key]
+
+    def sign(pem: bytes, kid: str, email: str) -> str:
+        now = int(time.time())
+        claims = {"iss": "https://accounts.google.com", "aud": settings.GOOGLE_CLIENT_ID, "sub": email,
+                  "email": email, "email_verified": True, "iat": now, "exp": now + 600}
+        return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": kid})
+
+    def jwks_fetches() -> int:
+        return FakeOIDCHandler.fetches["jwks"]
+
+    async def run():
+        checks = {}
+        provider = oauth_service.google_provider
+
+        # An unreachable (here: slow) Google must not hold startup past the timeout
+        settings.OIDC_WARMUP_TIMEOUT_SECONDS = 0.2
+        FakeOIDCHandler.latency = 1.0
+        start = time.perf_counter()
+        await oauth_service.warm_up()
+        checks["warm-up gives up after the timeout"] = time.perf_counter() - start < 0.5
+        await oauth_service.stop()
+        FakeOIDCHandler.latency = 0.0
+
+        # Steady state: one fetch, then every token verifies from the cache
+        signed = [sign(old_pem, "key-1", f"user{i}@example.com") for i in range(tokens)]
+        before = jwks_fetches()
+        start = time.perf_counter()
+        results = [await oauth_service.verify_google_id_token(token) for token in signed]
+        elapsed = time.perf_counter() - start
+        logger.info(f"verify_google_id_token: {elapsed / tokens * 1e6:.0f}us per token, {jwks_fetches() - before} JWKS fetch(es)")
+        checks["all tokens verify"] = all(result and result["email"] for result in results)
+        checks["steady state needs one fetch"] = jwks_fetches() - before == 1
+
+        # Cache expiry follows the JWKS max-age
+        FakeOIDCHandler.max_age = 1
+        await provider.refresh()
+        before = jwks_fetches()
+        await oauth_service.verify_google_id_token(signed[0])
+        checks["no refetch before max-age"] = jwks_fetches() == before
+        await asyncio.sleep(1.1)
+        await oauth_service.verify_google_id_token(signed[0])
+        checks["refetch after max-age"] = jwks_fetches() == before + 1
+        FakeOIDCHandler.max_age = 3600
+        await provider.refresh()
+
+        # Key rotation: an unknown kid refetches, at most once a minute
+        FakeOIDCHandler.keys = [old_key, new_key]
+        rotated = sign(new_pem, "key-2", "rotated@example.com")
+        before = jwks_fetches()
+        checks["unknown kid inside a minute is rejected without a fetch"] = (
+            await oauth_service.verify_google_id_token(rotated) is None and jwks_fetches() == before
+        )
+        provider.refreshed_at -= 61  # As if the last fetch was over a minute ago
+        result = await oauth_service.verify_google_id_token(rotated)
+        checks["rotated key is fetched and verifies"] = bool(result) and jwks_fetches() == before + 1
+        checks["forged kid is rejected"] = await oauth_service.verify_google_id_token(sign(new_pem, "key-1", "x@example.com")) is None
+        return checks
+
+    checks = asyncio.run(run())
+    for name, ok in checks.items():
+        logger.info(f"{'ok' if ok else 'FAILED'}: {name}")
+    logger.info(f"Fake Google fetches: {FakeOIDCHandler.fetches}")
+    return all(checks.values())
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OpenAI chat completions endpoint"""
+    latency = 0.05
+    chunk_delay = 0.0  # Pause between streamed chunks
+    requests_served = 0
+
+    max_concurrent = 0  # Answer 429 above this many concurrent requests (0 = unlimited)
+    in_flight = 0
+    throttled = 0
+    lock = threading.Lock()
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        cls = type(self)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with cls.lock:
+            cls.in_flight += 1
+            over_limit = cls.max_concurrent and cls.in_flight > cls.max_concurrent
+        try:
+            if over_limit:
+                cls.throttled += 1
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+                return
+            time.sleep(self.latency)
+            self._respond(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _respond(self, body: dict):
+        type(self).requests_served += 1
+
+        system_prompt = body["messages"][0]["content"]
+        user_prompt = body["messages"][-1]["content"]
+        if "JSON array" in system_prompt:
+            count = len(re.findall(r"Answer \d+:", user_prompt))
+            content = json.dumps([{"id": i, "score": 0.8} for i in range(1, count + 1)])
+        elif "quality" in system_prompt:
+            content = "0.8"
+        elif "tags" in system_prompt:
+            content = "python, fastapi, performance"
+        else:
+            content = "A concise summary of the discussion."
+
+        if body.get("stream"):
+            self._send_stream(body, content)
+            return
+
+        # Roughly four characters per token
+        prompt_tokens = (len(system_prompt) + len(user_prompt)) // 4
+        completion_tokens = len(content) // 4 + 1
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    def _send_stream(self, body: dict, content: str):
+        """Send content word by word as chat.completion.chunk Server-Sent Events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = re.findall(r"\S+\s*", content)
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word},
+                             "finish_reason": "stop" if i == len(words) - 1 else None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_openai(latency: float) -> ThreadingHTTPServer:
+    """Serve fake completions locally and point the openai client at them"""
+    import openai
+    from app.config import settings
+
+    FakeOpenAIHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.OPENAI_API_KEY = "sk-fake"
+    settings.AI_APPROXIMATE_TOKENS = True  # Offline: tiktoken can't fetch its vocabulary
+    openai.api_key = "sk-fake"
+    openai.api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server
+
+def bench_ai_cache(calls: int, unique: int, latency: float):
+    """Measure suggest_tags cost for repeated inputs with and without the AI result cache"""
+    from app.services.ai_service import ai_service
+    from app.services.ai_cache import ai_cache
+
+    Base.metadata.create_all(bind=engine)
+    server = start_fake_openai(latency)
+    rng = random.Random(42)
+
+    async def run(salt: str):
+        for _ in range(calls):
+            n = rng.randrange(unique)
+            await ai_service.suggest_tags(f"Question {n} {salt}", f"Body of question {n} {salt}")
+
+    try:
+        for label, enabled in (("uncached", False), ("cached", True)):
+            ai_cache.enabled = enabled
+            before = FakeOpenAIHandler.requests_served
+            start = time.perf_counter()
+            asyncio.run(run(f"{label}-{time.time()}"))
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"{label:>9}: {calls} calls in {elapsed:.2f}s, "
+                f"{FakeOpenAIHandler.requests_served - before} upstream requests"
+            )
+        logger.info(f"Cache stats: {ai_cache.stats()}")
+    finally:
+        server.shutdown()
+
+def bench_quality_batch(questions: int, answers: int, latency: float):
+    """Compare one-call-per-answer quality scoring with batched scoring"""
+    from app.services.ai_service import ai_service
+    from app.services.ai_cache import ai_cache
+
+    Base.metadata.create_all(bind=engine)
+    server = start_fake_openai(latency)
+    ai_cache.enabled = False
+    salt = time.time()
+    threads = [
+        (f"Question {q} {salt}\nHow should I structure this?",
+         {q * answers + a: f"Answer {a} to question {q}: " + "some explanation " * 30 for a in range(answers)})
+        for q in range(questions)
+    ]
+
+    async def single():
+        for context, batch in threads:
+            for content in batch.values():
+                await ai_service.generate_answer_quality_score(content, context)
+
+    async def batched():
+        for context, batch in threads:
+            await ai_service.score_answers_batch(context, batch)
+
+    try:
+        for label, run in (("single", single), ("batched", batched)):
+            before = FakeOpenAIHandler.requests_served
+            start = time.perf_counter()
+            asyncio.run(run())
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"{label:>8}: {questions * answers} answers in {elapsed:.2f}s, "
+                f"{FakeOpenAIHandler.requests_served - before} upstream requests"
+            )
+        logger.info(f"Batch stats: {ai_service.quality_batch_stats()}")
+    finally:
+        server.shutdown()
+
+def bench_ai_scheduler(calls: int, max_concurrent: int, latency: float):
+    """Burst of mixed-priority AI calls against a fake server that 429s above max_concurrent"""
+    from app.services.ai_service import ai_service
+    from app.services.ai_cache import ai_cache
+    from app.services.ai_scheduler import ai_scheduler
+
+    server = start_fake_openai(latency)
+    FakeOpenAIHandler.max_concurrent = max_concurrent
+    ai_cache.enabled = False
+    lanes = ["interactive", "enrichment", "backfill"]
+
+    async def call(i: int, latencies: dict):
+        lane = lanes[i % 3]
+        start = time.perf_counter()
+        await ai_service.suggest_tags(f"Question {i}", f"Body {i} {time.time()}", priority=lane)
+        latencies[lane].append((time.perf_counter() - start) * 1000)
+
+    async def run():
+        latencies = {lane: [] for lane in lanes}
+        await asyncio.gather(*(call(i, latencies) for i in range(calls)))
+        return latencies
+
+    try:
+        start = time.perf_counter()
+        latencies = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        logger.info(f"{calls} calls in {elapsed:.2f}s, {FakeOpenAIHandler.throttled} upstream 429s")
+        for lane, values in latencies.items():
+            logger.info(f"{lane:>12}: p50={statistics.median(values):.0f}ms p99={percentile(values, 99):.0f}ms")
+        logger.info(f"Scheduler stats: {ai_scheduler.stats()}")
+    finally:
+        server.shutdown()
+
+def make_thread(seed: int, size: int = 50 * 1024):
+    """A synthetic question thread of roughly `size` bytes (question plus 3 answers)"""
+    rng = random.Random(seed)
+    words = ["python", "async", "database", "index", "query", "token", "cache", "latency",
+             "the", "a", "of", "to", "and", "is", "in", "for", "with", "this", "that", "it"]
+
+    def text(n):
+        return " ".join(rng.choice(words) for _ in range(n // 5))
+
+    return f"Thread {seed}: how do I speed this up?", text(size // 2), [text(size // 6) for _ in range(3)]
+
+def legacy_summary_context(ai_service, title: str, content: str, answers) -> str:
+    """Summary context as built before the prompt builder: encode everything, cut by characters"""
+    context = f"Question: {title}\n\nDetails: {content}"
+    context += "\n\nAnswers:\n"
+    for i, answer in enumerate(answers, 1):
+        context += f"{i}. {answer[:500]}...\n"
+    if len(ai_service.encoding.encode(context)) > 3000:
+        context = context[:3000] + "..."
+    return context
+
+def bench_prompt_builder(threads: int, rounds: int):
+    """Time summary-context assembly on ~50 KB threads: legacy vs token-budgeted builder"""
+    from app.config import settings
+    from app.services.ai_service import ai_service, SUMMARY_CONTEXT_TOKENS, TITLE_TOKENS, FRAMING_TOKENS
+
+    settings.AI_APPROXIMATE_TOKENS = True  # Runs offline when tiktoken can't fetch its vocabulary
+    data = [make_thread(seed) for seed in range(threads)]
+    builder = ai_service.prompt_builder
+
+    def builder_context(title, content, answers):
+        title_text, title_tokens = builder.truncate(title, TITLE_TOKENS)
+        pieces, _ = builder.fit([content] + answers, SUMMARY_CONTEXT_TOKENS - title_tokens - FRAMING_TOKENS)
+        return f"Question: {title_text}\n\nDetails: {pieces[0]}\n\nAnswers:\n" + "".join(
+            f"{i}. {piece}\n" for i, piece in enumerate(pieces[1:], 1)
+        )
+
+    def run(label, build, edit_question):
+        contexts = []
+        start = time.perf_counter()
+        for r in range(rounds):
+            for title, content, answers in data:
+                # Re-summarizing after an edit: the question changes, the answers do not
+                if edit_question:
+                    content = f"{content} edit {r}"
+                contexts.append(build(title, content, answers))
+        elapsed = time.perf_counter() - start
+        builds = rounds * len(data)
+        sizes = [len(ai_service.encoding.encode(context)) for context in contexts]
+        logger.info(
+            f"{label:>16}: {elapsed * 1000 / builds:.2f} ms/build, "
+            f"context tokens min={min(sizes)} max={max(sizes)} (budget {SUMMARY_CONTEXT_TOKENS})"
+        )
+
+    run("legacy", lambda t, c, a: legacy_summary_context(ai_service, t, c, a), True)
+    run("builder", builder_context, True)
+    logger.info(f"Token memo: {builder.stats()}")
+
+def bench_tag_suggester(questions: int, queries: int):
+    """Train the local tag model on synthetic tagged questions and time suggestions"""
+    from app.services.tag_suggester import TagSuggester
+
+    rng = random.Random(7)
+    topics = {
+        "python": ["pandas", "numpy", "django", "flask", "asyncio"],
+        "javascript": ["react", "node.js", "typescript", "vue", "express"],
+        "database": ["postgresql", "sqlite", "mysql", "indexing", "sql"],
+        "devops": ["docker", "kubernetes", "terraform", "aws", "ci"],
+    }
+    filler = "how should i handle this error when the service starts under heavy load today".split()
+
+    def question():
+        topic = rng.choice(list(topics))
+        tags = [topic] + rng.sample(topics[topic], 2)
+        words = rng.sample(topics[topic], 3) + rng.sample(filler, 6)
+        return " ".join(words[:5]), " ".join(words + rng.sample(filler, 8)), ",".join(tags)
+
+    suggester = TagSuggester(min_confidence=0.35, refresh_seconds=300)
+    start = time.perf_counter()
+    for question_id in range(1, questions + 1):
+        suggester.observe(question_id, *question())
+    suggester._compact()
+    logger.info(f"Trained on {questions} questions in {time.perf_counter() - start:.2f}s")
+
+    latencies = []
+    for _ in range(queries):
+        title, content, _ = question()
+        start = time.perf_counter()
+        suggester.suggest(title, content)
+        latencies.append((time.perf_counter() - start) * 1000)
+    logger.info(f"suggest: p50={statistics.median(latencies):.3f}ms p99={percentile(latencies, 99):.3f}ms")
+    logger.info(f"Example: {suggester.suggest('django query is slow', 'orm select related')}")
+    logger.info(f"Prefix 'ty': {suggester.suggest('', prefix='ty')}")
+    logger.info(f"Stats: {suggester.stats()}")
+
+def bench_summary_stream(viewers: int, latency: float, chunk_delay: float):
+    """Time to first token for streamed summaries, with concurrent viewers sharing one generation"""
+    from app import models
+    from app.services.ai_service import ai_service
+    from app.services.summary_stream import summary_stream_hub
+
+    Base.metadata.create_all(bind=engine)
+    server = start_fake_openai(latency)
+    FakeOpenAIHandler.chunk_delay = chunk_delay
+    db = database.SessionLocal()
+    try:
+        user = get_bench_user(db)
+        question = models.Question(
+            title="Why does my asyncio service stall under load?",
+            content=" ".join(f"Detail {i} about the event loop and blocking calls." for i in range(40)),
+            tags="python,asyncio",
+            user_id=user.id
+        )
+        db.add(question)
+        db.commit()
+        question_id = question.id
+    finally:
+        db.close()
+
+    async def blocking():
+        start = time.perf_counter()
+        await ai_service.summarize_question("Why does my asyncio service stall?", f"Blocking run {random.random()}")
+        return (time.perf_counter() - start) * 1000
+
+    async def viewer(delay: float):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        first = None
+        async for _ in summary_stream_hub.open(question_id, force=True).follow():
+            if first is None:
+                first = (time.perf_counter() - start) * 1000
+        return first, (time.perf_counter() - start) * 1000
+
+    async def run():
+        blocking_ms = await blocking()
+        served = FakeOpenAIHandler.requests_served
+        # Viewers arrive over the first half of the generation
+        results = await asyncio.gather(*(viewer(i * latency / max(1, viewers)) for i in range(viewers)))
+        return blocking_ms, results, FakeOpenAIHandler.requests_served - served
+
+    try:
+        blocking_ms, results, upstream = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    first_token = [first for first, _ in results]
+    complete = [total for _, total in results]
+    logger.info(f"Blocking summary: {blocking_ms:.0f}ms until any text")
+    logger.info(
+        f"Streamed ({viewers} viewers): first token p50={statistics.median(first_token):.0f}ms "
+        f"p99={percentile(first_token, 99):.0f}ms, complete p50={statistics.median(complete):.0f}ms"
+    )
+    logger.info(f"Upstream generations for {viewers} viewers: {upstream}")
+    logger.info(f"Hub stats: {summary_stream_hub.stats()}")
+
+def bench_ai_coalesce(requests: int, workers: int, latency: float):
+    """Concurrent summary requests for one question should cost a single upstream call"""
+    import httpx
+    from app import models
+    from app.main import app
+    from app.services.ai_service import ai_service
+    from app.services.inflight import InFlightRegistry, inflight
+
+    Base.metadata.create_all(bind=engine)
+    server = start_fake_openai(latency)
+    db = database.SessionLocal()
+    try:
+        user = get_bench_user(db)
+        token = auth.create_access_token(data={"sub": user.username})
+        question = models.Question(
+            title="Why is my viral question slow to summarize?",
+            content=f"Coalescing run {random.random()}",
+            tags="python",
+            user_id=user.id
+        )
+        db.add(question)
+        db.commit()
+        question_id = question.id
+    finally:
+        db.close()
+
+    async def same_worker():
+        headers = {"Authorization": f"Bearer {token}"}
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+            requests_sent = [client.post(f"/api/ai/summarize/{question_id}", headers=headers) for _ in range(requests)]
+            responses = await asyncio.gather(*requests_sent)
+        return [response.status_code for response in responses]
+
+    async def across_workers():
+        # Separate registries stand in for worker processes sharing the cache lease
+        registries = [InFlightRegistry(lease_seconds=30, poll_seconds=0.05) for _ in range(workers)]
+        content = f"Cross-worker run {random.random()}"
+        results = {}
+
+        async def generate():
+            results["summary"] = await ai_service.summarize_question("Cross-worker question", content)
+            return results["summary"]
+
+        calls = [
+            registries[i % workers].run("bench", content, generate, peek=lambda: results.get("summary"))
+            for i in range(requests)
+        ]
+        await asyncio.gather(*calls)
+        return [registry.stats() for registry in registries]
+
+    try:
+        served = FakeOpenAIHandler.requests_served
+        start = time.perf_counter()
+        statuses = asyncio.run(same_worker())
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"{requests} concurrent /ai/summarize requests: {FakeOpenAIHandler.requests_served - served} upstream calls "
+            f"in {elapsed:.2f}s, statuses={sorted(set(statuses))}, registry={inflight.stats()}"
+        )
+
+        served = FakeOpenAIHandler.requests_served
+        worker_stats = asyncio.run(across_workers())
+        logger.info(
+            f"{requests} requests over {workers} workers: {FakeOpenAIHandler.requests_served - served} upstream calls"
+        )
+        for i, stats in enumerate(worker_stats):
+            logger.info(f"  worker {i}: {stats}")
+    finally:
+        server.shutdown()
+
+def bench_duplicates(questions: int, queries: int):
+    """Build the near-duplicate index over synthetic questions and time lookups"""
+    from app.services.duplicate_index import DuplicateIndex
+
+    rng = random.Random(11)
+    vocabulary = [f"w{i}" for i in range(20000)]
+
+    def question():
+        return " ".join(rng.choices(vocabulary, k=8)), " ".join(rng.choices(vocabulary, k=60))
+
+    def near_copy(title: str, content: str):
+        # Reword two title words and a few body words, as a reposter might
+        title_words, content_words = title.split(), content.split()
+        for i in rng.sample(range(len(title_words)), 2):
+            title_words[i] = rng.choice(vocabulary)
+        for i in rng.sample(range(len(content_words)), 4):
+            content_words[i] = rng.choice(vocabulary)
+        return " ".join(title_words), " ".join(content_words)
+
+    index = DuplicateIndex(threshold=0.5, refresh_seconds=300)
+    originals = {}
+    building = 0.0  # Excludes generating the synthetic text
+
+    def add(batch_ids, batch):
+        nonlocal building
+        start = time.perf_counter()
+        index._append(batch_ids, index.signatures(batch))
+        building += time.perf_counter() - start
+
+    batch_ids, batch = [], []
+    for question_id in range(1, questions + 1):
+        title, content = question()
+        if question_id % max(1, questions // queries) == 0:
+            originals[question_id] = (title, content)
+        batch_ids.append(question_id)
+        batch.append((title, content))
+        if len(batch) == 1000:
+            add(batch_ids, batch)
+            batch_ids, batch = [], []
+    if batch:
+        add(batch_ids, batch)
+    start = time.perf_counter()
+    index._compact()
+    compacting = time.perf_counter() - start
+    logger.info(f"Indexed {questions} questions in {building + compacting:.1f}s ({compacting:.1f}s sorting bands)")
+
+    latencies, found, false_positives = [], 0, 0
+    for question_id, (title, content) in list(originals.items())[:queries]:
+        for text, original_id in ((near_copy(title, content), question_id), (question(), None)):
+            start = time.perf_counter()
+            matches = index.find(*text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if original_id is not None:
+                found += any(match_id == original_id for match_id, _ in matches)
+            else:
+                false_positives += bool(matches)
+    checked = min(queries, len(originals))
+    logger.info(f"find: p50={statistics.median(latencies):.3f}ms p99={percentile(latencies, 99):.3f}ms")
+    logger.info(f"Near-copies found: {found}/{checked}, unrelated queries with matches: {false_positives}/{checked}")
+    logger.info(f"Stats: {index.stats()}")
+
+def use_fake_llm(latency_ms: float, error_rate: float = 0.0, seed: int = 0):
+    """Route AI calls to the in-process fake backend (call before ai_service is first used)"""
+    from app.config import settings
+
+    settings.LLM_BACKEND = "fake"
+    settings.LLM_FAKE_LATENCY_MS = latency_ms
+    settings.LLM_FAKE_ERROR_RATE = error_rate
+    settings.LLM_FAKE_SEED = seed
+
+def bench_write_path(questions: int, answers: int, latency_ms: float, error_rate: float, seed: int):
+    """create_question, create_answer, enrichment and summarization offline against the fake LLM"""
+    import httpx
+    from app.main import app
+    from app.services.ai_scheduler import ai_scheduler
+    from app.services.ai_service import ai_service
+    from app.services.enrichment import enrichment_queue
+    from app.services.summaries import generate_summary
+
+    use_fake_llm(latency_ms, error_rate, seed)
+    rng = random.Random(seed)
+    words = "python fastapi sqlite async cache index query worker deploy docker error timeout memory".split()
+
+    def text(count: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(count))
+
+    Base.metadata.create_all(bind=engine)
+    db = database.SessionLocal()
+    try:
+        token = auth.create_access_token(data={"sub": get_bench_user(db).username})
+    finally:
+        db.close()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def run():
+        timings = {"create_question": [], "create_answer": [], "summarize": []}
+        question_ids = []
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+            for i in range(questions):
+                start = time.perf_counter()
+                response = await client.post("/api/questions", headers=headers, json={
+                    "title": f"Question {i}: {text(6)}",
+                    "content": text(60),
+                    "tags": ",".join(rng.sample(words, 2))
+                })
+                timings["create_question"].append((time.perf_counter() - start) * 1000)
+                question_ids.append(response.json()["id"])
+                for _ in range(answers):
+                    start = time.perf_counter()
+                    await client.post(f"/api/answers/{question_ids[-1]}", headers=headers, json={"content": text(40)})
+                    timings["create_answer"].append((time.perf_counter() - start) * 1000)
+
+        # Tag and quality jobs queued by the create endpoints (summaries are debounced)
+        start = time.perf_counter()
+
+        async def drain():
+            while await enrichment_queue.run_once():
+                pass
+
+        await asyncio.gather(*(drain() for _ in range(4)))
+        enrichment_seconds = time.perf_counter() - start
+
+        async def summarize(question_id: int):
+            start = time.perf_counter()
+            await generate_summary(question_id, force=True)
+            timings["summarize"].append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(summarize(question_id) for question_id in question_ids))
+        return timings, enrichment_seconds
+
+    timings, enrichment_seconds = asyncio.run(run())
+    for name, values in timings.items():
+        logger.info(
+            f"{name:>15}: n={len(values)} p50={statistics.median(values):.1f}ms p99={percentile(values, 99):.1f}ms"
+        )
+    logger.info(f"Enrichment drain: {enrichment_seconds:.2f}s, {enrichment_queue.stats()}")
+    logger.info(f"LLM backend: {ai_service.backend.stats()}")
+    logger.info(f"Scheduler: retries={ai_scheduler.retries} throttled={ai_scheduler.throttled}")
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for Slack's chat.postMessage"""
+    latency = 0.3
+    rate_limit_every = 0  # Answer `ratelimited` to every Nth request (0 = never)
+    retry_after = 1
+    requests = 0
+    posted = 0
+    rate_limited = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with cls.lock:
+            cls.requests += 1
+            limited = cls.rate_limit_every and cls.requests % cls.rate_limit_every == 0
+        time.sleep(cls.latency)
+
+        if limited:
+            cls.rate_limited += 1
+            status, payload = 429, {"ok": False, "error": "ratelimited"}
+        else:
+            cls.posted += 1
+            status, payload = 200, {"ok": True, "channel": "C0FAKE", "ts": f"{time.time():.6f}"}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if limited:
+            self.send_header("Retry-After", str(cls.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_slack(latency: float, rate_limit_every: int) -> ThreadingHTTPServer:
+    """Serve a fake Slack Web API locally and point the Slack service at it"""
+    from app.config import settings
+
+    FakeSlackHandler.latency = latency
+    FakeSlackHandler.rate_limit_every = rate_limit_every
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.SLACK_BOT_TOKEN = "xoxb-fake"
+    settings.SLACK_API_URL = f"http://127.0.0.1:{server.server_address[1]}/api/"
+    return server
+
+def bench_slack(questions: int, latency: float, rate_limit_every: int, capacity: int):
+    """create_question latency with Slack notifications dispatched from the outbox, coalesced and sent to a fake Slack"""
+    import httpx
+    from app.config import settings
+    from app.main import app
+    from app.services.outbox import outbox_dispatcher
+    from app.services.slack_service import slack_service
+
+    use_fake_llm(50.0)
+    settings.SLACK_OUTBOX_CAPACITY = capacity
+    start_fake_slack(latency, rate_limit_every)
+
+    Base.metadata.create_all(bind=engine)
+    db = database.SessionLocal()
+    try:
+        token = auth.create_access_token(data={"sub": get_bench_user(db).username})
+    finally:
+        db.close()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def run():
+        latencies = []
+        outbox_dispatcher.start()
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+            for i in range(questions):
+                start = time.perf_counter()
+                await client.post("/api/questions", headers=headers, json={
+                    "title": f"Slack benchmark question {i}",
+                    "content": "How long does posting take while Slack is slow to answer?"
+                })
+                latencies.append((time.perf_counter() - start) * 1000)
+        posted_at = time.perf_counter()
+        while outbox_dispatcher.stats()["events"].get("pending"):
+            await asyncio.sleep(0.1)
+        await outbox_dispatcher.stop(timeout=600)  # Flushes coalesced events
+        await slack_service.stop(timeout=600)  # Waits for the Slack outbox to drain
+        return latencies, time.perf_counter() - posted_at
+
+    latencies, drain_seconds = asyncio.run(run())
+    logger.info(
+        f"create_question: n={len(latencies)} p50={statistics.median(latencies):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms (fake Slack latency {latency * 1000:.0f}ms)"
+    )
+    stats = slack_service.stats()
+    coalescing = stats.pop("coalescing")
+    logger.info(f"Outbox events: {outbox_dispatcher.stats()['events']}")
+    logger.info(f"Slack outbox drained {drain_seconds:.1f}s after the last post: {stats}")
+    logger.info(
+        f"Coalescing: {coalescing['events']} events sent as {coalescing['messages']} messages "
+        f"({coalescing['messages_saved']} saved, {coalescing['grouped_messages']} grouped, {coalescing['digests']} digests)"
+    )
+    logger.info(f"Fake Slack: {FakeSlackHandler.posted} posted, {FakeSlackHandler.rate_limited} answered ratelimited")
+
+def bench_metrics(requests: int, samples: int):
+    """Request metrics through the aggregator into the in-memory CloudWatch stand-in"""
+    import httpx
+    from app.main import app
+    from app.services.metrics import metrics, MemorySink
+
+    Base.metadata.create_all(bind=engine)
+    sink = metrics.sink = MemorySink()
+
+    start = time.perf_counter()
+    for i in range(samples):
+        metrics.observe("BenchLatency", random.lognormvariate(3, 1))
+    observe_us = (time.perf_counter() - start) / samples * 1e6
+    metrics.increment("BenchCount")
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            for i in range(requests):
+                await client.get("/health" if i % 2 else "/api/questions")
+        return await metrics.flush()
+
+    datums = asyncio.run(run())
+    latency = sink.datums("RequestLatency")
+    logger.info(f"observe(): {observe_us:.2f}us per sample")
+    logger.info(
+        f"{requests} requests + {samples} samples -> {datums} datums in {len(sink.batches)} PutMetricData call(s) "
+        f"(vs {requests + samples} unbatched)"
+    )
+    for datum in latency:
+        values, counts = datum["Values"], datum["Counts"]
+        logger.info(f"  {datum['Dimensions'][0]['Value']}: {int(sum(counts))} requests as {len(values)} distinct values")
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Minimal stand-in for S3's PutObject (path-style addressing)"""
+    protocol_version = "HTTP/1.1"  # boto3 sends Expect: 100-continue and would wait a second for it
+    latency = 0.2
+    bytes_per_second = 50 * 1024 * 1024
+    objects = {}
+    lock = threading.Lock()
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            while self.rfile.readline() not in (b"\r\n", b""):
+                pass  # Trailers (checksums)
+            return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_PUT(self):
+        cls = type(self)
+        body = self._body()
+        time.sleep(cls.latency + len(body) / cls.bytes_per_second)
+        with cls.lock:
+            cls.objects[self.path] = len(body)
+        self.send_response(200)
+        self.send_header("ETag", f'"{len(body):x}"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_s3(latency: float) -> ThreadingHTTPServer:
+    """Serve a fake S3 locally and point the AWS service at it"""
+    from app.config import settings
+
+    FakeS3Handler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeS3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.AWS_ACCESS_KEY_ID = "AKIAFAKE"
+    settings.AWS_SECRET_ACCESS_KEY = "fake"
+    settings.AWS_S3_BUCKET = "bench-bucket"
+    settings.AWS_ENDPOINT_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+def bench_aws(backups: int, size_kb: int, latency: float):
+    """Event loop stalls and /health latency during concurrent S3 backups to a fake S3, inline boto3 vs the executor facade"""
+    import httpx
+    from app.config import settings
+    from app.main import app
+    from app.services.aws_service import aws_service
+    from app.services.metrics import metrics, MemorySink
+
+    metrics.sink = MemorySink()
+    start_fake_s3(latency)
+    Base.metadata.create_all(bind=engine)
+    data = {"rows": [{"id": i, "title": "x" * 200} for i in range(size_kb * 1024 // 220)]}
+
+    async def inline_backup(key: str) -> None:
+        # What every AWSService method used to do: call boto3 straight from the coroutine
+        aws_service.s3_client.put_object(
+            Bucket=settings.AWS_S3_BUCKET, Key=f"backups/{key}",
+            Body=json.dumps(data, default=str, indent=2).encode("utf-8"), ContentType="application/json"
+        )
+
+    async def run(backup) -> dict:
+        lags, health = [], []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+        async def prober(client):
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            tasks = [asyncio.create_task(ticker()), asyncio.create_task(prober(client))]
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            await asyncio.gather(*(backup(f"bench_{i}.json") for i in range(backups)))
+            elapsed = time.perf_counter() - start
+            done.set()
+            await asyncio.gather(*tasks)
+        return {"elapsed": elapsed, "max_lag": max(lags), "health_p50": statistics.median(health),
+                "health_max": max(health), "probes": len(health)}
+
+    for label, backup in (("inline boto3", inline_backup), ("executor", lambda key: aws_service.backup_data_to_s3(data, key))):
+        result = asyncio.run(run(backup))
+        logger.info(
+            f"{label}: {backups} x {size_kb} KB backups in {result['elapsed']:.2f}s, "
+            f"max loop stall {result['max_lag']:.0f}ms, /health p50 {result['health_p50']:.1f}ms "
+            f"max {result['health_max']:.0f}ms ({result['probes']} probes)"
+        )
+    logger.info(f"Fake S3 stored {len(FakeS3Handler.objects)} objects")
+    logger.info(f"AWS calls: {aws_service.stats()['operations']}")
+    logger.info(f"AWSCallLatency datums for CloudWatch: {len(asyncio.run(metrics.flush()) and metrics.sink.datums('AWSCallLatency'))}")
+    aws_service.shutdown()
+
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+from app.services import registry
+print(json.dumps({"seconds": elapsed, "loaded": [n for n, s in registry.stats().items() if s["loaded"]]}))
+"""
+
+def bench_import_time(runs: int, budget: float) -> bool:
+    """Time `import app.main` in fresh interpreters; fails over budget or if any service was built"""
+    project_dir = str(Path(__file__).parent)
+    timings, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=project_dir, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        timings.append(result["seconds"])
+        loaded.update(result["loaded"])
+
+    median = statistics.median(timings)
+    logger.info(f"import app.main: median {median * 1000:.0f}ms over {runs} runs (budget {budget * 1000:.0f}ms)")
+    if loaded:
+        logger.error(f"Services built at import time: {sorted(loaded)}")
+    if median > budget:
+        logger.error("Import time budget exceeded")
+    return median <= budget and not loaded
+
+class ErrorCounter(logging.Handler):
+    """Counts ERROR records logged anywhere in the process"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Q&A platform benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    current_user = subparsers.add_parser("current-user", help="get_current_user throughput")
+    current_user.add_argument("--iterations", type=int, default=20000)
+
+    login_mix = subparsers.add_parser("login-mix", help="read latency under a login burst")
+    login_mix.add_argument("--readers", type=int, default=8)
+    login_mix.add_argument("--logins", type=int, default=32)
+    login_mix.add_argument("--duration", type=float, default=10.0)
+
+    oidc = subparsers.add_parser("oidc", help="Google ID token verification against a fake JWKS (exit 1 on failure)")
+    oidc.add_argument("--tokens", type=int, default=500)
+
+    ai_cache_parser = subparsers.add_parser("ai-cache", help="AI result cache against a fake OpenAI server")
+    ai_cache_parser.add_argument("--calls", type=int, default=500)
+    ai_cache_parser.add_argument("--unique", type=int, default=50)
+    ai_cache_parser.add_argument("--latency", type=float, default=0.05)
+
+    quality_batch = subparsers.add_parser("quality-batch", help="batched vs single answer quality scoring")
+    quality_batch.add_argument("--questions", type=int, default=20)
+    quality_batch.add_argument("--answers", type=int, default=8)
+    quality_batch.add_argument("--latency", type=float, default=0.05)
+
+    scheduler = subparsers.add_parser("ai-scheduler", help="AI call scheduling under upstream throttling")
+    scheduler.add_argument("--calls", type=int, default=300)
+    scheduler.add_argument("--max-concurrent", type=int, default=6)
+    scheduler.add_argument("--latency", type=float, default=0.1)
+
+    prompt_builder = subparsers.add_parser("prompt-builder", help="summary prompt assembly on 50 KB threads")
+    prompt_builder.add_argument("--threads", type=int, default=20)
+    prompt_builder.add_argument("--rounds", type=int, default=5)
+
+    tag_suggester = subparsers.add_parser("tag-suggester", help="local tag model training and query latency")
+    tag_suggester.add_argument("--questions", type=int, default=50000)
+    tag_suggester.add_argument("--queries", type=int, default=2000)
+
+    summary_stream = subparsers.add_parser("summary-stream", help="streamed summaries shared by concurrent viewers")
+    summary_stream.add_argument("--viewers", type=int, default=20)
+    summary_stream.add_argument("--latency", type=float, default=0.3)
+    summary_stream.add_argument("--chunk-delay", type=float, default=0.05)
+
+    coalesce = subparsers.add_parser("ai-coalesce", help="concurrent summaries of one question share one call")
+    coalesce.add_argument("--requests", type=int, default=50)
+    coalesce.add_argument("--workers", type=int, default=4)
+    coalesce.add_argument("--latency", type=float, default=0.5)
+
+    duplicates = subparsers.add_parser("duplicates", help="near-duplicate index build time and lookup latency")
+    duplicates.add_argument("--questions", type=int, default=1_000_000)
+    duplicates.add_argument("--queries", type=int, default=1000)
+
+    write_path = subparsers.add_parser("write-path", help="posting and AI enrichment offline with the fake LLM backend")
+    write_path.add_argument("--questions", type=int, default=200)
+    write_path.add_argument("--answers", type=int, default=3)
+    write_path.add_argument("--latency-ms", type=float, default=300.0)
+    write_path.add_argument("--error-rate", type=float, default=0.02)
+    write_path.add_argument("--seed", type=int, default=0)
+
+    slack = subparsers.add_parser("slack", help="posting latency with Slack notifications against a fake Slack server")
+    slack.add_argument("--questions", type=int, default=50)
+    slack.add_argument("--latency", type=float, default=0.3, help="fake Slack response time (s)")
+    slack.add_argument("--rate-limit-every", type=int, default=10, help="answer every Nth call with ratelimited")
+    slack.add_argument("--capacity", type=int, default=1000, help="outbox capacity")
+
+    metrics = subparsers.add_parser("metrics", help="request metrics batched for CloudWatch (in-memory sink)")
+    metrics.add_argument("--requests", type=int, default=2000)
+    metrics.add_argument("--samples", type=int, default=100000, help="extra latency samples recorded directly")
+
+    aws = subparsers.add_parser("aws", help="event loop responsiveness during S3 backups to a fake S3 server")
+    aws.add_argument("--backups", type=int, default=8)
+    aws.add_argument("--size-kb", type=int, default=2048, help="backup document size")
+    aws.add_argument("--latency", type=float, default=0.2, help="fake S3 response time (s)")
+
+    import_time = subparsers.add_parser("import-time", help="app import time against a budget (exit 1 if over)")
+    import_time.add_argument("--runs", type=int, default=5)
+    import_time.add_argument("--budget", type=float, default=1.5, help="seconds")
+
+    args = parser.parse_args()
+
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    ok = True
+    try:
+        if args.benchmark == "current-user":
+            bench_current_user(args.iterations)
+        elif args.benchmark == "login-mix":
+            bench_login_mix(args.readers, args.logins, args.duration)
+        elif args.benchmark == "oidc":
+            ok = bench_oidc(args.tokens)
+        elif args.benchmark == "ai-cache":
+            bench_ai_cache(args.calls, args.unique, args.latency)
+        elif args.benchmark == "quality-batch":
+            bench_quality_batch(args.questions, args.answers, args.latency)
+        elif args.benchmark == "ai-scheduler":
+            bench_ai_scheduler(args.calls, args.max_concurrent, args.latency)
+        elif args.benchmark == "prompt-builder":
+            bench_prompt_builder(args.threads, args.rounds)
+        elif args.benchmark == "tag-suggester":
+            bench_tag_suggester(args.questions, args.queries)
+        elif args.benchmark == "summary-stream":
+            bench_summary_stream(args.viewers, args.latency, args.chunk_delay)
+        elif args.benchmark == "ai-coalesce":
+            bench_ai_coalesce(args.requests, args.workers, args.latency)
+        elif args.benchmark == "duplicates":
+            bench_duplicates(args.questions, args.queries)
+        elif args.benchmark == "write-path":
+            bench_write_path(args.questions, args.answers, args.latency_ms, args.error_rate, args.seed)
+        elif args.benchmark == "slack":
+            bench_slack(args.questions, args.latency, args.rate_limit_every, args.capacity)
+        elif args.benchmark == "metrics":
+            bench_metrics(args.requests, args.samples)
+        elif args.benchmark == "aws":
+            bench_aws(args.backups, args.size_kb, args.latency)
+        elif args.benchmark == "import-time":
+            ok = bench_import_time(args.runs, args.budget)
+    except Exception:
+        logger.exception("Benchmark failed")
+        ok = False
+
+    # Failures the app logs and swallows (e.g. an AI call falling back) fail the run too
+    if errors.count:
+        logger.error(f"{errors.count} error(s) logged during the benchmark")
+    if not ok or errors.count:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
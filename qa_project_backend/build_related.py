@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Related questions rebuild script.
+Run this script periodically (e.g. nightly) to re-vectorize every question and recompute all related-question lists.
+Between rebuilds, new and edited questions are updated incrementally by the enrichment workers.
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import create_tables
+from app.services.related_index import related_index
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild TF-IDF vectors and related-question lists")
+    parser.parse_args()
+
+    create_tables()
+    docs = related_index.rebuild()
+    stats = related_index.stats()
+    logger.info(f"✅ Rebuilt related questions for {docs} questions")
+    logger.info(f"Snapshot: {stats['snapshot_bytes'] / 1024 / 1024:.1f} MB in {related_index.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from sqlalchemy.exc import DatabaseError, OperationalError
-from app.database import Base, engine, check_database_connection
+from app.database import Base, engine, check_database_connection, upgrade_schema
 from app import models  # Import all models to register them
 from app.config import settings
 
@@ -42,6 +42,7 @@ def create_tables():
         # Create all tables
         logger.info("Creating tables...")
         Base.metadata.create_all(bind=engine)
+        upgrade_schema()  # Columns added to existing tables
         
         # Verify tables were created
         inspector = engine.dialect.get_table_names(engine.connect())
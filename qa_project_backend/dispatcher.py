@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Outbox dispatcher process.
+Delivers the Slack, CloudWatch and enrichment side effects recorded in outbox_events, outside the API workers.
+Run one or more of these next to the API and start the API with OUTBOX_DISPATCH_IN_APP=false.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent))
+
+from app.config import settings
+from app.database import create_tables
+from app.services import registry
+from app.services.aws_service import aws_service
+from app.services.enrichment import enrichment_queue
+from app.services.metrics import metrics
+from app.services.outbox import outbox_dispatcher
+from app.services.slack_service import slack_service
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+async def dispatch(once: bool) -> None:
+    """Dispatch until interrupted (or, with once, until the outbox is empty)"""
+    enrichment_queue.start()
+    metrics.start()
+    try:
+        if once:
+            while await outbox_dispatcher.run_once():
+                pass
+        else:
+            outbox_dispatcher.start()
+            stopped = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stopped.set)
+            await stopped.wait()
+    finally:
+        await outbox_dispatcher.stop()
+        await enrichment_queue.stop()
+        await metrics.stop()
+        if registry.is_loaded("slack_service"):
+            await slack_service.stop()
+        if registry.is_loaded("aws_service"):
+            aws_service.shutdown()
+    logger.info(f"Outbox: {outbox_dispatcher.stats()}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Deliver outbox events to Slack, CloudWatch and the enrichment workers")
+    parser.add_argument("--once", action="store_true", help="exit when no events are left")
+    parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+    parser.add_argument("--enrichment-workers", type=int, default=settings.ENRICHMENT_WORKERS,
+                        help="AI enrichment workers to run in this process (0: leave them to the API)")
+    args = parser.parse_args()
+
+    create_tables()
+    outbox_dispatcher.batch_size = args.batch_size
+    enrichment_queue.workers = args.enrichment_workers
+    asyncio.run(dispatch(args.once))
+
+if __name__ == "__main__":
+    main()
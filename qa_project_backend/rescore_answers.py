@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Answer re-scoring script.
+Run this script to recompute AI quality scores, one batched call per question.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent))
+
+from app import database, models
+from app.services.ai_service import ai_service
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+async def rescore_question(db, question: models.Question, only_default: bool) -> int:
+    """Re-score the answers to one question; returns how many were updated"""
+    query = db.query(models.Answer).filter(models.Answer.question_id == question.id)
+    if only_default:
+        query = query.filter(models.Answer.quality_score == 50)
+    answers = {answer.id: answer for answer in query.all()}
+    if not answers:
+        return 0
+
+    scores = await ai_service.score_answers_batch(
+        f"{question.title}\n{question.content}",
+        {answer_id: answer.content for answer_id, answer in answers.items()},
+        priority="backfill"
+    )
+    for answer_id, score in scores.items():
+        answers[answer_id].quality_score = int(score * 100)  # Convert to 0-100 scale
+    db.commit()
+    return len(scores)
+
+async def rescore(question_id: int = None, only_default: bool = False):
+    """Re-score answers for every question (or a single one)"""
+    db = database.SessionLocal()
+    try:
+        query = db.query(models.Answer.question_id).distinct()
+        if question_id is not None:
+            query = query.filter(models.Answer.question_id == question_id)
+
+        question_ids = [row[0] for row in query.order_by(models.Answer.question_id).all()]
+        logger.info(f"Re-scoring answers for {len(question_ids)} questions...")
+
+        updated = 0
+        for i, qid in enumerate(question_ids, 1):
+            question = db.query(models.Question).filter(models.Question.id == qid).first()
+            updated += await rescore_question(db, question, only_default)
+            if i % 100 == 0:
+                logger.info(f"  {i}/{len(question_ids)} questions, {updated} answers re-scored")
+
+        stats = ai_service.quality_batch_stats()
+        logger.info(f"✅ Re-scored {updated} answers")
+        logger.info(
+            f"Batch calls: {stats['batch_calls']}, answers scored in batches: {stats['batched_answers']}, "
+            f"fallbacks: {stats['fallback_answers']}"
+        )
+        logger.info(
+            f"Saved {stats['calls_saved_per_answer']} calls and "
+            f"{stats['tokens_saved_per_answer']} tokens per scored answer"
+        )
+    finally:
+        db.close()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Re-score answer quality with batched AI calls")
+    parser.add_argument("--question-id", type=int, default=None, help="Only re-score this question")
+    parser.add_argument("--only-default", action="store_true", help="Only score answers still at the default score")
+    args = parser.parse_args()
+
+    asyncio.run(rescore(args.question_id, args.only_default))
+
+if __name__ == "__main__":
+    main()